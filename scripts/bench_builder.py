@@ -0,0 +1,90 @@
+"""
+Benchmark bulk document building on the sample TWC CSVs in data/pcaps.
+
+Compares the legacy ``iterrows``/``dropna().to_dict()`` conversion with the
+vectorized builder in ``mai_streaming.builder`` (as action dicts and as
+pre-serialized NDJSON) and prints docs/sec for each.
+
+Usage:
+    python scripts/bench_builder.py [--rows 50000] [--all-columns]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mai_streaming.builder import (  # noqa: E402
+    build_actions,
+    get_json_encoder,
+    iter_ndjson_records,
+)
+from mai_streaming.config import TWCConfig  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "pcaps")
+
+
+def legacy_actions(df, index):
+    return [
+        {"_index": index, "_source": row.dropna().to_dict()}
+        for _, row in df.iterrows()
+    ]
+
+
+def vectorized_actions(df, index):
+    return list(build_actions(df, index))
+
+
+def ndjson_records(df, index):
+    return list(iter_ndjson_records(df, index, get_json_encoder()))
+
+
+def load_sample(rows, all_columns):
+    columns = None if all_columns else TWCConfig().COLUMNS
+    frames = [
+        pd.read_csv(path, usecols=columns)
+        for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.csv")))
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    repeats = max(rows // len(df), 1)
+    return pd.concat([df] * repeats, ignore_index=True)
+
+
+def run(name, func, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        docs = func(df, "bench")
+        best = min(best, time.perf_counter() - start)
+    rate = len(docs) / best
+    print(f"{name:<12} {len(docs):>8} docs  {best:8.3f}s  {rate:>12,.0f} docs/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--all-columns",
+        action="store_true",
+        help="Use every TWC column instead of TWCConfig.COLUMNS",
+    )
+    args = parser.parse_args()
+
+    df = load_sample(args.rows, args.all_columns)
+    print(f"Sample: {len(df)} rows x {len(df.columns)} columns")
+
+    before = run("iterrows", legacy_actions, df, args.repeat)
+    after = run("vectorized", vectorized_actions, df, args.repeat)
+    encoded = run("ndjson", ndjson_records, df, args.repeat)
+    print(f"Speedup: {after / before:.1f}x (dicts), {encoded / before:.1f}x (ndjson)")
+
+
+if __name__ == "__main__":
+    main()
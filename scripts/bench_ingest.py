@@ -0,0 +1,303 @@
+"""
+Benchmark the file ingest path against a local stand-in for Elasticsearch.
+
+Generates synthetic TWC flow files (CSV and ORC) by resampling the rows of
+data/pcaps/*.csv, then measures three stages per file format and CSV engine:
+
+    read    ``read_data_file`` only
+    build   read + ``prepare_flow_chunk`` + bulk document building
+    ingest  read + prepare + ``ESIngestor.ingest_dataframe`` against a mock
+            ``_bulk`` endpoint served from this process
+
+Each case runs in a fresh process so peak RSS is per case. Rows/sec, MB/sec
+(of input file bytes), peak RSS and p50/p99 per-chunk latency are printed
+and written as JSON; ``--compare`` prints the change against an earlier run.
+
+Usage:
+    python scripts/bench_ingest.py [--rows 200000] [--files 2] [--output bench.json]
+    python scripts/bench_ingest.py --compare bench-before.json --output bench-after.json
+    python scripts/bench_ingest.py --projection minimal --compare bench-after.json
+"""
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.orc as orc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mai_streaming.builder import (  # noqa: E402
+    build_actions,
+    get_json_encoder,
+    iter_ndjson_records,
+)
+from mai_streaming.config import CHUNK_SIZE, ESConfig, ReaderConfig  # noqa: E402
+from mai_streaming.ingestor import (  # noqa: E402
+    ESIngestor,
+    prepare_flow_chunk,
+    read_data_file,
+)
+from mai_streaming.projection import get_profile  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "pcaps")
+
+
+class MockBulkHandler(BaseHTTPRequestHandler):
+    """Answer just enough of the Elasticsearch API for the bulk helpers."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._reply({"version": {"number": "8.11.0"}, "tagline": "You Know, for Search"})
+
+    def do_HEAD(self):
+        self._reply({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if "_bulk" not in self.path:
+            self._reply({"acknowledged": True})
+            return
+        docs = body.count(b"\n") // 2
+        self._reply(
+            {"took": 1, "errors": False, "items": [{"index": {"status": 201}}] * docs}
+        )
+
+    do_PUT = do_POST
+
+
+def start_mock_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockBulkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def generate_files(workdir, rows, files, seed):
+    """Write synthetic CSV and ORC files shaped like the sample TWC exports."""
+    sample = pd.concat(
+        [pd.read_csv(path) for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.csv")))],
+        ignore_index=True,
+    )
+    rng = np.random.default_rng(seed)
+    paths = {"csv": [], "orc": []}
+    for i in range(files):
+        df = sample.iloc[rng.integers(0, len(sample), rows)].reset_index(drop=True)
+        # Vary the flow key so documents are distinct, as in a real capture
+        df["sport"] = rng.integers(1024, 65536, rows)
+        df["first_timestamp"] = df["first_timestamp"].min() + np.sort(
+            rng.integers(0, 3600 * 1_000_000, rows)
+        )
+        csv_path = os.path.join(workdir, f"flows_{i}.csv")
+        df.to_csv(csv_path, index=False)
+        orc_path = os.path.join(workdir, f"flows_{i}.orc")
+        orc.write_table(pa.Table.from_pandas(df, preserve_index=False), orc_path)
+        paths["csv"].append(csv_path)
+        paths["orc"].append(orc_path)
+    return paths
+
+
+def peak_rss_mb():
+    """Return this process's peak RSS in MB.
+
+    VmHWM is reset on exec, unlike ru_maxrss which a spawned worker inherits
+    from the parent on Linux.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def run_case(stage, file_format, engine, paths, es_url, bulk_format, projection):
+    """Run one benchmark case; executed in a fresh worker process."""
+    logging.getLogger().setLevel(logging.WARNING)
+    warnings.simplefilter("ignore", pd.errors.DtypeWarning)
+    profile = get_profile(projection)
+    read_config = ReaderConfig(csv_engine=engine)
+    ingestor = None
+    if stage == "ingest":
+        ingestor = ESIngestor(
+            ESConfig(
+                url=es_url,
+                bulk_format=bulk_format,
+                install_templates=False,
+                projection=projection,
+            )
+        )
+    encoder = get_json_encoder()
+
+    rows = 0
+    latencies = []
+    start = time.perf_counter()
+    for path in paths:
+        chunks = read_data_file(path, profile.columns, CHUNK_SIZE, read_config, profile)
+        while True:
+            chunk_start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            if stage == "build":
+                chunk, fields = prepare_flow_chunk(chunk, path)
+                if bulk_format == "ndjson":
+                    records = iter_ndjson_records(
+                        chunk, "bench", encoder, fields=fields
+                    )
+                    for _ in records:
+                        pass
+                else:
+                    for _ in build_actions(chunk, "bench", fields=fields):
+                        pass
+            elif stage == "ingest":
+                chunk, fields = prepare_flow_chunk(chunk, path)
+                ingestor.ingest_dataframe(chunk, "bench", fields)
+                ingestor.flush()
+            rows += len(chunk)
+            latencies.append(time.perf_counter() - chunk_start)
+    elapsed = time.perf_counter() - start
+    if ingestor is not None:
+        ingestor.close()
+
+    size = sum(os.path.getsize(path) for path in paths)
+    return {
+        "stage": stage,
+        "format": file_format,
+        "engine": engine if file_format == "csv" else None,
+        "bulk_format": bulk_format if stage != "read" else None,
+        "projection": projection,
+        "rows": rows,
+        "input_bytes": size,
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(rows / elapsed, 1),
+        "mb_per_sec": round(size / elapsed / 1e6, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "latency_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+    }
+
+
+def case_key(result):
+    return (result["stage"], result["format"], result["engine"], result["bulk_format"])
+
+
+def print_result(result, baseline=None):
+    label = "/".join(str(part) for part in case_key(result) if part)
+    line = (
+        f"{label:<28} {result['rows_per_sec']:>12,.0f} rows/s "
+        f"{result['mb_per_sec']:>8.1f} MB/s {result['peak_rss_mb']:>8.1f} MB RSS "
+        f"p50 {result['latency_p50_ms']:>7.1f}ms p99 {result['latency_p99_ms']:>7.1f}ms"
+    )
+    if baseline is not None:
+        change = result["rows_per_sec"] / baseline["rows_per_sec"] - 1
+        line += f"  ({change:+.1%} vs baseline)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000, help="Rows per file")
+    parser.add_argument("--files", type=int, default=2, help="Files per format")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--stages", default="read,build,ingest", help="Comma-separated stages to run"
+    )
+    parser.add_argument(
+        "--bulk-format", choices=["actions", "ndjson"], default="actions"
+    )
+    parser.add_argument(
+        "--projection",
+        choices=["minimal", "classification", "full-features"],
+        default="classification",
+        help="Projection profile for reader dtypes and indexed columns",
+    )
+    parser.add_argument("--workdir", help="Directory for generated files (default: temp)")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {case_key(r): r for r in json.load(f)["results"]}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        paths = generate_files(workdir, args.rows, args.files, args.seed)
+        server = start_mock_server()
+        es_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        cases = []
+        for stage in args.stages.split(","):
+            cases.append((stage, "csv", "arrow"))
+            cases.append((stage, "csv", "pandas"))
+            cases.append((stage, "orc", "arrow"))
+
+        results = []
+        context = multiprocessing.get_context("spawn")
+        for stage, file_format, engine in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(
+                    run_case, stage, file_format, engine, paths[file_format],
+                    es_url, args.bulk_format, args.projection,
+                ).result()
+            results.append(result)
+            print_result(result, baseline.get(case_key(result)))
+        server.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "pyarrow": pa.__version__,
+            "cpu_count": os.cpu_count(),
+            "rows_per_file": args.rows,
+            "files": args.files,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
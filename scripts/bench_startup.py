@@ -0,0 +1,142 @@
+"""
+Check CLI startup time against a budget.
+
+Runs ``mai-streaming --help`` repeatedly in fresh interpreters and measures
+its wall time. Runs ``python -X importtime`` on ``mai_streaming.cli`` to list
+the slowest imports and to catch heavy dependencies loaded at import time.
+Exits with status 1 when the median ``--help`` time exceeds the budget or a
+heavy module is imported before a command runs, so it can gate CI or a
+pre-release check.
+
+Usage:
+    python scripts/bench_startup.py [--runs 10] [--budget-ms 300] [--output startup.json]
+    python scripts/bench_startup.py --compare startup-before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Loaded by subcommands only; importing any of them from the CLI module
+# costs hundreds of milliseconds on every invocation
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "elasticsearch", "orjson")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+def time_help(runs):
+    """Return wall times in seconds of ``mai-streaming --help`` runs."""
+    cmd = [sys.executable, "-m", "mai_streaming.cli", "--help"]
+    env = _env()
+    # One untimed run so .pyc compilation does not count
+    subprocess.run(cmd, env=env, capture_output=True, check=True)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def import_profile():
+    """Return (module, self µs, cumulative µs, depth) for every import of the CLI."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import mai_streaming.cli"],
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules.append((name, int(own), int(cumulative), len(indent) // 2))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10, help="Timed --help runs")
+    parser.add_argument(
+        "--budget-ms", type=float, default=300.0, help="Budget for the median --help time"
+    )
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    times = time_help(args.runs)
+    median_ms = statistics.median(times) * 1000
+    modules = import_profile()
+    cli_import = next((m for m in modules if m[0] == "mai_streaming.cli"), None)
+    heavy = sorted(
+        {name.split(".")[0] for name, _, _, _ in modules} & set(HEAVY_MODULES)
+    )
+
+    print(
+        f"--help: median {median_ms:.0f}ms, min {min(times) * 1000:.0f}ms, "
+        f"max {max(times) * 1000:.0f}ms over {args.runs} runs "
+        f"(budget {args.budget_ms:.0f}ms)"
+    )
+    if cli_import is not None:
+        print(f"import mai_streaming.cli: {cli_import[2] / 1000:.1f}ms cumulative")
+    print(f"\nSlowest {args.top} imports (cumulative):")
+    for name, _, cumulative, depth in sorted(modules, key=lambda m: -m[2])[: args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {'  ' * depth}{name}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        change = median_ms / baseline["help_median_ms"] - 1
+        print(f"\n--help median {change:+.1%} vs baseline ({baseline['help_median_ms']:.0f}ms)")
+
+    results = {
+        "help_median_ms": round(median_ms, 1),
+        "help_min_ms": round(min(times) * 1000, 1),
+        "help_max_ms": round(max(times) * 1000, 1),
+        "cli_import_ms": round(cli_import[2] / 1000, 1) if cli_import else None,
+        "heavy_imports": heavy,
+        "budget_ms": args.budget_ms,
+    }
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "runs": args.runs,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"median --help time {median_ms:.0f}ms exceeds {args.budget_ms:.0f}ms")
+    if heavy:
+        failures.append(f"heavy modules imported at CLI startup: {', '.join(heavy)}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Local columnar archive of raw TWC flows, partitioned by hour.
+
+``ArchiveWriter`` keeps every TWC feature column of each ingested chunk, not
+just the indexed subset. It writes zstd-compressed Parquet or Arrow IPC
+files under ``date=YYYY-MM-DD/hour=HH`` directories keyed by
+``first_timestamp``. ``iter_archive`` reads a time range back, pruning whole
+hour partitions first. Reindexing after a mapping change therefore reads
+compact columnar files instead of running ``twc`` over the PCAPs again.
+
+Files are written under a hidden temporary name and renamed when complete.
+A reader never sees a partial file. A crash loses the rows of files that
+were still open; those rows were already sent to Elasticsearch.
+"""
+
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from mai_streaming.builder import Frame
+from mai_streaming.config import ARCHIVE_MAX_FILE_ROWS, ARCHIVE_ROLL_SECONDS
+from mai_streaming.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+COMPRESSION = "zstd"
+TIME_COLUMN = "first_timestamp"  # Epoch microseconds, as written by TWC
+SOURCE_KEY = b"source_file"  # Schema metadata naming the chunk's source file
+UNDATED_PARTITION = "date=__undated__"  # Rows without a first_timestamp
+MICROS_PER_HOUR = 3600 * 1_000_000
+
+# Naive datetimes are taken as UTC
+TimeBound = Union[datetime, np.datetime64]
+
+
+def partition_path(hour: int) -> str:
+    """Return the partition directory for an hour since the epoch."""
+    if hour < 0:
+        return UNDATED_PARTITION
+    stamp = np.datetime_as_string(np.datetime64(hour, "h"), unit="h")
+    day, hh = stamp.split("T")
+    return f"date={day}/hour={hh}"
+
+
+def _partition_hour(path: Path) -> Optional[int]:
+    """Return the hour since the epoch of a file's partition, None if undated."""
+    day = path.parent.parent.name.partition("=")[2]
+    hh = path.parent.name.partition("=")[2]
+    try:
+        return int(np.datetime64(f"{day}T{hh}", "h").astype(np.int64))
+    except ValueError:
+        return None
+
+
+def _to_table(frame: Frame) -> pa.Table:
+    if isinstance(frame, pa.RecordBatch):
+        return pa.Table.from_batches([frame])
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def _hours(table: pa.Table) -> np.ndarray:
+    """Hour since the epoch of every row, -1 where the timestamp is missing."""
+    if TIME_COLUMN not in table.column_names:
+        return np.full(table.num_rows, -1, dtype=np.int64)
+    micros = pc.cast(table.column(TIME_COLUMN), pa.float64())
+    hours = pc.floor(pc.divide(micros, float(MICROS_PER_HOUR)))
+    return pc.fill_null(pc.cast(hours, pa.int64()), -1).to_numpy()
+
+
+class _OpenFile:
+    """A file being written in one partition for one source."""
+
+    def __init__(self, path: Path, schema: pa.Schema, file_format: str):
+        self.path = path
+        self.tmp_path = path.with_name(f".{path.name}.tmp")
+        self.schema = schema
+        self.rows = 0
+        self.opened = time.monotonic()
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(self.tmp_path, schema, compression=COMPRESSION)
+        else:
+            self.writer = pa.ipc.new_file(
+                str(self.tmp_path),
+                schema,
+                options=pa.ipc.IpcWriteOptions(compression=COMPRESSION),
+            )
+
+    def write(self, table: pa.Table) -> None:
+        self.writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self) -> None:
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self) -> None:
+        self.writer.close()
+        try:
+            self.tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ArchiveWriter:
+    """Append raw flow chunks to the hour-partitioned archive.
+
+    One file is kept open per partition and source. A file is finished when
+    its source is closed, when it reaches ``max_rows`` rows, after
+    ``roll_seconds`` (for sources such as live captures that never end), or
+    when a chunk arrives with a different schema.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        file_format: str = "parquet",
+        max_rows: int = ARCHIVE_MAX_FILE_ROWS,
+        roll_seconds: float = ARCHIVE_ROLL_SECONDS,
+    ):
+        if file_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {file_format}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.file_format = file_format
+        self.max_rows = max_rows
+        self.roll_seconds = roll_seconds
+        self._files: Dict[Tuple[str, str], _OpenFile] = {}
+        self.rows_written = 0
+
+    def _new_file(self, partition: str, source: str, schema: pa.Schema) -> _OpenFile:
+        directory = self.directory / partition
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(source)) or "flows"
+        name = f"{stem}-{time.time_ns()}-{os.getpid()}{ARCHIVE_FORMATS[self.file_format]}"
+        schema = schema.with_metadata({SOURCE_KEY: os.path.basename(source).encode()})
+        return _OpenFile(directory / name, schema, self.file_format)
+
+    def write(self, frame: Frame, source: str) -> None:
+        """Archive a raw chunk read from ``source``.
+
+        Args:
+            frame: TWC chunk with ``first_timestamp`` in epoch microseconds
+            source: Path or name of the file or capture the chunk came from
+        """
+        if len(frame) == 0:
+            return
+        with stage_timer("archive") as sample:
+            table = _to_table(frame)
+            sample.rows_in = table.num_rows
+            hours = _hours(table)
+            unique_hours = np.unique(hours)
+            for hour in unique_hours:
+                part = table
+                if len(unique_hours) > 1:
+                    part = table.filter(pa.array(hours == hour))
+                self._write_part(partition_path(int(hour)), source, part)
+            self.rows_written += table.num_rows
+            sample.rows_out = table.num_rows
+            self.roll()
+
+    def _write_part(self, partition: str, source: str, table: pa.Table) -> None:
+        key = (partition, source)
+        open_file = self._files.get(key)
+        if open_file is not None and not open_file.schema.remove_metadata().equals(
+            table.schema.remove_metadata()
+        ):
+            # pandas chunks can change dtypes, e.g. a column that gains nulls
+            self._close(key)
+            open_file = None
+        if open_file is None:
+            open_file = self._files[key] = self._new_file(partition, source, table.schema)
+        open_file.write(table.replace_schema_metadata(open_file.schema.metadata))
+        if open_file.rows >= self.max_rows:
+            self._close(key)
+
+    def roll(self) -> None:
+        """Finish the files open for longer than ``roll_seconds``.
+
+        Runs on every write; callers whose sources can go quiet call it from
+        a timer too, so rows of an idle capture do not stay in temporary files.
+        """
+        now = time.monotonic()
+        for key, open_file in list(self._files.items()):
+            if now - open_file.opened >= self.roll_seconds:
+                self._close(key)
+
+    def _close(self, key: Tuple[str, str]) -> None:
+        open_file = self._files.pop(key)
+        open_file.close()
+        logger.debug(f"Archived {open_file.rows} rows to {open_file.path}")
+
+    def discard_source(self, source: str) -> None:
+        """Drop the unfinished files of a source whose ingestion failed.
+
+        The source is read again on the next run, so keeping its rows would
+        archive them twice.
+        """
+        for key in [key for key in self._files if key[1] == source]:
+            self._files.pop(key).discard()
+
+    def close_source(self, source: str) -> None:
+        """Finish the files of a source that has been fully read."""
+        for key in [key for key in self._files if key[1] == source]:
+            self._close(key)
+
+    def close(self) -> None:
+        """Finish every open file."""
+        for key in list(self._files):
+            self._close(key)
+
+
+def _to_micros(value: Optional[TimeBound]) -> Optional[int]:
+    if value is None:
+        return None
+    return int(np.datetime64(value, "us").astype(np.int64))
+
+
+def archive_files(
+    directory: str,
+    start: Optional[TimeBound] = None,
+    end: Optional[TimeBound] = None,
+) -> List[Path]:
+    """Return the archive files whose hour partitions overlap ``[start, end)``.
+
+    Undated rows are only included when neither bound is given.
+    """
+    start_us, end_us = _to_micros(start), _to_micros(end)
+    files = []
+    for suffix in ARCHIVE_FORMATS.values():
+        for path in Path(directory).glob(f"**/*{suffix}"):
+            if path.name.startswith("."):
+                continue
+            hour = _partition_hour(path)
+            if hour is None:
+                if start_us is None and end_us is None:
+                    files.append(path)
+                continue
+            if start_us is not None and (hour + 1) * MICROS_PER_HOUR <= start_us:
+                continue
+            if end_us is not None and hour * MICROS_PER_HOUR >= end_us:
+                continue
+            files.append(path)
+    return sorted(files)
+
+
+def _iter_file_batches(
+    path: Path, columns: Optional[List[str]], batch_rows: int
+) -> Tuple[str, Iterator[pa.RecordBatch]]:
+    if path.suffix == ARCHIVE_FORMATS["parquet"]:
+        parquet = pq.ParquetFile(path)
+        schema = parquet.schema_arrow
+        if columns is not None:
+            columns = [name for name in columns if name in schema.names]
+        batches = parquet.iter_batches(batch_size=batch_rows, columns=columns)
+    else:
+        reader = pa.ipc.open_file(str(path))
+        schema = reader.schema
+        if columns is not None:
+            columns = [name for name in columns if name in schema.names]
+        batches = (
+            batch if columns is None else batch.select(columns)
+            for batch in (reader.get_batch(i) for i in range(reader.num_record_batches))
+        )
+    source = (schema.metadata or {}).get(SOURCE_KEY, path.name.encode()).decode()
+    return source, batches
+
+
+def iter_archive(
+    directory: str,
+    start: Optional[TimeBound] = None,
+    end: Optional[TimeBound] = None,
+    columns: Optional[List[str]] = None,
+    batch_rows: int = 10000,
+) -> Iterator[Tuple[pa.RecordBatch, str]]:
+    """Yield archived flows with ``first_timestamp`` in ``[start, end)``.
+
+    Args:
+        directory: Archive root
+        start: Earliest flow start to include (default: unbounded)
+        end: Flow start to stop before (default: unbounded)
+        columns: Columns to read (all when None); missing ones are skipped
+        batch_rows: Maximum rows per yielded batch
+
+    Yields:
+        Tuples of (record batch, name of the file the flows were read from)
+    """
+    start_us, end_us = _to_micros(start), _to_micros(end)
+    for path in archive_files(directory, start, end):
+        source, batches = _iter_file_batches(path, columns, batch_rows)
+        for batch in batches:
+            if (start_us is not None or end_us is not None) and batch.num_rows:
+                timestamps = batch.column(TIME_COLUMN)
+                mask = None
+                if start_us is not None:
+                    mask = pc.greater_equal(timestamps, start_us)
+                if end_us is not None:
+                    before = pc.less(timestamps, end_us)
+                    mask = before if mask is None else pc.and_(mask, before)
+                batch = batch.filter(mask)
+            if batch.num_rows:
+                yield batch, source
+
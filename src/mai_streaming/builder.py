@@ -0,0 +1,279 @@
+"""
+Vectorized conversion of DataFrame chunks into Elasticsearch bulk documents.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from mai_streaming.config import DOC_ID_COLUMN
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSONEncoder = Callable[[Any], bytes]
+
+# Chunks come from pandas readers or straight from the Arrow CSV/ORC readers
+Frame = Union[pd.DataFrame, pa.RecordBatch]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def get_json_encoder(name: str = "auto") -> JSONEncoder:
+    """Return a function that encodes an object to compact JSON bytes.
+
+    Args:
+        name: ``orjson``, ``json`` or ``auto`` (orjson when installed)
+
+    Raises:
+        ValueError: If the encoder is unknown or not installed
+    """
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("orjson encoder requested but orjson is not installed")
+        return orjson.dumps
+    if name == "json":
+        return _stdlib_dumps
+    raise ValueError(f"Unknown JSON encoder: {name}")
+
+
+def _float32_to_python(values: np.ndarray) -> List[float]:
+    """Convert float32 values to the floats their shortest repr denotes.
+
+    Widening directly would encode 0.1 as 0.10000000149011612; numpy's
+    float32 repr gives back "0.1" for the same bits.
+    """
+    return values.astype(str).astype(np.float64).tolist()
+
+
+def _column_to_python(series: pd.Series) -> List[Any]:
+    """Convert a column to a list of native Python values in one pass."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        values = np.datetime_as_string(series.to_numpy(dtype="datetime64[us]"), unit="us")
+        return values.tolist()
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+        numpy_dtype = getattr(series.dtype, "numpy_dtype", series.dtype)
+        if isinstance(series.dtype, np.dtype) or not series.hasnans:
+            # Nullable extension columns without missing values convert like numpy
+            values = series.to_numpy(dtype=numpy_dtype)
+            if numpy_dtype == np.float32:
+                return _float32_to_python(values)
+            return values.tolist()
+        if numpy_dtype == np.float32:
+            return _float32_to_python(series.to_numpy(dtype=np.float32, na_value=np.nan))
+    # Extension, categorical and string columns go through object dtype so
+    # that nulls surface as NaN/None and values as plain Python objects.
+    return series.astype(object).to_numpy().tolist()
+
+
+def _arrow_column_to_python(column: pa.Array) -> List[Any]:
+    """Convert an Arrow column to a list of native Python values."""
+    if pa.types.is_timestamp(column.type):
+        # %S includes the sub-second digits of the column's unit
+        column = pc.strftime(column, format="%Y-%m-%dT%H:%M:%S")
+    elif pa.types.is_float32(column.type):
+        # Nulls become NaN here and are dropped through the null mask
+        return _float32_to_python(column.to_numpy(zero_copy_only=False))
+    return column.to_pylist()
+
+
+def _prepare_columns(df: Frame) -> Tuple[List[str], List[List[Any]], np.ndarray]:
+    """Split a chunk into column names, Python value lists and a null mask."""
+    if isinstance(df, pa.RecordBatch):
+        names = list(df.schema.names)
+        values = [_arrow_column_to_python(column) for column in df.columns]
+        null_mask = np.column_stack(
+            [
+                pc.is_null(column, nan_is_null=True).to_numpy(zero_copy_only=False)
+                for column in df.columns
+            ]
+        )
+        return names, values, null_mask
+
+    names = [str(name) for name in df.columns]
+    values = [_column_to_python(df[name]) for name in df.columns]
+    null_mask = df.isna().to_numpy()
+    return names, values, null_mask
+
+
+def iter_documents(df: Frame) -> Iterator[Dict[str, Any]]:
+    """Yield one document per row, omitting null fields.
+
+    Args:
+        df: Chunk of flow or DDoS records, as a DataFrame or Arrow record batch
+
+    Yields:
+        Dictionaries of native Python values suitable for JSON encoding
+    """
+    if len(df) == 0:
+        return
+
+    names, values, null_mask = _prepare_columns(df)
+    rows_with_nulls = null_mask.any(axis=1)
+
+    if not rows_with_nulls.any():
+        for row in zip(*values):
+            yield dict(zip(names, row))
+        return
+
+    for row, has_nulls, row_mask in zip(zip(*values), rows_with_nulls, null_mask):
+        if has_nulls:
+            yield {
+                name: value
+                for name, value, is_null in zip(names, row, row_mask)
+                if not is_null
+            }
+        else:
+            yield dict(zip(names, row))
+
+
+def split_ids(df: Frame) -> Tuple[Frame, Optional[List[str]]]:
+    """Separate the ``_id`` column from a chunk.
+
+    Returns:
+        Tuple of (chunk without the id column, ids or None if it had none)
+    """
+    if isinstance(df, pa.RecordBatch):
+        if DOC_ID_COLUMN not in df.schema.names:
+            return df, None
+        idx = df.schema.get_field_index(DOC_ID_COLUMN)
+        return df.remove_column(idx), df.column(idx).to_pylist()
+    if DOC_ID_COLUMN not in df.columns:
+        return df, None
+    return df.drop(columns=DOC_ID_COLUMN), df[DOC_ID_COLUMN].tolist()
+
+
+def build_actions(
+    df: Frame,
+    index: str,
+    op_type: str = "index",
+    fields: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield Elasticsearch bulk actions for every row of a DataFrame chunk.
+
+    Args:
+        df: Chunk of records to index (DataFrame or Arrow record batch); an
+            ``_id`` column becomes the document id
+        index: Target Elasticsearch index
+        op_type: ``index`` overwrites documents with the same id, ``create``
+            leaves them untouched
+        fields: Values added to every document, e.g. ``source_file``; must
+            not repeat a column name
+
+    Yields:
+        Bulk action dictionaries for ``helpers.bulk``
+    """
+    df, ids = split_ids(df)
+    documents = iter_documents(df)
+    if fields:
+        documents = ({**document, **fields} for document in documents)
+    if ids is None:
+        for document in documents:
+            yield {"_op_type": op_type, "_index": index, "_source": document}
+        return
+    for doc_id, document in zip(ids, documents):
+        yield {"_op_type": op_type, "_index": index, "_id": doc_id, "_source": document}
+
+
+def _source_encoder(
+    encoder: JSONEncoder, fields: Optional[Dict[str, Any]]
+) -> Callable[[Dict[str, Any]], bytes]:
+    """Return a newline-terminated document encoder that appends ``fields``.
+
+    The batch fields are encoded once and spliced in before the closing
+    brace of each document, instead of being added to every dict.
+    """
+    if not fields:
+        return lambda document: encoder(document) + b"\n"
+
+    encoded = encoder(fields)
+    tail = b"," + encoded[1:] + b"\n"
+    alone = encoded + b"\n"
+
+    def encode(document: Dict[str, Any]) -> bytes:
+        if not document:
+            return alone
+        return encoder(document)[:-1] + tail
+
+    return encode
+
+
+def iter_ndjson_records(
+    df: Frame,
+    index: str,
+    encoder: JSONEncoder,
+    op_type: str = "index",
+    fields: Optional[Dict[str, Any]] = None,
+) -> Iterator[bytes]:
+    """Yield pre-serialized ``_bulk`` NDJSON records for a DataFrame chunk.
+
+    Each record holds the action line and the source line of one document,
+    both newline-terminated, so records can be concatenated into a request body.
+
+    Args:
+        df: Chunk of records to index; an ``_id`` column becomes the document id
+        index: Target Elasticsearch index
+        encoder: Function returned by ``get_json_encoder``
+        op_type: Bulk operation, ``index`` or ``create``
+        fields: Values added to every document; must not repeat a column name
+
+    Yields:
+        NDJSON bytes for one document
+    """
+    df, ids = split_ids(df)
+    encode_source = _source_encoder(encoder, fields)
+    if ids is None:
+        action_line = encoder({op_type: {"_index": index}}) + b"\n"
+        for document in iter_documents(df):
+            yield action_line + encode_source(document)
+        return
+
+    # Only the id differs between action lines, so encode the rest once
+    action_prefix = encoder({op_type: {"_index": index, "_id": ""}})[:-4]
+    for doc_id, document in zip(ids, iter_documents(df)):
+        yield action_prefix + encoder(doc_id) + b"}}\n" + encode_source(document)
+
+
+def batch_ndjson(
+    records: Iterable[bytes], max_docs: int, max_bytes: int
+) -> Iterator[Tuple[int, bytes]]:
+    """Group NDJSON records into bulk request bodies.
+
+    A batch is closed when it reaches ``max_docs`` documents or when adding
+    the next record would exceed ``max_bytes``. A single record larger than
+    ``max_bytes`` is still sent on its own.
+
+    Args:
+        records: NDJSON records from ``iter_ndjson_records``
+        max_docs: Maximum number of documents per request
+        max_bytes: Maximum request body size in bytes
+
+    Yields:
+        Tuples of (document count, request body)
+    """
+    batch: List[bytes] = []
+    size = 0
+    for record in records:
+        if batch and (len(batch) >= max_docs or size + len(record) > max_bytes):
+            yield len(batch), b"".join(batch)
+            batch = []
+            size = 0
+        batch.append(record)
+        size += len(record)
+    if batch:
+        yield len(batch), b"".join(batch)
@@ -1,22 +1,29 @@
 import click
+import dataclasses
+import os
 import sys
 import logging
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
-from mai_streaming.extractor import process_pcap_folder, process_live_interface
-from mai_streaming.ingestor import (
-    ddos_ingest_output_folder,
-    ingest_output_folder,
+from typing import Optional, Tuple
+from mai_streaming.config import (
+    CLIConfig,
+    DDOS_ALERT_ZSCORE,
+    DDOS_BASELINE_WINDOWS,
+    DDOS_INDEX_SUFFIX,
+    ROLLUP_DIMENSIONS,
+    ROLLUP_WATERMARK_SECONDS,
 )
-from mai_streaming.config import CLIConfig
-from mai_streaming.utils import create_output_dir, get_data_files
+from mai_streaming.utils import configure_logging, create_output_dir, get_data_files
+
+# pandas, pyarrow and elasticsearch take most of a second to import, so the
+# extractor and ingestor modules are imported inside the commands that need
+# them and --help or a usage error returns without loading them
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
+TIME_FORMATS = ["%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"]
+
 pass_config = click.make_pass_decorator(CLIConfig, ensure=True)
 
 
@@ -33,8 +40,170 @@ pass_config = click.make_pass_decorator(CLIConfig, ensure=True)
     default="streaming",
     help="Elasticsearch index name (can also be set via ES_INDEX env var)",
 )
+@click.option(
+    "--bulk-format",
+    type=click.Choice(["actions", "ndjson"]),
+    default="actions",
+    help="Send bulk requests as action dicts or as pre-serialized NDJSON bytes",
+)
+@click.option(
+    "--bulk-max-bytes",
+    type=int,
+    default=10 * 1024 * 1024,
+    help="Maximum size of a single bulk request body in bytes",
+)
+@click.option(
+    "--json-encoder",
+    type=click.Choice(["auto", "orjson", "json"]),
+    default="auto",
+    help="JSON encoder for NDJSON bulk bodies (auto uses orjson when installed)",
+)
+@click.option(
+    "--bulk-workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of bulk requests in flight at once",
+)
+@click.option(
+    "--bulk-queue-size",
+    type=click.IntRange(min=1),
+    default=4,
+    help="Bulk bodies buffered ahead of the senders before readers block",
+)
+@click.option(
+    "--bulk-max-retries",
+    type=click.IntRange(min=0),
+    default=5,
+    help="Retries with exponential backoff for 429/503 bulk responses",
+)
+@click.option(
+    "--csv-engine",
+    type=click.Choice(["arrow", "pandas"]),
+    default="arrow",
+    help="CSV parser for TWC output files",
+)
+@click.option(
+    "--install-templates/--no-install-templates",
+    default=True,
+    help="Install index templates with typed mappings before ingesting",
+)
+@click.option(
+    "--backfill-tuning",
+    is_flag=True,
+    help="Disable refresh and replicas during offline/ddos runs, restoring them afterwards",
+)
+@click.option(
+    "--write-op",
+    type=click.Choice(["create", "index"]),
+    default="create",
+    help="Bulk operation for documents: create skips ids already indexed, index overwrites them",
+)
+@click.option(
+    "--spool-dir",
+    envvar="SPOOL_DIR",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory where undeliverable bulk requests are kept and replayed from",
+)
+@click.option(
+    "--spool-max-bytes",
+    type=click.IntRange(min=1),
+    default=1024 * 1024 * 1024,
+    help="Maximum compressed size of the spool in bytes",
+)
+@click.option(
+    "--projection",
+    type=click.Choice(["minimal", "classification", "full-features"]),
+    default="classification",
+    help="TWC fields to index: flow key and verdict, the classification fields "
+    "(default), or every TWC feature, each read with compact dtypes",
+)
+@click.option(
+    "--archive-dir",
+    envvar="ARCHIVE_DIR",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Also archive raw flows with every TWC column here, partitioned by hour",
+)
+@click.option(
+    "--archive-format",
+    type=click.Choice(["parquet", "arrow"]),
+    default="parquet",
+    help="Archive file format: Parquet or Arrow IPC, both zstd-compressed",
+)
+@click.option(
+    "--ip-table",
+    "ip_tables",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="CSV of networks (a 'network' CIDR column plus attribute columns) to "
+    "tag sip/dip with, e.g. a GeoLite2 ASN blocks file; repeatable",
+)
+@click.option(
+    "--domain-table",
+    "domain_tables",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="CSV of domains (a 'domain' column plus attribute columns) to tag "
+    "sni/dns with by longest suffix; repeatable",
+)
+@click.option(
+    "--metrics-port",
+    type=click.IntRange(min=0, max=65535),
+    default=None,
+    help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics",
+)
+@click.option(
+    "--stats-interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Log per-stage throughput and bulk statistics every N seconds",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Profile CPU and allocations of the command; slows the run down",
+)
+@click.option(
+    "--profile-engine",
+    type=click.Choice(["auto", "cprofile", "pyinstrument"]),
+    default="auto",
+    help="Profiler used with --profile (auto prefers pyinstrument)",
+)
+@click.option(
+    "--profile-dir",
+    type=click.Path(file_okay=False),
+    default="./profiles",
+    help="Directory for profile artifacts",
+)
 @click.pass_context
-def cli(ctx: click.Context, es_url: str, index: str) -> None:
+def cli(
+    ctx: click.Context,
+    es_url: str,
+    index: str,
+    bulk_format: str,
+    bulk_max_bytes: int,
+    json_encoder: str,
+    bulk_workers: int,
+    bulk_queue_size: int,
+    bulk_max_retries: int,
+    csv_engine: str,
+    install_templates: bool,
+    backfill_tuning: bool,
+    write_op: str,
+    spool_dir: Optional[str],
+    spool_max_bytes: int,
+    projection: str,
+    archive_dir: Optional[str],
+    archive_format: str,
+    ip_tables: Tuple[str, ...],
+    domain_tables: Tuple[str, ...],
+    metrics_port: Optional[int],
+    stats_interval: Optional[float],
+    profile: bool,
+    profile_engine: str,
+    profile_dir: str,
+) -> None:
     """Network traffic analysis tool.
 
     This tool provides functionality for:
@@ -42,7 +211,56 @@ def cli(ctx: click.Context, es_url: str, index: str) -> None:
     2. Encrypted Traffic Classification: Process and analyze encrypted network traffic
        in both offline (PCAP files) and live (network interface) modes
     """
-    ctx.obj = CLIConfig(elasticsearch_url=es_url, elasticsearch_index=index)
+    ctx.obj = CLIConfig(
+        elasticsearch_url=es_url,
+        elasticsearch_index=index,
+        bulk_format=bulk_format,
+        bulk_max_bytes=bulk_max_bytes,
+        json_encoder=json_encoder,
+        bulk_workers=bulk_workers,
+        bulk_queue_size=bulk_queue_size,
+        bulk_max_retries=bulk_max_retries,
+        csv_engine=csv_engine,
+        install_templates=install_templates,
+        backfill_tuning=backfill_tuning,
+        write_op=write_op,
+        spool_dir=spool_dir,
+        spool_max_bytes=spool_max_bytes,
+        projection=projection,
+        archive_dir=archive_dir,
+        archive_format=archive_format,
+        ip_tables=list(ip_tables),
+        domain_tables=list(domain_tables),
+        metrics_port=metrics_port,
+        stats_interval=stats_interval,
+        profile=profile_engine if profile else None,
+        profile_dir=profile_dir,
+    )
+    if metrics_port is not None:
+        from mai_streaming.metrics import start_metrics_server
+
+        server = start_metrics_server(metrics_port)
+        ctx.call_on_close(server.shutdown)
+    if stats_interval:
+        from mai_streaming.metrics import StatsReporter
+
+        reporter = StatsReporter(stats_interval)
+        reporter.start()
+        # A final summary covers whatever happened since the last interval
+        ctx.call_on_close(reporter.report)
+        ctx.call_on_close(reporter.stop)
+    if profile:
+        from mai_streaming.profiling import PROFILE_ENV, Profiler, resolve_engine
+
+        try:
+            engine = resolve_engine(profile_engine)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--profile-engine")
+        profiler = Profiler(profile_dir, ctx.invoked_subcommand or "cli", engine)
+        # Worker processes pick this up and write their own profiles
+        os.environ[PROFILE_ENV] = f"{engine}:{os.path.abspath(profile_dir)}"
+        profiler.start()
+        ctx.call_on_close(profiler.stop)
 
 
 @cli.command()
@@ -54,15 +272,60 @@ def cli(ctx: click.Context, es_url: str, index: str) -> None:
     default="csv",
     help="File format to process (csv or orc)",
 )
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of worker processes (default: CPU count)",
+)
+@click.option(
+    "--ddos-index",
+    default=None,
+    help=(
+        "Index for DDoS rows (default: INDEX-ddos, kept apart from flow indices; "
+        "earlier versions wrote them to INDEX)"
+    ),
+)
+@click.option(
+    "--analytics",
+    is_flag=True,
+    help="Also write per-window summaries and rate breaches to INDEX-analytics",
+)
+@click.option(
+    "--alert-zscore",
+    type=click.FloatRange(min=0, min_open=True),
+    default=DDOS_ALERT_ZSCORE,
+    show_default=True,
+    help="Standard deviations above a label's baseline rate that raise a breach",
+)
+@click.option(
+    "--baseline-windows",
+    type=click.IntRange(min=1),
+    default=DDOS_BASELINE_WINDOWS,
+    show_default=True,
+    help="Span in windows of the exponentially weighted rate baselines",
+)
 @pass_config
-def ddos(config: CLIConfig, input_dir: Path, file_format: str) -> None:
+def ddos(
+    config: CLIConfig,
+    input_dir: Path,
+    file_format: str,
+    workers: Optional[int],
+    ddos_index: Optional[str],
+    analytics: bool,
+    alert_zscore: float,
+    baseline_windows: int,
+) -> None:
     """Process and ingest DDoS attack data to Elasticsearch.
 
     This command processes DDoS attack data files and ingests them into Elasticsearch
     for analysis. The data should contain DDoS attack metrics and patterns.
+    With --analytics, each window_id and label is also summarized at ingest.
 
     INPUT_DIR: Directory containing DDoS data files (CSV/ORC format)
     """
+    from mai_streaming.ingestor import ddos_ingest_output_folder
+
     try:
         formats = []
         if file_format in ["csv"]:
@@ -76,16 +339,38 @@ def ddos(config: CLIConfig, input_dir: Path, file_format: str) -> None:
                 f"No {', '.join(formats)} files found in {input_dir}"
             )
 
+        # Flow and DDoS templates must not share an index pattern
+        index = ddos_index or f"{config.elasticsearch_index}{DDOS_INDEX_SUFFIX}"
+        if ddos_index is None:
+            logger.warning(
+                f"DDoS rows go to {index}; earlier versions wrote them to "
+                f"{config.elasticsearch_index}. Existing DDoS documents stay there: "
+                f"reindex them into {index} or query both indices, and pass "
+                f"--ddos-index to choose another index"
+            )
         logger.info(
             f"Starting DDoS data ingestion from directory: {input_dir} "
-            f"(formats: {', '.join(formats)})"
+            f"(formats: {', '.join(formats)}) into {index}"
         )
 
-        ddos_ingest_output_folder(
+        results = ddos_ingest_output_folder(
             str(input_dir),
             es_url=config.elasticsearch_url,
-            index=config.elasticsearch_index,
+            index=index,
+            es_config=dataclasses.replace(
+                config.to_es_config(),
+                ddos_analytics=analytics,
+                ddos_alert_zscore=alert_zscore,
+                ddos_baseline_windows=baseline_windows,
+            ),
+            workers=workers,
         )
+        failed = [result.file for result in results if not result.ok]
+        if failed:
+            raise click.ClickException(
+                f"{len(failed)} of {len(results)} DDoS files failed: "
+                f"{', '.join(failed[:10])}"
+            )
         logger.info("DDoS data ingestion completed successfully")
     except Exception as e:
         logger.error(f"Error ingesting DDoS files: {e}", exc_info=True)
@@ -95,8 +380,38 @@ def ddos(config: CLIConfig, input_dir: Path, file_format: str) -> None:
 @cli.command()
 @click.argument("pcap_dir", type=click.Path(exists=True, path_type=Path))
 @click.argument("output_dir", type=click.Path(path_type=Path), default=None)
+@click.option(
+    "--pipe",
+    is_flag=True,
+    help="Stream TWC output into Elasticsearch without writing CSV files",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of PCAP files extracted in parallel",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Re-extract every PCAP even if the extraction manifest says it is unchanged",
+)
+@click.option(
+    "--hash-content",
+    is_flag=True,
+    help="Also compare PCAP content hashes against the extraction manifest",
+)
 @pass_config
-def offline(config: CLIConfig, pcap_dir: Path, output_dir: Optional[Path]) -> None:
+def offline(
+    config: CLIConfig,
+    pcap_dir: Path,
+    output_dir: Optional[Path],
+    pipe: bool,
+    jobs: int,
+    no_cache: bool,
+    hash_content: bool,
+) -> None:
     """Process PCAP files for encrypted traffic classification.
 
     This command analyzes PCAP files to classify encrypted network traffic,
@@ -105,19 +420,48 @@ def offline(config: CLIConfig, pcap_dir: Path, output_dir: Optional[Path]) -> No
     PCAP_DIR: Directory containing PCAP files to process
     OUTPUT_DIR: Directory for processed output (default: ./output)
     """
+    from mai_streaming.extractor import (
+        extract_and_ingest_pcap_folder,
+        stream_pcap_folder,
+    )
+
     try:
+        if pipe:
+            logger.info(f"Streaming PCAP files for traffic classification from {pcap_dir}")
+            failed = stream_pcap_folder(
+                str(pcap_dir),
+                es_url=config.elasticsearch_url,
+                index=config.elasticsearch_index,
+                es_config=config.to_es_config(),
+            )
+            if failed:
+                raise click.ClickException(
+                    f"{len(failed)} PCAPs failed to stream: {', '.join(failed[:10])}"
+                )
+            logger.info("Traffic classification and ingestion completed successfully")
+            return
+
         output_dir = output_dir or Path(config.default_output_dir)
         create_output_dir(output_dir)
 
         logger.info(f"Processing PCAP files for traffic classification from {pcap_dir} to {output_dir}")
-        process_pcap_folder(str(pcap_dir), str(output_dir))
-
-        logger.info("Starting Elasticsearch ingestion of classified traffic data")
-        ingest_output_folder(
+        results = extract_and_ingest_pcap_folder(
+            str(pcap_dir),
             str(output_dir),
+            jobs=jobs,
             es_url=config.elasticsearch_url,
             index=config.elasticsearch_index,
+            es_config=config.to_es_config(),
+            use_cache=not no_cache,
+            hash_content=hash_content,
+            read_config=config.to_reader_config(),
         )
+        failed = [result.pcap for result in results if not result.ok]
+        if failed:
+            raise click.ClickException(
+                f"{len(failed)} of {len(results)} PCAP extractions failed: "
+                f"{', '.join(failed[:10])}"
+            )
         logger.info("Traffic classification and ingestion completed successfully")
     except Exception as e:
         logger.error(f"Error processing PCAP files: {e}", exc_info=True)
@@ -127,8 +471,61 @@ def offline(config: CLIConfig, pcap_dir: Path, output_dir: Optional[Path]) -> No
 @cli.command()
 @click.argument("interface", type=str)
 @click.argument("output_dir", type=click.Path(path_type=Path), default=None)
+@click.option(
+    "--pipe",
+    is_flag=True,
+    help="Stream TWC output into Elasticsearch without writing CSV files",
+)
+@click.option(
+    "--rollover",
+    type=click.Choice(["none", "daily"]),
+    default="none",
+    help="Write flows to one index per day (INDEX-YYYY.MM.DD) by first_timestamp",
+)
+@click.option(
+    "--retention-days",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Delete daily indices after this many days via an ILM policy",
+)
+@click.option(
+    "--rollup-seconds",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Also write per-window flow summaries of this length to INDEX-rollup",
+)
+@click.option(
+    "--rollup-dimensions",
+    default=",".join(ROLLUP_DIMENSIONS),
+    show_default=True,
+    help="Comma-separated indexed or lookup fields the summaries are keyed by",
+)
+@click.option(
+    "--rollup-watermark",
+    type=click.FloatRange(min=0),
+    default=ROLLUP_WATERMARK_SECONDS,
+    show_default=True,
+    help="Seconds after a window ends that late flows are still counted in it",
+)
+@click.option(
+    "--raw-sample-rate",
+    type=click.FloatRange(min=0, max=1),
+    default=1.0,
+    help="Share of raw flows still indexed when rollups are written (default: all)",
+)
 @pass_config
-def live(config: CLIConfig, interface: str, output_dir: Optional[Path]) -> None:
+def live(
+    config: CLIConfig,
+    interface: str,
+    output_dir: Optional[Path],
+    pipe: bool,
+    rollover: str,
+    retention_days: Optional[int],
+    rollup_seconds: Optional[float],
+    rollup_dimensions: str,
+    rollup_watermark: float,
+    raw_sample_rate: float,
+) -> None:
     """Run live encrypted traffic classification.
 
     This command performs real-time analysis of network traffic from a specified interface,
@@ -137,26 +534,104 @@ def live(config: CLIConfig, interface: str, output_dir: Optional[Path]) -> None:
     INTERFACE: Network interface to capture from (e.g., eth0)
     OUTPUT_DIR: Directory for captured output (default: ./output)
     """
+    if retention_days and rollover != "daily":
+        raise click.UsageError("--retention-days requires --rollover daily")
+    if retention_days and not config.install_templates:
+        # The lifecycle policy is attached to daily indices by their template
+        raise click.UsageError("--retention-days cannot be used with --no-install-templates")
+    if raw_sample_rate < 1 and not rollup_seconds:
+        raise click.UsageError("--raw-sample-rate requires --rollup-seconds")
+    dimensions = [name.strip() for name in rollup_dimensions.split(",") if name.strip()]
+    from mai_streaming.extractor import process_live_interface
+
     try:
         output_dir = output_dir or Path(config.default_output_dir)
-        create_output_dir(output_dir)
+        es_config = dataclasses.replace(
+            config.to_es_config(),
+            rollover=rollover,
+            retention_days=retention_days,
+            rollup_seconds=rollup_seconds,
+            rollup_dimensions=dimensions,
+            rollup_watermark=rollup_watermark,
+            raw_sample_rate=raw_sample_rate,
+        )
+        if not pipe:
+            create_output_dir(output_dir)
 
         logger.info(f"Starting live traffic classification on interface {interface}")
-        logger.info(f"Output directory: {output_dir}")
+        if not pipe:
+            logger.info(f"Output directory: {output_dir}")
 
         process_live_interface(
             interface,
             str(output_dir),
             es_url=config.elasticsearch_url,
             index=config.elasticsearch_index,
+            es_config=es_config,
+            pipe=pipe,
         )
     except Exception as e:
         logger.error(f"Error processing live interface: {e}", exc_info=True)
         raise click.ClickException(f"Error processing live interface: {str(e)}")
 
 
+@cli.command()
+@click.argument(
+    "archive_dir", type=click.Path(exists=True, file_okay=False, path_type=Path)
+)
+@click.option(
+    "--start",
+    type=click.DateTime(formats=TIME_FORMATS),
+    default=None,
+    help="Replay flows that started at or after this UTC time",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(formats=TIME_FORMATS),
+    default=None,
+    help="Replay flows that started before this UTC time",
+)
+@pass_config
+def replay(
+    config: CLIConfig,
+    archive_dir: Path,
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> None:
+    """Reindex archived flows into Elasticsearch.
+
+    Reads the hour-partitioned archive written with --archive-dir, so an
+    index can be rebuilt after a mapping change without re-running twc.
+    --projection selects the columns indexed, e.g. full-features for all.
+
+    ARCHIVE_DIR: Archive directory to replay from
+    """
+    if start and end and end <= start:
+        raise click.UsageError("--end must be after --start")
+    from mai_streaming.ingestor import replay_archive
+
+    try:
+        logger.info(
+            f"Replaying flows from {archive_dir} "
+            f"({start or 'beginning'} to {end or 'end'}) into {config.elasticsearch_index}"
+        )
+        rows = replay_archive(
+            str(archive_dir),
+            es_url=config.elasticsearch_url,
+            index=config.elasticsearch_index,
+            es_config=config.to_es_config(),
+            start=start,
+            end=end,
+        )
+        logger.info(f"Replay completed: {rows} flows")
+    except Exception as e:
+        logger.error(f"Error replaying archive: {e}", exc_info=True)
+        raise click.ClickException(f"Error replaying archive: {str(e)}")
+
+
 def main() -> None:
     """Main entry point for the CLI application."""
+    configure_logging()
     try:
         cli()
     except click.ClickException as e:
@@ -3,7 +3,7 @@ Configuration classes and constants for the application.
 """
 
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
 
 @dataclass
@@ -12,6 +12,50 @@ class ESConfig:
 
     url: str = "http://localhost:9200"
     bulk_chunk_size: int = 5000
+    bulk_max_bytes: int = 10 * 1024 * 1024
+    # "actions" sends dicts through helpers.bulk, "ndjson" sends pre-encoded bytes
+    bulk_format: str = "actions"
+    json_encoder: str = "auto"
+    # Concurrent sender: bulk_workers > 1 always ships NDJSON bodies
+    bulk_workers: int = 1
+    bulk_queue_size: int = 4
+    bulk_max_retries: int = 5
+    bulk_initial_backoff: float = 0.5
+    # Install typed index templates before ingesting
+    install_templates: bool = True
+    # Disable refresh and replicas during offline/DDoS backfills
+    backfill_tuning: bool = False
+    # "daily" routes flows to index-YYYY.MM.DD by first_timestamp
+    rollover: str = "none"
+    # Delete daily indices this many days after their date (requires ILM)
+    retention_days: Optional[int] = None
+    # "create" makes replays of documents with known ids no-ops, "index" overwrites them
+    write_op: str = "create"
+    # Undeliverable bulk bodies are written here and replayed later
+    spool_dir: Optional[str] = None
+    spool_max_bytes: int = 1024 * 1024 * 1024
+    # Projection profile: which TWC columns are indexed and their dtypes
+    projection: str = "classification"
+    # Raw flows with every TWC column are also archived here for replay
+    archive_dir: Optional[str] = None
+    # "parquet" or "arrow" (IPC file format)
+    archive_format: str = "parquet"
+    # Local CSV tables for in-process enrichment of sip/dip and sni/dns
+    ip_tables: List[str] = field(default_factory=list)
+    domain_tables: List[str] = field(default_factory=list)
+    # Live mode: tumbling-window summaries written to <index>-rollup (None disables)
+    rollup_seconds: Optional[float] = None
+    rollup_dimensions: List[str] = field(default_factory=lambda: list(ROLLUP_DIMENSIONS))
+    # Flows for a window are accepted until the newest flow is this far past its end
+    rollup_watermark: float = field(default_factory=lambda: ROLLUP_WATERMARK_SECONDS)
+    # Share of raw flows still indexed alongside the rollups (1.0 keeps all)
+    raw_sample_rate: float = 1.0
+    # DDoS mode: per-window summaries and breach events written to <index>-analytics
+    ddos_analytics: bool = False
+    # A window's rate breaches when it is this many standard deviations above its baseline
+    ddos_alert_zscore: float = field(default_factory=lambda: DDOS_ALERT_ZSCORE)
+    # Span in windows of the exponentially weighted baselines
+    ddos_baseline_windows: int = field(default_factory=lambda: DDOS_BASELINE_WINDOWS)
     index: str = "streaming"
 
 
@@ -22,10 +66,62 @@ class CLIConfig:
     elasticsearch_url: str = "http://localhost:9200"
     elasticsearch_index: str = "streaming"
     default_output_dir: str = "./output"
+    bulk_format: str = "actions"
+    bulk_max_bytes: int = 10 * 1024 * 1024
+    json_encoder: str = "auto"
+    bulk_workers: int = 1
+    bulk_queue_size: int = 4
+    bulk_max_retries: int = 5
+    csv_engine: str = "arrow"
+    install_templates: bool = True
+    backfill_tuning: bool = False
+    write_op: str = "create"
+    spool_dir: Optional[str] = None
+    spool_max_bytes: int = 1024 * 1024 * 1024
+    projection: str = "classification"
+    archive_dir: Optional[str] = None
+    archive_format: str = "parquet"
+    ip_tables: List[str] = field(default_factory=list)
+    domain_tables: List[str] = field(default_factory=list)
+    metrics_port: Optional[int] = None
+    stats_interval: Optional[float] = None
+    profile: Optional[str] = None
+    profile_dir: str = "./profiles"
+
+    def to_reader_config(self) -> "ReaderConfig":
+        """Convert CLI config to data file reader config."""
+        return ReaderConfig(csv_engine=self.csv_engine)
 
     def to_es_config(self) -> ESConfig:
         """Convert CLI config to Elasticsearch config."""
-        return ESConfig(url=self.elasticsearch_url, index=self.elasticsearch_index)
+        return ESConfig(
+            url=self.elasticsearch_url,
+            index=self.elasticsearch_index,
+            bulk_format=self.bulk_format,
+            bulk_max_bytes=self.bulk_max_bytes,
+            json_encoder=self.json_encoder,
+            bulk_workers=self.bulk_workers,
+            bulk_queue_size=self.bulk_queue_size,
+            bulk_max_retries=self.bulk_max_retries,
+            install_templates=self.install_templates,
+            backfill_tuning=self.backfill_tuning,
+            write_op=self.write_op,
+            spool_dir=self.spool_dir,
+            spool_max_bytes=self.spool_max_bytes,
+            projection=self.projection,
+            archive_dir=self.archive_dir,
+            archive_format=self.archive_format,
+            ip_tables=self.ip_tables,
+            domain_tables=self.domain_tables,
+        )
+
+
+@dataclass
+class ReaderConfig:
+    """Settings for reading TWC and DDoS data files."""
+
+    # "arrow" streams record batches with pyarrow.csv, "pandas" uses read_csv
+    csv_engine: str = "arrow"
 
 
 @dataclass
@@ -91,6 +187,114 @@ class TWCConfig:
         ]
 
 
+@dataclass
+class ProjectionProfile:
+    """TWC columns to read and index, and the dtypes to read them as.
+
+    Dtype names are understood by both readers: ``string`` (pyarrow-backed),
+    ``category``, ``int8`` to ``int64``, ``uint8`` to ``uint32`` and
+    ``float32``/``float64``. Columns without a dtype are inferred.
+    """
+
+    # Columns to index; None keeps every column of the file
+    columns: Optional[List[str]]
+    # Dtype per column name
+    dtypes: Dict[str, str] = field(default_factory=dict)
+    # (regex, dtype) for feature families such as seq_pkt_len[0..99]; first match wins
+    patterns: List[Tuple[str, str]] = field(default_factory=list)
+
+
+# Smallest types that hold every value TWC writes; times stay int64 microseconds
+FLOW_DTYPES: Dict[str, str] = {
+    "sip": "string",
+    "sport": "uint16",
+    "dip": "string",
+    "dport": "uint16",
+    "proto": "uint8",
+    "first_timestamp": "int64",
+    "total_time": "int64",
+    "sni": "category",
+    "vpn": "string",
+    "dd": "string",
+    "default_vpn": "string",
+    "dn": "string",
+    "dns": "string",
+    "ds": "string",
+    "dl": "string",
+    "application": "category",
+    "traffic_type": "category",
+}
+
+FEATURE_DTYPE_PATTERNS: List[Tuple[str, str]] = [
+    (r"seq_raw_payload\[\d+\]", "uint8"),
+    (r"seq_direction\[\d+\]", "int8"),
+    (r"seq_pkt_len\[\d+\]", "uint16"),
+    (r"seq_iat\[\d+\]", "int64"),
+    (r"(pkt|pl)_(fwd|bwd)_count", "int32"),
+    (r"(pkt_len|pl_len)_(fwd|bwd)_(min|max)", "int32"),
+    (r"(pkt_len|pl_len|iat)_(fwd|bwd)_total", "int64"),
+    (r"iat_(fwd|bwd)_(min|max)", "int64"),
+    (r"last_timestamp_(fwd|bwd)", "int64"),
+    (r".*_(mean|stdev)", "float32"),
+]
+
+PROJECTION_PROFILES: Dict[str, ProjectionProfile] = {
+    # Flow key, timing and the classifier's verdict
+    "minimal": ProjectionProfile(
+        columns=[
+            "sip",
+            "sport",
+            "dip",
+            "dport",
+            "proto",
+            "first_timestamp",
+            "total_time",
+            "application",
+            "traffic_type",
+        ],
+        dtypes=FLOW_DTYPES,
+        patterns=FEATURE_DTYPE_PATTERNS,
+    ),
+    # The fields indexed so far, including the DNS/SNI/VPN annotations
+    "classification": ProjectionProfile(
+        columns=TWCConfig().COLUMNS,
+        dtypes=FLOW_DTYPES,
+        patterns=FEATURE_DTYPE_PATTERNS,
+    ),
+    # Every statistic and per-packet sequence TWC writes
+    "full-features": ProjectionProfile(
+        columns=None,
+        dtypes=FLOW_DTYPES,
+        patterns=FEATURE_DTYPE_PATTERNS,
+    ),
+}
+
+
 # Constants
 PROCESSED_MARKER = ".processed"
+DOC_ID_COLUMN = "_id"  # Chunk column carrying deterministic document ids
+DDOS_WINDOW_SECONDS = 30  # Length of the windows numbered by DDoS window_id
+DDOS_INDEX_SUFFIX = "-ddos"  # DDoS rows go to INDEX-ddos unless --ddos-index is given
+EXTRACT_MANIFEST = ".extract_manifest.json"  # Fingerprints of extracted PCAPs
+PCAP_OUTPUT_SUFFIX = ".d"  # Output of x.pcap goes to x.pcap.d under the output root
+OFFSETS_FILE = ".offsets.json"  # Per-file byte offsets for live tailing
+STREAM_MAX_LATENCY = 0.5  # Seconds a piped flow may wait for its micro-batch to fill
+TWC_STDOUT = "-"  # TWC output argument that writes CSV to stdout (pipe mode)
+LIVE_RESCAN_INTERVAL = 30.0  # Seconds between full rescans while watching for events
 CHUNK_SIZE = 10000  # Number of records to process at once
+CSV_BLOCK_SIZE = 16 * 1024 * 1024  # Bytes of CSV parsed per Arrow batch
+ARCHIVE_ROLL_SECONDS = 600.0  # Finish archive files of never-ending sources this often
+ARCHIVE_MAX_FILE_ROWS = 1_000_000  # Rows per archive file before starting a new one
+LOOKUP_CACHE_SIZE = 65536  # Distinct addresses or names remembered per lookup table
+IP_LOOKUP_COLUMNS = ("sip", "dip")  # Flow columns enriched from the IP prefix tables
+DOMAIN_LOOKUP_COLUMNS = ("sni", "dns")  # Flow columns enriched from the domain tables
+ROLLUP_DIMENSIONS = ("application", "traffic_type", "dip", "dport", "vpn")  # Default rollup keys
+ROLLUP_PERCENTILES = (50, 90, 99)  # Flow duration percentiles per rollup document
+ROLLUP_WATERMARK_SECONDS = 120.0  # Default lateness allowed for flows of a rollup window
+ROLLUP_INDEX_SUFFIX = "-rollup"  # Rollups of INDEX go to INDEX-rollup
+ROLLUP_WRITE_OP = "index"  # A later summary of the same window and key replaces the earlier one
+DDOS_ANALYTICS_SUFFIX = "-analytics"  # DDoS window summaries of INDEX go to INDEX-analytics
+DDOS_ALERT_ZSCORE = 3.0  # Default standard deviations above baseline that raise a breach
+DDOS_BASELINE_WINDOWS = 20  # Default span in windows of the DDoS rate baselines
+DDOS_BASELINE_MIN_WINDOWS = 5  # Windows a label's baseline needs before it can alert
+DDOS_LATE_WINDOWS = 1  # A DDoS window is finished by a row this many windows newer
@@ -0,0 +1,280 @@
+"""
+Per-window analytics of DDoS data.
+
+``WindowAnalyzer`` folds chunks of DDoS rows into one summary per
+``window_id`` and ``label``. A summary holds the row count and, for every
+``pl_*`` and ``flow_*`` count column, the sum, the maximum and the
+per-second rate. Dashboards read these few documents instead of aggregating
+every row at query time.
+
+Each label keeps exponentially weighted baselines (mean and variance) of its
+rates across windows. A rate more than ``zscore`` standard deviations above
+its baseline produces a breach event. A breaching rate does not update the
+baseline, so a long attack keeps alerting instead of becoming the norm.
+
+Rows of one window may span chunks. A window is finished once a row
+``late_windows`` windows newer has been seen. Rows that arrive for a
+finished window are counted as late and left out of the analytics; they are
+still indexed as rows.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from mai_streaming.config import (
+    DDOS_ALERT_ZSCORE,
+    DDOS_BASELINE_MIN_WINDOWS,
+    DDOS_BASELINE_WINDOWS,
+    DDOS_LATE_WINDOWS,
+    DDOS_WINDOW_SECONDS,
+    DOC_ID_COLUMN,
+)
+from mai_streaming.docids import column_ids
+from mai_streaming.metrics import METRICS, stage_timer
+from mai_streaming.rollup import group_codes, group_runs
+
+logger = logging.getLogger(__name__)
+
+WINDOW_COLUMN = "window_id"
+LABEL_COLUMN = "label"
+TIME_COLUMN = "timestamp"  # Epoch milliseconds of the window start
+METRIC_COLUMNS = re.compile(r"(pl|flow)_\w+")  # Count columns summarized per window
+ROWS_FIELD = "rows"  # Rate name of the row count itself
+# Baselines never get narrower than this share of their mean, so a metric
+# that has been flat does not alert on noise
+MIN_STDDEV_RATIO = 0.05
+
+
+@dataclass
+class _Baseline:
+    """Exponentially weighted mean and variance of one label's rates."""
+
+    mean: np.ndarray
+    variance: np.ndarray
+    windows: int = 0
+
+
+class WindowAnalyzer:
+    """Summarize DDoS rows per window and label and flag rate spikes.
+
+    Args:
+        source: File the rows are read from; part of every document id
+        window_seconds: Length of the windows numbered by ``window_id``
+        zscore: Standard deviations above the baseline that count as a breach
+        baseline_windows: Span in windows of the weighted baselines
+        min_windows: Windows a label's baseline needs before it can alert
+        late_windows: How many windows newer a row must be to finish a window
+    """
+
+    def __init__(
+        self,
+        source: str,
+        window_seconds: float = DDOS_WINDOW_SECONDS,
+        zscore: float = DDOS_ALERT_ZSCORE,
+        baseline_windows: int = DDOS_BASELINE_WINDOWS,
+        min_windows: int = DDOS_BASELINE_MIN_WINDOWS,
+        late_windows: int = DDOS_LATE_WINDOWS,
+    ):
+        if baseline_windows < 1:
+            raise ValueError(f"Baseline span must be at least one window: {baseline_windows}")
+        self.source = os.path.basename(source)
+        self.window_seconds = window_seconds
+        self.zscore = zscore
+        self.alpha = 2 / (baseline_windows + 1)
+        self.min_windows = min_windows
+        self.late_windows = late_windows
+        # Count columns, fixed by the first chunk
+        self.metrics: Optional[List[str]] = None
+        # Open windows: keys, then row count and totals, and maxima per group
+        self._keys = pd.DataFrame(
+            {WINDOW_COLUMN: np.empty(0, dtype=np.int64), LABEL_COLUMN: np.empty(0, dtype=object)}
+        )
+        self._sums = np.empty((0, 1))
+        self._maxima = np.empty((0, 0))
+        self._newest: Optional[int] = None
+        # Windows numbered below this have been emitted
+        self._closed_before: Optional[int] = None
+        self._baselines: Dict[Any, _Baseline] = {}
+        self.late_rows = 0
+        self.breaches = 0
+
+    def add(self, chunk: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Fold a chunk of DDoS rows into the open windows.
+
+        Args:
+            chunk: Rows with ``window_id``, ``label`` and count columns
+
+        Returns:
+            Tuple of (summaries of the windows this chunk finished, breach events)
+        """
+        with stage_timer("analytics") as sample:
+            sample.rows_in = len(chunk)
+            self._aggregate(chunk)
+            summaries, breaches = pd.DataFrame(), pd.DataFrame()
+            if self._newest is not None:
+                # Window w is finished by a row of window w + late_windows
+                summaries, breaches = self._emit(self._newest - self.late_windows + 1)
+            sample.rows_out = len(summaries) + len(breaches)
+        return summaries, breaches
+
+    def close(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Summarize every open window, e.g. at the end of the file."""
+        with stage_timer("analytics") as sample:
+            summaries, breaches = self._emit(None)
+            sample.rows_out = len(summaries) + len(breaches)
+        return summaries, breaches
+
+    def _aggregate(self, chunk: pd.DataFrame) -> None:
+        """Add a chunk's rows to the open windows' sums and maxima."""
+        if WINDOW_COLUMN not in chunk.columns or len(chunk) == 0:
+            return
+        if self.metrics is None:
+            self.metrics = [
+                name for name in chunk.columns
+                if METRIC_COLUMNS.fullmatch(name) and pd.api.types.is_numeric_dtype(chunk[name])
+            ]
+            self._sums = np.empty((0, len(self.metrics) + 1))
+            self._maxima = np.empty((0, len(self.metrics)))
+        metrics = self.metrics
+
+        window_ids = chunk[WINDOW_COLUMN].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(window_ids)
+        if not valid.any():
+            return
+        self._newest = max(int(window_ids[valid].max()), self._newest or 0)
+        if self._closed_before is not None:
+            late = valid & (window_ids < self._closed_before)
+            if late.any():
+                self.late_rows += int(late.sum())
+                METRICS.inc("mai_ddos_late_rows_total", int(late.sum()))
+                valid &= ~late
+        if not valid.any():
+            return
+
+        labels = chunk[LABEL_COLUMN].array[valid] if LABEL_COLUMN in chunk.columns else None
+        keys = pd.DataFrame({WINDOW_COLUMN: window_ids[valid].astype(np.int64), LABEL_COLUMN: labels})
+        values = np.column_stack(
+            [_numeric(chunk, name)[valid] for name in metrics] or [np.empty((len(keys), 0))]
+        )
+        counts = np.column_stack([np.ones(len(keys)), np.nan_to_num(values)])
+
+        # Open windows are already one row per group, so merge them in the same pass
+        keys = pd.concat([self._keys, keys], ignore_index=True)
+        codes, first = group_codes(keys)
+        order, starts = group_runs(codes)
+        self._keys = keys.iloc[first].reset_index(drop=True)
+        self._sums = np.add.reduceat(np.concatenate([self._sums, counts])[order], starts)
+        self._maxima = np.fmax.reduceat(np.concatenate([self._maxima, values])[order], starts)
+
+    def _emit(self, boundary: Optional[int]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Remove and summarize the windows numbered below ``boundary`` (all if None)."""
+        if boundary is not None:
+            if self._closed_before is not None and boundary <= self._closed_before:
+                return pd.DataFrame(), pd.DataFrame()
+            self._closed_before = boundary
+        if not len(self._keys):
+            return pd.DataFrame(), pd.DataFrame()
+        window_ids = self._keys[WINDOW_COLUMN].to_numpy(dtype=np.int64)
+        done = np.ones(len(window_ids), dtype=bool)
+        if boundary is not None:
+            done = window_ids < boundary
+        if not done.any():
+            return pd.DataFrame(), pd.DataFrame()
+        # Baselines must see windows in order
+        finished = np.flatnonzero(done)[np.argsort(window_ids[done], kind="stable")]
+        keys = self._keys.iloc[finished].reset_index(drop=True)
+        sums, maxima = self._sums[finished], self._maxima[finished]
+        self._keys = self._keys[~done].reset_index(drop=True)
+        self._sums, self._maxima = self._sums[~done], self._maxima[~done]
+        summaries = self._summarize(keys, sums, maxima)
+        return summaries, self._check(summaries, sums / self.window_seconds)
+
+    def _documents(self, keys: pd.DataFrame, event: str) -> pd.DataFrame:
+        """Return the fields every analytics document of these windows carries."""
+        window_ids = keys[WINDOW_COLUMN].to_numpy(dtype=np.int64)
+        return pd.DataFrame(
+            {
+                "event": event,
+                WINDOW_COLUMN: window_ids,
+                TIME_COLUMN: (window_ids * self.window_seconds * 1000).astype(np.int64),
+                LABEL_COLUMN: keys[LABEL_COLUMN].array,
+                "source_file": self.source,
+            }
+        )
+
+    def _summarize(self, keys: pd.DataFrame, sums: np.ndarray, maxima: np.ndarray) -> pd.DataFrame:
+        """Turn finished windows into summary documents."""
+        columns: Dict[str, np.ndarray] = {ROWS_FIELD: sums[:, 0].round().astype(np.int64)}
+        columns[f"{ROWS_FIELD}_rate"] = (sums[:, 0] / self.window_seconds).round(3)
+        for i, name in enumerate(self.metrics, 1):
+            columns[f"{name}_sum"] = sums[:, i].round().astype(np.int64)
+            columns[f"{name}_max"] = maxima[:, i - 1]
+            columns[f"{name}_rate"] = (sums[:, i] / self.window_seconds).round(3)
+        summaries = pd.concat([self._documents(keys, "window"), pd.DataFrame(columns)], axis=1)
+        # One document per file, window and label, so a rerun is a no-op
+        summaries[DOC_ID_COLUMN] = column_ids(
+            summaries, ["source_file", WINDOW_COLUMN, LABEL_COLUMN, "event"]
+        )
+        return summaries
+
+    def _check(self, summaries: pd.DataFrame, rates: np.ndarray) -> pd.DataFrame:
+        """Compare each window's rates with its label's baseline, then update it.
+
+        Returns:
+            One breach event per window, label and rate above its threshold
+        """
+        names = [ROWS_FIELD, *self.metrics]
+        found: List[Tuple[int, int, float, float, float]] = []
+        for row, label in enumerate(summaries[LABEL_COLUMN].tolist()):
+            label = None if pd.isna(label) else label
+            x = rates[row]
+            baseline = self._baselines.get(label)
+            if baseline is None:
+                baseline = self._baselines[label] = _Baseline(x.copy(), np.zeros_like(x))
+            breach = np.zeros(len(x), dtype=bool)
+            if baseline.windows >= self.min_windows:
+                stddev = np.maximum(
+                    np.sqrt(baseline.variance),
+                    np.maximum(MIN_STDDEV_RATIO * np.abs(baseline.mean), 1 / self.window_seconds),
+                )
+                z = (x - baseline.mean) / stddev
+                breach = z >= self.zscore
+                for i in np.flatnonzero(breach).tolist():
+                    found.append((row, i, baseline.mean[i], stddev[i], z[i]))
+            # Weighted update of the mean and variance, skipping breaching rates
+            diff = np.where(breach, 0.0, x - baseline.mean)
+            increment = self.alpha * diff
+            baseline.mean = baseline.mean + increment
+            baseline.variance = np.where(
+                breach, baseline.variance, (1 - self.alpha) * (baseline.variance + diff * increment)
+            )
+            baseline.windows += 1
+
+        if not found:
+            return pd.DataFrame()
+        self.breaches += len(found)
+        METRICS.inc("mai_ddos_breaches_total", len(found))
+        rows, metrics, means, stddevs, scores = (np.array(values) for values in zip(*found))
+        breaches = self._documents(summaries.iloc[rows], "breach")
+        breaches["metric"] = [names[i] for i in metrics.tolist()]
+        breaches["rate"] = rates[rows, metrics].round(3)
+        breaches["baseline_rate"] = means.round(3)
+        breaches["baseline_stddev"] = stddevs.round(3)
+        breaches["zscore"] = scores.round(2)
+        breaches["threshold"] = self.zscore
+        breaches[DOC_ID_COLUMN] = column_ids(
+            breaches, ["source_file", WINDOW_COLUMN, LABEL_COLUMN, "event", "metric"]
+        )
+        return breaches
+
+
+def _numeric(rows: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in rows.columns:
+        return np.full(len(rows), np.nan)
+    return rows[column].to_numpy(dtype=np.float64, na_value=np.nan)
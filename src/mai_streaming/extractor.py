@@ -3,43 +3,369 @@ import os
 import subprocess
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
-from mai_streaming.ingestor import ingest_output_folder
-from mai_streaming.config import TWCConfig
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+from typing import Callable, List, Optional
+from mai_streaming.ingestor import ESIngestor, ingest_new_files, prepare_flow_chunk
+from mai_streaming.manifest import ExtractionManifest
+from mai_streaming.metrics import record_stage, stage_timer
+from mai_streaming.stream import iter_csv_batches
+from mai_streaming.tail import FileTailer
+from mai_streaming.watcher import create_watcher
+from mai_streaming.config import (
+    CHUNK_SIZE,
+    ESConfig,
+    EXTRACT_MANIFEST,
+    LIVE_RESCAN_INTERVAL,
+    PCAP_OUTPUT_SUFFIX,
+    PROCESSED_MARKER,
+    ReaderConfig,
+    STREAM_MAX_LATENCY,
+    TWC_STDOUT,
+    TWCConfig,
 )
+
 logger = logging.getLogger(__name__)
 
-def process_pcap_folder(pcap_dir: str, output_dir: str) -> None:
-    """Process all PCAP files in a directory."""
+@dataclass
+class ExtractionResult:
+    """Outcome of one ``twc extract`` run."""
+
+    pcap: str
+    output_dir: str
+    returncode: int
+    stderr: str = ""
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+def _pcap_output_dir(pcap_dir: str, output_dir: str, pcap: str) -> str:
+    """Per-PCAP output directory mirroring the PCAP's path under ``pcap_dir``.
+
+    The directory is named after the whole capture file (``x.pcap.d``), so it
+    never contains the output of another PCAP such as ``x/y.pcap``.
+    """
+    relative = os.path.relpath(pcap, pcap_dir)
+    return os.path.join(output_dir, relative + PCAP_OUTPUT_SUFFIX)
+
+
+def _clear_outputs(output_dir: str) -> None:
+    """Remove data files and markers left by an earlier extraction of the same PCAP.
+
+    Only files directly in ``output_dir`` are removed; subdirectories may
+    belong to other PCAPs being extracted at the same time.
+    """
+    for pattern in ("*.csv", "*.orc", f"*{PROCESSED_MARKER}"):
+        for path in Path(output_dir).glob(pattern):
+            path.unlink()
+
+
+def extract_pcap(pcap: str, output_dir: str) -> ExtractionResult:
+    """Run ``twc extract`` for one PCAP, capturing its exit code and stderr."""
+    os.makedirs(output_dir, exist_ok=True)
+    _clear_outputs(output_dir)
+    cmd = TWCConfig.get_pcap_extract_cmd(output_dir, pcap)
+    start = time.perf_counter()
+    completed = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+    duration = time.perf_counter() - start
+    record_stage("twc", duration, rows_in=1, nbytes=os.path.getsize(pcap))
+    return ExtractionResult(
+        pcap=pcap,
+        output_dir=output_dir,
+        returncode=completed.returncode,
+        stderr=completed.stderr or "",
+        duration=duration,
+    )
+
+
+def process_pcap_folder(
+    pcap_dir: str,
+    output_dir: str,
+    jobs: int = 1,
+    on_extracted: Optional[Callable[[ExtractionResult], bool]] = None,
+    manifest: Optional[ExtractionManifest] = None,
+) -> List[ExtractionResult]:
+    """Process all PCAP files in a directory.
+
+    PCAPs are extracted largest first by up to ``jobs`` concurrent ``twc``
+    processes, each writing to its own subdirectory of ``output_dir``.
+
+    Args:
+        pcap_dir: Directory containing PCAP files
+        output_dir: Root directory for extracted CSVs
+        jobs: Number of concurrent ``twc`` processes
+        on_extracted: Called in the calling thread as each extraction finishes;
+            returns whether the PCAP's outputs were handled (e.g. ingested)
+        manifest: Skip PCAPs it lists as unchanged and record new extractions
+            once their outputs are handled
+
+    Returns:
+        One result per extracted PCAP, in completion order
+    """
     logger.info(f"Processing PCAP files from {pcap_dir}")
     os.makedirs(output_dir, exist_ok=True)
-    pcap_files = glob.glob(os.path.join(pcap_dir, "**/*.pcap"), recursive=True)
+    with stage_timer("discover") as sample:
+        pcap_files = glob.glob(os.path.join(pcap_dir, "**/*.pcap"), recursive=True)
+        sample.rows_in = len(pcap_files)
+
+        fingerprints = {}
+        if manifest is not None:
+            pending = []
+            for pcap in pcap_files:
+                pcap_output = _pcap_output_dir(pcap_dir, output_dir, pcap)
+                cmd = TWCConfig.get_pcap_extract_cmd(pcap_output, pcap)
+                fingerprints[pcap] = manifest.fingerprint(pcap, cmd)
+                if not manifest.is_current(pcap, fingerprints[pcap]):
+                    pending.append(pcap)
+            logger.info(
+                f"Skipping {len(pcap_files) - len(pending)} unchanged PCAP files, "
+                f"extracting {len(pending)}"
+            )
+            pcap_files = pending
+        pcap_files.sort(key=os.path.getsize, reverse=True)
+        sample.rows_out = len(pcap_files)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [
+            executor.submit(
+                extract_pcap, pcap, _pcap_output_dir(pcap_dir, output_dir, pcap)
+            )
+            for pcap in pcap_files
+        ]
+        for idx, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            if result.ok:
+                print(
+                    f"[{idx}/{len(pcap_files)}] Extracted {result.pcap} "
+                    f"in {result.duration:.1f}s"
+                )
+            else:
+                logger.error(
+                    f"twc exited with code {result.returncode} for {result.pcap}: "
+                    f"{result.stderr.strip()[-2000:]}"
+                )
+            handled = result.ok
+            if on_extracted is not None:
+                handled = on_extracted(result) and handled
+            if handled and manifest is not None:
+                # Recorded only now, so a PCAP whose outputs failed to ingest
+                # is extracted and ingested again on the next run
+                manifest.record(result.pcap, fingerprints[result.pcap])
+    return results
+
+
+def extract_and_ingest_pcap_folder(
+    pcap_dir: str,
+    output_dir: str,
+    jobs: int = 1,
+    es_url: str = "http://localhost:9200",
+    index: str = "streaming",
+    es_config: Optional[ESConfig] = None,
+    use_cache: bool = True,
+    hash_content: bool = False,
+    read_config: Optional[ReaderConfig] = None,
+) -> List[ExtractionResult]:
+    """Extract PCAPs in parallel and ingest each one's output as soon as it is ready.
 
-    for idx, pcap in enumerate(pcap_files, 1):
-        print(f"[{idx}/{len(pcap_files)}] Extracting {pcap}")
-        cmd = TWCConfig.get_pcap_extract_cmd(output_dir, pcap)
-        subprocess.run(cmd)
-        # time.sleep(1)
+    Args:
+        pcap_dir: Directory containing PCAP files
+        output_dir: Root directory for extracted CSVs
+        jobs: Number of concurrent ``twc`` processes
+        es_url: Elasticsearch URL (default: http://localhost:9200)
+        index: Elasticsearch index name (default: streaming)
+        es_config: Full ingestion settings; overrides ``es_url`` when given
+        use_cache: Skip PCAPs recorded as unchanged in the extraction manifest
+        hash_content: Also compare content hashes when checking the manifest
+        read_config: Data file reader settings
 
+    Returns:
+        One result per extracted PCAP, in completion order
+    """
+    manifest = None
+    if use_cache:
+        manifest = ExtractionManifest(
+            Path(output_dir) / EXTRACT_MANIFEST, hash_content=hash_content
+        )
+    es_ingestor = ESIngestor(es_config or ESConfig(url=es_url))
+    es_ingestor.prepare_index(index)
 
-def process_live_interface(interface: str, output_dir: str, es_url: str = "http://localhost:9200", index: str = "twc_streaming") -> None:
+    def ingest(result: ExtractionResult) -> bool:
+        if not result.ok:
+            return False
+        return ingest_new_files(result.output_dir, es_ingestor, index, read_config) == 0
+
+    try:
+        with es_ingestor.bulk_load(index):
+            results = process_pcap_folder(
+                pcap_dir, output_dir, jobs, on_extracted=ingest, manifest=manifest
+            )
+            # Pick up anything left from earlier runs or failed callbacks, but
+            # not the partial output of failed extractions
+            failed = [result.output_dir for result in results if not result.ok]
+            ingest_new_files(output_dir, es_ingestor, index, read_config, skip=failed)
+    finally:
+        es_ingestor.close()
+    return results
+
+
+def stream_twc_output(
+    cmd: List[str], es_ingestor: ESIngestor, index: str, source: str
+) -> int:
+    """Run a TWC command that writes CSV to stdout and ingest it as it arrives.
+
+    Args:
+        cmd: TWC command line with ``TWC_STDOUT`` as the output
+        es_ingestor: Ingestor that receives each micro-batch
+        index: Elasticsearch index name
+        source: Value recorded as ``source_file`` on every flow
+
+    Returns:
+        Number of flows ingested
+
+    Raises:
+        RuntimeError: If twc fails or documents could not be ingested
+    """
+    rows = 0
+    failed = es_ingestor.docs_failed
+    completed = stopped = False
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        batches = iter_csv_batches(
+            process.stdout,
+            es_ingestor.read_columns,
+            batch_rows=CHUNK_SIZE,
+            max_latency=STREAM_MAX_LATENCY,
+            profile=es_ingestor.profile,
+        )
+        for batch in batches:
+            batch = es_ingestor.archive_chunk(batch, source)
+            batch, fields = prepare_flow_chunk(batch, source, es_ingestor.lookups)
+            rows += len(batch)
+            batch, fields = es_ingestor.rollup_chunk(batch, index, fields)
+            es_ingestor.ingest_dataframe(batch, index, fields)
+        process.wait()
+        completed = True
+    except KeyboardInterrupt:
+        # Stopping a live capture is not a failure; what was read has been sent
+        stopped = True
+        raise
+    finally:
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+        # twc runs alongside parsing and sending, so its busy time is wall time
+        record_stage("twc", time.perf_counter() - start, rows_in=1)
+        es_ingestor.flush()
+        ok = stopped or (completed and process.returncode == 0)
+        # A failed source is streamed again on the next run and archived then
+        es_ingestor.finish_archive(source, ok=ok and es_ingestor.docs_failed == failed)
+    if process.returncode:
+        raise RuntimeError(f"twc exited with code {process.returncode} for {source}")
+    if es_ingestor.docs_failed > failed:
+        raise RuntimeError(
+            f"{es_ingestor.docs_failed - failed} documents from {source} were not ingested"
+        )
+    return rows
+
+
+def stream_pcap_folder(
+    pcap_dir: str,
+    es_url: str = "http://localhost:9200",
+    index: str = "streaming",
+    es_config: Optional[ESConfig] = None,
+) -> List[str]:
+    """Extract all PCAP files in a directory straight into Elasticsearch.
+
+    Args:
+        pcap_dir: Directory containing PCAP files
+        es_url: Elasticsearch URL (default: http://localhost:9200)
+        index: Elasticsearch index name (default: streaming)
+        es_config: Full ingestion settings; overrides ``es_url`` when given
+
+    Returns:
+        The PCAPs that failed to extract or ingest
+    """
+    logger.info(f"Streaming PCAP files from {pcap_dir}")
+    with stage_timer("discover") as sample:
+        pcap_files = glob.glob(os.path.join(pcap_dir, "**/*.pcap"), recursive=True)
+        sample.rows_out = len(pcap_files)
+    es_ingestor = ESIngestor(es_config or ESConfig(url=es_url))
+    es_ingestor.prepare_index(index)
+
+    failed = []
+    try:
+        with es_ingestor.bulk_load(index):
+            for idx, pcap in enumerate(pcap_files, 1):
+                print(f"[{idx}/{len(pcap_files)}] Extracting {pcap}")
+                cmd = TWCConfig.get_pcap_extract_cmd(TWC_STDOUT, pcap)
+                try:
+                    rows = stream_twc_output(
+                        cmd, es_ingestor, index, os.path.basename(pcap)
+                    )
+                except RuntimeError as e:
+                    logger.error(f"Failed to stream {pcap}: {e}")
+                    failed.append(pcap)
+                    continue
+                logger.info(f"Ingested {rows} flows from {pcap}")
+    finally:
+        es_ingestor.close()
+    return failed
+
+
+def process_live_interface(interface: str, output_dir: str, es_url: str = "http://localhost:9200", index: str = "twc_streaming", es_config: Optional[ESConfig] = None, pipe: bool = False) -> None:
     """Process live network traffic from an interface."""
     logger.info(f"Capturing traffic from interface {interface}")
+    # One client and connection pool for the whole capture session
+    es_ingestor = ESIngestor(es_config or ESConfig(url=es_url))
+    es_ingestor.prepare_index(index)
+
+    if pipe:
+        cmd = TWCConfig.get_live_capture_cmd(TWC_STDOUT, interface)
+        print(f"Starting live capture on {interface} (pipe mode)...")
+        try:
+            stream_twc_output(cmd, es_ingestor, index, interface)
+        except KeyboardInterrupt:
+            print("\nTerminating live capture...")
+        finally:
+            es_ingestor.close()
+        return
+
     os.makedirs(output_dir, exist_ok=True)
     cmd = TWCConfig.get_live_capture_cmd(output_dir, interface)
     print(f"Starting live capture on {interface}...")
     process = subprocess.Popen(cmd)
 
+    tailer = FileTailer(output_dir, es_ingestor, index)
+    watcher = create_watcher(output_dir)
+    last_rescan = time.monotonic()
+
     try:
-        while True:
-            ingest_output_folder(output_dir, es_url=es_url, index=index)
-            # time.sleep(5)
+        tailer.poll()
+        while process.poll() is None:
+            # Wakes on file events; the timeout only bounds how often we
+            # check on the twc process and do a safety rescan
+            changed = watcher.wait(timeout=1.0)
+            if changed is None or time.monotonic() - last_rescan > LIVE_RESCAN_INTERVAL:
+                tailer.poll()
+                last_rescan = time.monotonic()
+            elif changed:
+                tailer.poll(changed)
+            es_ingestor.roll_archive()
+        tailer.poll()
+        if process.returncode:
+            raise RuntimeError(f"twc exited with code {process.returncode}")
+        logger.info("twc live capture finished")
     except KeyboardInterrupt:
         print("\nTerminating live capture...")
         process.terminate()
+    finally:
+        watcher.close()
+        es_ingestor.close()
+        tailer.close()
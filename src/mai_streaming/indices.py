@@ -0,0 +1,310 @@
+"""
+Index templates, typed mappings and bulk-load tuning for flow and DDoS indices.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from elasticsearch import ApiError, Elasticsearch
+
+from mai_streaming.builder import Frame
+
+logger = logging.getLogger(__name__)
+
+# Fields we filter on but never aggregate or sort by skip doc_values
+FLOW_PROPERTIES: Dict[str, Dict[str, Any]] = {
+    "sip": {"type": "ip"},
+    "sport": {"type": "integer", "doc_values": False},
+    "dip": {"type": "ip"},
+    "dport": {"type": "integer"},
+    "proto": {"type": "short"},
+    "first_timestamp": {"type": "date"},
+    "total_time": {"type": "long"},
+    "sni": {"type": "keyword", "ignore_above": 512},
+    "vpn": {"type": "keyword"},
+    "dd": {"type": "keyword"},
+    "default_vpn": {"type": "keyword"},
+    "dn": {"type": "keyword"},
+    "dns": {"type": "keyword", "ignore_above": 1024, "doc_values": False},
+    "ds": {"type": "keyword"},
+    "application": {"type": "keyword"},
+    "traffic_type": {"type": "keyword"},
+    "source_file": {"type": "keyword", "doc_values": False},
+    "ingested_at": {"type": "date", "doc_values": False},
+}
+
+DDOS_PROPERTIES: Dict[str, Dict[str, Any]] = {
+    "window_id": {"type": "long"},
+    "timestamp": {"type": "date"},
+    "label": {"type": "keyword"},
+    "sip": {"type": "ip"},
+    "dip": {"type": "ip"},
+    "sport": {"type": "integer", "doc_values": False},
+    "dport": {"type": "integer"},
+    "proto": {"type": "short"},
+}
+
+# Dimensions keep their flow mappings, so any flow field can key a rollup
+ROLLUP_PROPERTIES: Dict[str, Dict[str, Any]] = {
+    **FLOW_PROPERTIES,
+    "window_start": {"type": "date"},
+    "window_end": {"type": "date"},
+    "flows": {"type": "long"},
+    "packets": {"type": "long"},
+    "bytes": {"type": "long"},
+    "bytes_fwd": {"type": "long"},
+    "bytes_bwd": {"type": "long"},
+    "duration_max_ms": {"type": "float"},
+}
+
+# Per-metric sums, maxima and rates of the summaries are mapped dynamically
+DDOS_ANALYTICS_PROPERTIES: Dict[str, Dict[str, Any]] = {
+    "event": {"type": "keyword"},
+    "window_id": {"type": "long"},
+    "timestamp": {"type": "date"},
+    "label": {"type": "keyword"},
+    "source_file": {"type": "keyword"},
+    "rows": {"type": "long"},
+    "metric": {"type": "keyword"},
+    "rate": {"type": "float"},
+    "baseline_rate": {"type": "float"},
+    "baseline_stddev": {"type": "float"},
+    "zscore": {"type": "float"},
+    "threshold": {"type": "float"},
+}
+
+# Extra feature columns (pl_*, flow_*, iat_*, ...) keep compact types
+# instead of dynamic text + keyword multi-fields
+DYNAMIC_TEMPLATES = [
+    {"strings_as_keywords": {
+        "match_mapping_type": "string",
+        "mapping": {"type": "keyword", "ignore_above": 256},
+    }},
+    {"integers_as_longs": {
+        "match_mapping_type": "long",
+        "mapping": {"type": "long"},
+    }},
+    {"floats_as_floats": {
+        "match_mapping_type": "double",
+        "mapping": {"type": "float"},
+    }},
+]
+
+MAPPINGS = {
+    "flow": FLOW_PROPERTIES,
+    "ddos": DDOS_PROPERTIES,
+    "rollup": ROLLUP_PROPERTIES,
+    "ddos_analytics": DDOS_ANALYTICS_PROPERTIES,
+}
+
+# Every kind gets its own priority: Elasticsearch rejects templates with
+# overlapping patterns at equal priority, and INDEX-ddos, INDEX-rollup and
+# INDEX-ddos-analytics also match the INDEX* and INDEX-* patterns of the
+# kinds before them, so more specific kinds rank higher. The daily template
+# of each kind takes the next one up.
+TEMPLATE_PRIORITIES = {"flow": 200, "ddos": 210, "rollup": 220, "ddos_analytics": 230}
+
+
+def index_pattern(index: str) -> str:
+    """Return the pattern matching an index and its dated or rolled-over variants."""
+    return f"{index}*"
+
+
+def daily_pattern(index: str) -> str:
+    """Return the pattern matching the daily indices written for ``index``."""
+    return f"{index}-*"
+
+
+def daily_index(index: str, day: np.datetime64) -> str:
+    """Return the daily index name for ``day``, e.g. ``streaming-2024.05.01``.
+
+    The ``yyyy.MM.dd`` suffix is the format ILM parses origination dates from.
+    """
+    return f"{index}-{np.datetime_as_string(day, unit='D').replace('-', '.')}"
+
+
+def split_by_day(
+    frame: Frame, index: str, column: str = "first_timestamp"
+) -> Iterator[Tuple[str, Frame]]:
+    """Split a chunk into per-day parts routed to daily indices.
+
+    Rows without a timestamp, or chunks without the column, go to ``index``
+    itself.
+
+    Args:
+        frame: DataFrame or record batch with an epoch-millis or datetime ``column``
+        index: Base index name
+        column: Timestamp column the day is taken from
+
+    Yields:
+        Tuples of (index name, rows for that index)
+    """
+    is_arrow = isinstance(frame, pa.RecordBatch)
+    names = frame.schema.names if is_arrow else frame.columns
+    if column not in names:
+        yield index, frame
+        return
+
+    # Timestamps arrive as epoch milliseconds from the enrichment stage
+    if is_arrow:
+        values = frame.column(column)
+        if not pa.types.is_timestamp(values.type):
+            values = values.cast(pa.timestamp("ms"))
+        values = values.to_numpy(zero_copy_only=False)
+    else:
+        values = frame[column]
+        if not pd.api.types.is_datetime64_any_dtype(values.dtype):
+            values = pd.to_datetime(values, unit="ms")
+        values = values.to_numpy()
+    days = values.astype("datetime64[D]")
+    missing = np.isnat(days)
+    unique_days = np.unique(days[~missing])
+
+    # Live chunks almost always fall within a single day
+    if len(unique_days) == 1 and not missing.any():
+        yield daily_index(index, unique_days[0]), frame
+        return
+
+    masks = [(daily_index(index, day), days == day) for day in unique_days]
+    if missing.any():
+        masks.append((index, missing))
+    for name, mask in masks:
+        yield name, frame.filter(pa.array(mask)) if is_arrow else frame[mask]
+
+
+def _put_template(
+    es: Elasticsearch,
+    name: str,
+    pattern: str,
+    priority: int,
+    kind: str,
+    settings: Optional[Dict[str, Any]] = None,
+) -> None:
+    if kind not in MAPPINGS:
+        raise ValueError(f"Unknown index kind: {kind}")
+    es.indices.put_index_template(
+        name=name,
+        index_patterns=[pattern],
+        priority=priority,
+        template={
+            "settings": {"index": {"codec": "best_compression", **(settings or {})}},
+            "mappings": {
+                "dynamic_templates": DYNAMIC_TEMPLATES,
+                "properties": MAPPINGS[kind],
+            },
+        },
+    )
+    logger.info(f"Installed index template {name} for {pattern}")
+
+
+def install_template(es: Elasticsearch, index: str, kind: str) -> None:
+    """Install a composable index template with typed mappings for ``index``.
+
+    The template only affects indices created after it is installed;
+    existing indices keep their current mapping.
+
+    Args:
+        es: Elasticsearch client
+        index: Index name (the template matches ``index*``)
+        kind: ``flow``, ``ddos``, ``rollup`` or ``ddos_analytics``
+    """
+    _put_template(
+        es, f"mai-{kind}-{index}", index_pattern(index), TEMPLATE_PRIORITIES[kind], kind
+    )
+
+
+def install_retention_policy(es: Elasticsearch, index: str, retention_days: int) -> str:
+    """Install an ILM policy that deletes daily indices after ``retention_days``.
+
+    Returns:
+        Name of the lifecycle policy
+    """
+    name = f"mai-{index}-retention"
+    es.ilm.put_lifecycle(
+        name=name,
+        policy={
+            "phases": {
+                "hot": {"min_age": "0ms", "actions": {}},
+                "delete": {
+                    "min_age": f"{retention_days}d",
+                    "actions": {"delete": {}},
+                },
+            }
+        },
+    )
+    logger.info(f"Installed lifecycle policy {name} ({retention_days} day retention)")
+    return name
+
+
+def install_daily_template(
+    es: Elasticsearch, index: str, kind: str, lifecycle: Optional[str] = None
+) -> None:
+    """Install the template for the daily indices of ``index``.
+
+    It takes precedence over the ``index*`` template. With a lifecycle
+    policy, each index's age is parsed from its date suffix, so the policy
+    measures retention from the day the flows belong to rather than from
+    when the index was created.
+
+    Args:
+        es: Elasticsearch client
+        index: Base index name (the template matches ``index-*``)
+        kind: ``flow``, ``ddos``, ``rollup`` or ``ddos_analytics``
+        lifecycle: Optional ILM policy name attached to every daily index
+    """
+    settings = {}
+    if lifecycle:
+        settings = {
+            "lifecycle": {"name": lifecycle, "parse_origination_date": True}
+        }
+    _put_template(
+        es,
+        f"mai-{kind}-{index}-daily",
+        daily_pattern(index),
+        TEMPLATE_PRIORITIES[kind] + 1,
+        kind,
+        settings,
+    )
+
+
+@contextmanager
+def bulk_load_settings(es: Elasticsearch, index: str) -> Iterator[None]:
+    """Disable refresh and replicas on ``index`` for a backfill, then restore them.
+
+    The index is created first if needed so the settings can be applied
+    before any document arrives.
+    """
+    try:
+        if not es.indices.exists(index=index):
+            es.indices.create(index=index)
+        current = es.indices.get_settings(index=index, flat_settings=True)
+        # Keyed by the concrete index name, which differs when ``index`` is an alias
+        settings = next(iter(current.values()))["settings"]
+        original = {
+            "index.refresh_interval": settings.get("index.refresh_interval"),
+            "index.number_of_replicas": settings.get("index.number_of_replicas"),
+        }
+        es.indices.put_settings(
+            index=index,
+            settings={"index.refresh_interval": "-1", "index.number_of_replicas": 0},
+        )
+        logger.info(f"Disabled refresh and replicas on {index} for bulk load")
+    except (ApiError, StopIteration, KeyError) as e:
+        logger.warning(f"Could not apply bulk load settings to {index}: {str(e)}")
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        try:
+            # None resets a setting that was never set explicitly to its default
+            es.indices.put_settings(index=index, settings=original)
+            es.indices.refresh(index=index)
+            logger.info(f"Restored refresh and replica settings on {index}")
+        except ApiError as e:
+            logger.error(f"Failed to restore settings on {index}: {str(e)}")
@@ -1,104 +1,727 @@
 import os
 import logging
-from typing import List, Dict, Any, Optional, Union
-from datetime import datetime
+import multiprocessing.util
+import time
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import pyarrow.orc as orc
-from elasticsearch import Elasticsearch, helpers
+from contextlib import nullcontext
+from elasticsearch import ApiError, Elasticsearch, helpers
 import glob
-import numpy as np
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from elasticsearch.helpers import BulkIndexError
-from mai_streaming.config import ESConfig, PROCESSED_MARKER, CHUNK_SIZE, TWCConfig
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+from mai_streaming.archive import ArchiveWriter, TimeBound, iter_archive
+from mai_streaming.builder import (
+    Frame,
+    batch_ndjson,
+    build_actions,
+    get_json_encoder,
+    iter_ndjson_records,
+)
+from mai_streaming.indices import (
+    bulk_load_settings,
+    install_daily_template,
+    install_retention_policy,
+    install_template,
+    split_by_day,
 )
+from mai_streaming.ddos import TIME_COLUMN as DDOS_TIME_COLUMN, WindowAnalyzer
+from mai_streaming.docids import flow_ids, row_ids
+from mai_streaming.enrich import enrich_chunk
+from mai_streaming.lookup import Lookups
+from mai_streaming.rollup import ROLLUP_INPUT_COLUMNS, WINDOW_COLUMN, RollupAggregator
+from mai_streaming.metrics import METRICS, record_stage, stage_timer, timed_iter
+from mai_streaming.projection import (
+    arrow_types,
+    cast_batch,
+    csv_header,
+    get_profile,
+    pandas_dtypes,
+)
+from mai_streaming.profiling import start_worker_profiler
+from mai_streaming.sender import CONFLICT_STATUS, BulkSender
+from mai_streaming.spool import Spool
+from mai_streaming.utils import configure_logging
+from mai_streaming.config import (
+    CHUNK_SIZE,
+    CSV_BLOCK_SIZE,
+    DDOS_ANALYTICS_SUFFIX,
+    DDOS_WINDOW_SECONDS,
+    DOC_ID_COLUMN,
+    ESConfig,
+    PROCESSED_MARKER,
+    ROLLUP_INDEX_SUFFIX,
+    ROLLUP_WRITE_OP,
+    ProjectionProfile,
+    ReaderConfig,
+)
+
 logger = logging.getLogger(__name__)
 
 
+class _TimedElasticsearch(Elasticsearch):
+    """Client that records every bulk response time, whichever path sends it."""
+
+    def bulk(self, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return super().bulk(*args, **kwargs)
+        finally:
+            METRICS.inc("mai_bulk_requests_total")
+            METRICS.observe("mai_es_request_seconds", time.perf_counter() - start)
+
+
 class ESIngestor:
     def __init__(self, config: ESConfig):
         self.config = config
-        self.es = Elasticsearch(
+        self.es = _TimedElasticsearch(
             self.config.url,
             verify_certs=False,  # Default to False for development
             request_timeout=30,  # Default timeout
+            connections_per_node=max(10, self.config.bulk_workers),
+        )
+        if self.config.bulk_format not in ("actions", "ndjson"):
+            raise ValueError(f"Unsupported bulk format: {self.config.bulk_format}")
+        if self.config.write_op not in ("create", "index"):
+            raise ValueError(f"Unsupported write op: {self.config.write_op}")
+        if self.config.rollover not in ("none", "daily"):
+            raise ValueError(f"Unsupported rollover: {self.config.rollover}")
+        if self.config.retention_days and not (
+            self.config.rollover == "daily" and self.config.install_templates
+        ):
+            raise ValueError("retention_days requires daily rollover and installed templates")
+        self.encoder = get_json_encoder(self.config.json_encoder)
+        # TWC columns to index and the dtypes they are read as
+        self.profile = get_profile(self.config.projection)
+        spool = None
+        if self.config.spool_dir:
+            spool = Spool(self.config.spool_dir, self.config.spool_max_bytes)
+        self.sender = BulkSender(
+            self.es,
+            max_in_flight=self.config.bulk_workers,
+            queue_size=self.config.bulk_queue_size,
+            max_retries=self.config.bulk_max_retries,
+            initial_backoff=self.config.bulk_initial_backoff,
+            spool=spool,
+        )
+        if spool is not None and not spool.is_empty():
+            # Replay what an earlier run left behind before new data arrives
+            self.sender.start()
+        self._collector = f"ingestor-{id(self)}"
+        METRICS.add_collector(self._collector, self._gauges)
+        self._flushed = self.sender.snapshot()
+        self._pending = False
+        # Running totals across both bulk paths, used for per-file accounting
+        self.docs_indexed = 0
+        self.docs_failed = 0
+        # Replayed documents whose id was already indexed ("create" conflicts)
+        self.docs_existing = 0
+        # Documents written to the spool for later delivery
+        self.docs_spooled = 0
+        # Local prefix/domain tables, applied to flow chunks before building
+        self.lookups: Optional[Lookups] = None
+        if self.config.ip_tables or self.config.domain_tables:
+            self.lookups = Lookups(self.config.ip_tables, self.config.domain_tables)
+        # Live-mode window summaries; created here, fed by rollup_chunk
+        self.rollup: Optional[RollupAggregator] = None
+        self._rollup_index: Optional[str] = None
+        # Columns each chunk needs: the indexed ones plus the rollup inputs
+        self.chunk_columns = self.profile.columns
+        if self.config.rollup_seconds:
+            self.rollup = RollupAggregator(
+                self.config.rollup_seconds,
+                self.config.rollup_dimensions,
+                self.config.rollup_watermark,
+            )
+            if self.profile.columns is not None:
+                self.chunk_columns = list(
+                    dict.fromkeys(self.profile.columns + ROLLUP_INPUT_COLUMNS)
+                )
+        # Raw flows with every TWC column, kept for replay without twc
+        self.archive: Optional[ArchiveWriter] = None
+        if self.config.archive_dir:
+            self.archive = ArchiveWriter(
+                self.config.archive_dir, self.config.archive_format
+            )
+
+    def prepare_index(self, index: str, kind: str = "flow") -> None:
+        """Install the typed index template for ``index`` if enabled in the config.
+
+        Args:
+            index: Target index name
+            kind: ``flow``, ``ddos``, ``rollup`` or ``ddos_analytics``; flow
+                and DDoS indices also get their rollup or analytics index
+                when those are enabled
+        """
+        if kind == "flow" and self.rollup is not None:
+            self.prepare_index(f"{index}{ROLLUP_INDEX_SUFFIX}", "rollup")
+        if kind == "ddos" and self.config.ddos_analytics:
+            self.prepare_index(f"{index}{DDOS_ANALYTICS_SUFFIX}", "ddos_analytics")
+        if not self.config.install_templates:
+            return
+        try:
+            install_template(self.es, index, kind)
+            if self.config.rollover == "daily":
+                lifecycle = None
+                if self.config.retention_days:
+                    lifecycle = install_retention_policy(
+                        self.es, index, self.config.retention_days
+                    )
+                install_daily_template(self.es, index, kind, lifecycle)
+        except ApiError as e:
+            # Without its template the index would be mapped by whichever
+            # other template matches, e.g. flow mappings for DDoS rows
+            raise RuntimeError(f"Could not install index template for {index}: {e}") from e
+
+    def bulk_load(self, index: str) -> ContextManager[None]:
+        """Return a context that applies backfill index settings if enabled."""
+        if self.config.backfill_tuning:
+            return bulk_load_settings(self.es, index)
+        return nullcontext()
+
+    def _gauges(self) -> Dict[str, float]:
+        stats = self.sender.snapshot()
+        gauges = {
+            "mai_sender_queue_depth": stats["queue_depth"],
+            "mai_sender_in_flight": stats["in_flight"],
+            "mai_spool_segments": stats["spool_segments"],
+            "mai_spool_bytes": stats["spool_bytes"],
+            "mai_spool_docs": stats["spool_docs"],
+            "mai_spool_lag_seconds": stats["spool_lag"],
+        }
+        if self.lookups is not None:
+            cache = self.lookups.cache_stats()
+            gauges["mai_lookup_cache_hits"] = cache["hits"]
+            gauges["mai_lookup_cache_misses"] = cache["misses"]
+        return gauges
+
+    @property
+    def read_columns(self) -> Optional[List[str]]:
+        """Columns to read from TWC output; all of them when archiving."""
+        return None if self.archive is not None else self.chunk_columns
+
+    def archive_chunk(self, chunk: Frame, source: str) -> Frame:
+        """Archive a raw TWC chunk and return the columns to index."""
+        if self.archive is None:
+            return chunk
+        self.archive.write(chunk, source)
+        return self.index_columns(chunk)
+
+    def index_columns(self, chunk: Frame) -> Frame:
+        """Return the columns of a raw TWC chunk to index, leaving the chunk intact.
+
+        Lets a caller prepare and send a chunk before archiving it.
+        """
+        if self.archive is None:
+            return chunk
+        if self.chunk_columns is None:
+            return chunk.copy(deep=False) if isinstance(chunk, pd.DataFrame) else chunk
+        return select_columns(chunk, self.chunk_columns)
+
+    def roll_archive(self) -> None:
+        """Finish archive files that have been open too long, e.g. of an idle capture."""
+        if self.archive is not None:
+            self.archive.roll()
+
+    def rollup_chunk(
+        self, chunk: Frame, index: str, fields: Dict[str, Any]
+    ) -> Tuple[Frame, Dict[str, Any]]:
+        """Fold a prepared flow chunk into the rollups and return the raw flows to index.
+
+        Args:
+            chunk: Chunk from ``prepare_flow_chunk``
+            index: Index of the raw flows
+            fields: Batch fields from ``prepare_flow_chunk``
+
+        Returns:
+            Tuple of (raw flows to index, batch fields for them)
+        """
+        self.fold_rollup(chunk, index)
+        return self.raw_flows(chunk, fields)
+
+    def fold_rollup(self, chunk: Frame, index: str) -> None:
+        """Fold a prepared flow chunk into the rollups.
+
+        Summaries of the windows the chunk closes are sent to
+        ``<index>-rollup`` with the ``index`` op, so a replayed summary
+        overwrites instead of being rejected as a conflict. Callers that may
+        read a chunk again after a failed delivery fold it only once it has
+        been delivered.
+        """
+        if self.rollup is None:
+            return
+        self._rollup_index = f"{index}{ROLLUP_INDEX_SUFFIX}"
+        self.ingest_dataframe(
+            self.rollup.add(chunk),
+            self._rollup_index,
+            time_column=WINDOW_COLUMN,
+            op_type=ROLLUP_WRITE_OP,
+        )
+
+    def raw_flows(
+        self, chunk: Frame, fields: Dict[str, Any]
+    ) -> Tuple[Frame, Dict[str, Any]]:
+        """Return the raw flows of a prepared chunk to index.
+
+        With ``raw_sample_rate`` below 1 only that share of the flows is
+        returned, chosen by document id so a replay keeps the same flows,
+        and they carry a ``sample_rate`` field.
+        """
+        if self.rollup is None:
+            return chunk, fields
+        names = chunk.schema.names if isinstance(chunk, pa.RecordBatch) else chunk.columns
+        if self.profile.columns is not None:
+            # Rollup inputs that are not indexed themselves
+            extra = set(ROLLUP_INPUT_COLUMNS) - set(self.profile.columns)
+            chunk = select_columns(chunk, [name for name in names if name not in extra])
+        rate = self.config.raw_sample_rate
+        if rate >= 1:
+            return chunk, fields
+        keep = sample_mask(chunk, rate)
+        if isinstance(chunk, pa.RecordBatch):
+            chunk = chunk.filter(pa.array(keep))
+        else:
+            chunk = chunk[keep]
+        return chunk, {**fields, "sample_rate": rate}
+
+    @property
+    def rollup_closed_before(self) -> Optional[int]:
+        """Start in epoch milliseconds of the oldest rollup window not yet summarized."""
+        return self.rollup.closed_before if self.rollup is not None else None
+
+    def resume_rollup(self, closed_before: Optional[int]) -> None:
+        """Skip rollup windows an earlier run already summarized.
+
+        Args:
+            closed_before: ``rollup_closed_before`` as recorded by that run
+        """
+        if self.rollup is not None and closed_before is not None:
+            self.rollup.resume(closed_before)
+
+    def ddos_analyzer(self, source: str) -> Optional[WindowAnalyzer]:
+        """Return a fresh window analyzer for a DDoS file, None if analytics are off.
+
+        Baselines are kept per file: worker processes take whole files in no
+        particular order, so windows of different files do not form one series.
+        """
+        if not self.config.ddos_analytics:
+            return None
+        return WindowAnalyzer(
+            source,
+            zscore=self.config.ddos_alert_zscore,
+            baseline_windows=self.config.ddos_baseline_windows,
         )
 
-    def _create_actions(self, df: pd.DataFrame, index: str) -> List[Dict[str, Any]]:
+    def ingest_analytics(self, documents: Tuple[pd.DataFrame, ...], index: str) -> None:
+        """Send DDoS window summaries and breach events to ``<index>-analytics``."""
+        for frame in documents:
+            self.ingest_dataframe(
+                frame, f"{index}{DDOS_ANALYTICS_SUFFIX}", time_column=DDOS_TIME_COLUMN
+            )
+
+    def finish_archive(self, source: str, ok: bool = True) -> None:
+        """Finish the archive files of a fully read source, or drop them if it failed."""
+        if self.archive is None:
+            return
+        if ok:
+            self.archive.close_source(source)
+        else:
+            self.archive.discard_source(source)
+
+    def _create_actions(
+        self,
+        df: Frame,
+        index: str,
+        fields: Optional[Dict[str, Any]] = None,
+        op_type: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
         """Create Elasticsearch bulk actions from DataFrame."""
-        return [
-            {"_index": index, "_source": row.dropna().to_dict()}
-            for _, row in df.iterrows()
-        ]
+        return build_actions(df, index, op_type or self.config.write_op, fields)
 
-    def bulk_ingest(self, actions: List[Dict[str, Any]]) -> None:
+    def bulk_ingest(self, actions: Iterable[Dict[str, Any]]) -> None:
         """Perform bulk ingestion with error handling."""
+        consumed = 0
+        # Building happens lazily inside helpers.bulk; time it separately
+        # so the rest of the call can be attributed to sending
+        build_start = METRICS.counter("mai_stage_seconds_total", stage="build")
+        start = time.perf_counter()
+
+        def counted() -> Iterator[Dict[str, Any]]:
+            nonlocal consumed
+            for action in timed_iter(
+                actions, "build", measure=lambda action: (1, 0), flush_every=1000
+            ):
+                consumed += 1
+                yield action
+
         try:
             success, failed = helpers.bulk(
                 self.es,
-                actions,
+                counted(),
                 chunk_size=self.config.bulk_chunk_size,
+                max_chunk_bytes=self.config.bulk_max_bytes,
                 raise_on_error=False,
+                # Ids make replays idempotent, so rejected chunks are retried
+                max_retries=self.config.bulk_max_retries,
+                initial_backoff=self.config.bulk_initial_backoff,
+            )
+            existing = sum(
+                1
+                for item in failed
+                if next(iter(item.values())).get("status") == CONFLICT_STATUS
+            )
+            self.docs_indexed += success
+            self.docs_failed += len(failed) - existing
+            self.docs_existing += existing
+            build = METRICS.counter("mai_stage_seconds_total", stage="build") - build_start
+            record_stage(
+                "send", time.perf_counter() - start - build, consumed, success + existing
             )
-            if failed:
-                logger.warning(f"Failed to ingest {len(failed)} documents")
+            METRICS.inc("mai_bulk_docs_total", success, result="indexed")
+            METRICS.inc("mai_bulk_docs_total", existing, result="existing")
+            METRICS.inc("mai_bulk_docs_total", len(failed) - existing, result="failed")
+            if len(failed) > existing:
+                logger.warning(f"Failed to ingest {len(failed) - existing} documents")
+            if existing:
+                logger.info(f"Skipped {existing} documents that were already indexed")
             logger.info(f"Successfully ingested {success} documents")
         except BulkIndexError as e:
+            self.docs_failed += consumed
+            METRICS.inc("mai_bulk_docs_total", consumed, result="failed")
             logger.error(f"Bulk index error: {str(e)}")
         except Exception as e:
+            # Whatever was handed to the client may not have been indexed
+            self.docs_failed += consumed
+            METRICS.inc("mai_bulk_docs_total", consumed, result="failed")
             logger.error(f"Unexpected error during bulk ingestion: {str(e)}")
 
+    def bulk_ingest_ndjson(self, batches: Iterable[Tuple[int, bytes]]) -> None:
+        """Queue pre-serialized NDJSON request bodies on the bulk sender.
+
+        Bodies are sent by ``BulkSender`` worker threads; this call only blocks
+        while the sender queue is full. Call ``flush`` to wait for delivery.
+
+        Args:
+            batches: Tuples of (document count, request body) from ``batch_ndjson``
+        """
+        for count, body in batches:
+            self._pending = True
+            self.sender.submit(count, body)
+
+    def ingest_dataframe(
+        self,
+        df: Frame,
+        index: str,
+        fields: Optional[Dict[str, Any]] = None,
+        time_column: str = "first_timestamp",
+        op_type: Optional[str] = None,
+    ) -> None:
+        """Index a DataFrame or record batch using the configured bulk format.
+
+        With daily rollover, rows are routed to ``index-YYYY.MM.DD`` by
+        their ``time_column``.
+
+        Args:
+            df: Chunk of records to index
+            index: Target Elasticsearch index
+            fields: Batch fields added to every document, from ``enrich_chunk``
+            time_column: Epoch-millisecond column daily rollover routes by
+            op_type: Bulk operation overriding ``ESConfig.write_op``
+        """
+        if len(df) == 0:
+            return
+        if self.config.rollover == "daily":
+            for day_index, part in split_by_day(df, index, time_column):
+                self._ingest_frame(part, day_index, fields, op_type)
+        else:
+            self._ingest_frame(df, index, fields, op_type)
+
+    def _ingest_frame(
+        self,
+        df: Frame,
+        index: str,
+        fields: Optional[Dict[str, Any]] = None,
+        op_type: Optional[str] = None,
+    ) -> None:
+        # Only the sender can spool, so a spool implies the NDJSON path
+        if (
+            self.config.bulk_format == "ndjson"
+            or self.config.bulk_workers > 1
+            or self.config.spool_dir
+        ):
+            records = timed_iter(
+                iter_ndjson_records(
+                    df, index, self.encoder, op_type or self.config.write_op, fields
+                ),
+                "build",
+                measure=lambda record: (1, len(record)),
+                flush_every=1000,
+            )
+            self.bulk_ingest_ndjson(
+                batch_ndjson(
+                    records, self.config.bulk_chunk_size, self.config.bulk_max_bytes
+                )
+            )
+        else:
+            self.bulk_ingest(self._create_actions(df, index, fields, op_type))
+
+    def flush(self) -> None:
+        """Wait for queued bulk bodies to be sent and log what was indexed."""
+        if not self._pending:
+            return
+        self._pending = False
+        stats = self.sender.flush()
+        success = stats["docs_sent"] - self._flushed["docs_sent"]
+        failed = stats["docs_failed"] - self._flushed["docs_failed"]
+        existing = stats["docs_existing"] - self._flushed["docs_existing"]
+        spooled = stats["docs_spooled"] - self._flushed["docs_spooled"]
+        self._flushed = stats
+        self.docs_indexed += success
+        self.docs_failed += failed
+        self.docs_existing += existing
+        self.docs_spooled += spooled
+        if failed:
+            logger.warning(f"Failed to ingest {failed} documents")
+        if existing:
+            logger.info(f"Skipped {existing} documents that were already indexed")
+        if stats["spool_segments"]:
+            logger.warning(
+                f"Spool holds {stats['spool_docs']} documents in "
+                f"{stats['spool_segments']} segments ({stats['spool_bytes']} bytes), "
+                f"lag {stats['spool_lag']:.0f}s"
+            )
+        logger.info(
+            f"Successfully ingested {success} documents "
+            f"(in-flight {stats['in_flight']}, queue {stats['queue_depth']}, "
+            f"latency p50 {stats['latency_p50'] * 1000:.0f}ms "
+            f"p99 {stats['latency_p99'] * 1000:.0f}ms)"
+        )
+
+    def close(self) -> None:
+        """Flush pending bulk bodies, stop the sender threads and finish the archive.
+
+        Rollup windows still open are summarized and sent first.
+        """
+        if self.rollup is not None and self._rollup_index is not None:
+            self.ingest_dataframe(
+                self.rollup.close(),
+                self._rollup_index,
+                time_column=WINDOW_COLUMN,
+                op_type=ROLLUP_WRITE_OP,
+            )
+        self.flush()
+        self.sender.close()
+        if self.archive is not None:
+            self.archive.close()
+        METRICS.remove_collector(self._collector)
+
+
+def iter_orc_chunks(
+    file_path: Union[str, Path],
+    columns: Optional[List[str]],
+    chunk_size: int,
+    profile: Optional[ProjectionProfile] = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield DataFrame chunks from an ORC file one stripe at a time.
+
+    Only the requested columns are decoded, and at most one stripe is held
+    in memory, so peak usage does not grow with file size.
+
+    Args:
+        file_path: Path to the ORC file
+        columns: Columns to read (all when None)
+        chunk_size: Maximum rows per yielded chunk
+        profile: Projection profile whose dtypes the columns are cast to
+    """
+    orc_data = orc.ORCFile(file_path)
+    for stripe in range(orc_data.nstripes):
+        batch = orc_data.read_stripe(stripe, columns=columns)
+        if profile is not None:
+            batch = cast_batch(batch, profile)
+        for offset in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(offset, chunk_size).to_pandas()
+
+
+def iter_arrow_csv_batches(
+    file_path: Union[str, Path],
+    columns: Optional[List[str]],
+    chunk_size: int,
+    column_types: Optional[Dict[str, pa.DataType]] = None,
+) -> Iterator[pa.RecordBatch]:
+    """Yield Arrow record batches from a CSV file with pyarrow's streaming reader.
+
+    Parsing and type conversion run on pyarrow's thread pool, only the
+    requested columns are converted, and batches are sliced to at most
+    ``chunk_size`` rows.
+
+    Args:
+        file_path: Path to the CSV file
+        columns: Columns to read (all when None)
+        chunk_size: Maximum rows per yielded batch
+        column_types: Arrow types for known columns, e.g. ``{"sport": pa.uint16()}``
+    """
+    types = {
+        name: column_type
+        for name, column_type in (column_types or {}).items()
+        if columns is None or name in columns
+    }
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types=types,
+            strings_can_be_null=True,
+        ),
+    )
+    for batch in reader:
+        for offset in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(offset, chunk_size)
+
 
 def read_data_file(
-    file_path: str, columns: List[str], chunk_size: Optional[int] = None
+    file_path: str,
+    columns: Optional[List[str]],
+    chunk_size: Optional[int] = None,
+    read_config: Optional[ReaderConfig] = None,
+    profile: Optional[ProjectionProfile] = None,
 ) -> Union[pd.DataFrame, Any]:
-    """Read data from either CSV or ORC file."""
+    """Read data from either CSV or ORC file.
+
+    With ``chunk_size`` an iterator of chunks is returned. CSV chunks are
+    Arrow record batches when ``read_config.csv_engine`` is ``arrow``.
+    With a projection ``profile``, columns are read as its compact dtypes.
+    """
     file_path = Path(file_path)
+    read_config = read_config or ReaderConfig()
     if file_path.suffix.lower() == ".csv":
-        return pd.read_csv(file_path, usecols=columns, chunksize=chunk_size)
+        names = csv_header(file_path) if profile is not None else []
+        if chunk_size and read_config.csv_engine == "arrow":
+            types = arrow_types(profile, names, columns) if profile is not None else None
+            return iter_arrow_csv_batches(file_path, columns, chunk_size, types)
+        dtypes = pandas_dtypes(profile, names, columns) if profile is not None else None
+        return pd.read_csv(file_path, usecols=columns, dtype=dtypes, chunksize=chunk_size)
     elif file_path.suffix.lower() == ".orc":
-        # Read ORC file using pyarrow
-        orc_data = orc.ORCFile(file_path)
-        df = orc_data.read().to_pandas()
-        if columns:
-            df = df[columns]
         # If chunk_size is specified, return an iterator
         if chunk_size:
-            return np.array_split(df, max(len(df) // chunk_size, 1))
-        return df
+            return iter_orc_chunks(file_path, columns, chunk_size, profile)
+        table = orc.ORCFile(file_path).read(columns=columns)
+        if profile is not None:
+            table = pa.Table.from_batches(
+                [cast_batch(batch, profile) for batch in table.to_batches()]
+            )
+        return table.to_pandas()
     else:
         raise ValueError(f"Unsupported file format: {file_path.suffix}")
 
 
-def process_data_file(file_path: str, es_ingestor: ESIngestor, index: str) -> None:
+def select_columns(frame: Frame, columns: List[str]) -> Frame:
+    """Return the ``columns`` of a chunk that it has, in that order."""
+    if isinstance(frame, pa.RecordBatch):
+        return frame.select([name for name in columns if name in frame.schema.names])
+    return frame[[name for name in columns if name in frame.columns]]
+
+
+def sample_mask(chunk: Frame, rate: float) -> np.ndarray:
+    """Return a mask keeping about ``rate`` of a chunk's rows.
+
+    Rows are picked by a hash of their document id when the chunk has ids,
+    so the same flows are kept every time they are read.
+    """
+    names = chunk.schema.names if isinstance(chunk, pa.RecordBatch) else chunk.columns
+    if DOC_ID_COLUMN in names:
+        if isinstance(chunk, pa.RecordBatch):
+            ids = chunk.column(DOC_ID_COLUMN).to_numpy(zero_copy_only=False)
+        else:
+            ids = chunk[DOC_ID_COLUMN].to_numpy()
+        hashes = pd.util.hash_array(ids.astype(object))
+    else:
+        hashes = np.random.default_rng().integers(
+            0, 2**64 - 1, len(chunk), dtype=np.uint64, endpoint=True
+        )
+    return hashes < np.uint64(min(int(rate * 2**64), 2**64 - 1))
+
+
+def prepare_flow_chunk(
+    chunk: Frame, file_path: str, lookups: Optional[Lookups] = None
+) -> Tuple[Frame, Dict[str, Any]]:
+    """Add document ids, convert timestamps and look up attributes for a chunk of TWC flows.
+
+    Args:
+        chunk: Chunk of TWC flows
+        file_path: Source of the chunk
+        lookups: Local tables to enrich sip/dip and sni/dns from (default: none)
+
+    Returns:
+        Tuple of (chunk, batch fields for ``ingest_dataframe``)
+    """
+    ids = flow_ids(chunk)
+    # TWC timestamps are epoch microseconds
+    chunk, fields = enrich_chunk(chunk, "first_timestamp", "us", source=file_path)
+    if lookups is not None:
+        chunk = lookups.apply(chunk)
+    if ids is None:
+        return chunk, fields
+    if isinstance(chunk, pa.RecordBatch):
+        return chunk.append_column(DOC_ID_COLUMN, pa.array(ids, pa.string())), fields
+    chunk[DOC_ID_COLUMN] = ids
+    return chunk, fields
+
+
+def process_data_file(
+    file_path: str,
+    es_ingestor: ESIngestor,
+    index: str,
+    read_config: Optional[ReaderConfig] = None,
+) -> None:
     """Process a single data file (CSV or ORC) and ingest to Elasticsearch."""
     try:
         # Read data in chunks to handle large files
-        chunks = read_data_file(file_path, TWCConfig.COLUMNS, CHUNK_SIZE)
+        chunks = timed_iter(
+            read_data_file(
+                file_path,
+                es_ingestor.read_columns,
+                CHUNK_SIZE,
+                read_config,
+                es_ingestor.profile,
+            ),
+            "parse",
+        )
+        failed = es_ingestor.docs_failed
 
         for chunk in chunks:
-            chunk["source_file"] = os.path.basename(file_path)
-            chunk["ingested_at"] = datetime.utcnow().isoformat()
-
-            # Optimize timestamp conversion
-            chunk["first_timestamp"] = chunk["first_timestamp"] / 1_000_000
-            chunk.loc[chunk["first_timestamp"].notna(), "first_timestamp"] = (
-                pd.to_datetime(
-                    chunk.loc[chunk["first_timestamp"].notna(), "first_timestamp"],
-                    unit="s",
-                ).dt.isoformat()
-            )
-
-            actions = es_ingestor._create_actions(chunk, index)
-            if actions:
-                es_ingestor.bulk_ingest(actions)
+            chunk = es_ingestor.archive_chunk(chunk, file_path)
+            chunk, fields = prepare_flow_chunk(chunk, file_path, es_ingestor.lookups)
+            es_ingestor.ingest_dataframe(chunk, index, fields)
 
+        es_ingestor.flush()
+        record_stage("parse", 0.0, nbytes=os.path.getsize(file_path))
+        if es_ingestor.docs_failed > failed:
+            # Leave the file unmarked so the next run retries it; ids make
+            # the documents that did arrive no-ops on replay
+            raise RuntimeError(
+                f"{es_ingestor.docs_failed - failed} documents were not ingested"
+            )
+        es_ingestor.finish_archive(file_path)
         logger.info(f"Completed processing file: {file_path}")
     except Exception as e:
+        # The file is retried on the next run and archived again then
+        es_ingestor.finish_archive(file_path, ok=False)
         logger.error(f"Error processing file {file_path}: {str(e)}")
         raise
 
@@ -106,49 +729,175 @@ def process_data_file(file_path: str, es_ingestor: ESIngestor, index: str) -> No
 def process_ddos_data(file_path: str, es_ingestor: ESIngestor, index: str) -> None:
     """Process a single DDoS data file (CSV or ORC) and ingest to Elasticsearch."""
     try:
-        chunks = read_data_file(file_path, None, CHUNK_SIZE)
+        chunks = timed_iter(
+            read_data_file(file_path, None, CHUNK_SIZE, ReaderConfig(csv_engine="pandas")),
+            "parse",
+        )
 
+        source = os.path.basename(file_path)
+        position = 0
+        analyzer = es_ingestor.ddos_analyzer(file_path)
         for chunk in chunks:
-            chunk["timestamp"] = chunk["window_id"] * 30
-            chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], unit="s")
-
-            actions = es_ingestor._create_actions(chunk, index)
-            if actions:
-                es_ingestor.bulk_ingest(actions)
+            chunk[DOC_ID_COLUMN] = row_ids(chunk, source, position, "window_id")
+            position += len(chunk)
+            if analyzer is not None:
+                es_ingestor.ingest_analytics(analyzer.add(chunk), index)
+            chunk, fields = enrich_chunk(
+                chunk, "window_id", "s", step=DDOS_WINDOW_SECONDS, target="timestamp"
+            )
+            es_ingestor.ingest_dataframe(chunk, index, fields)
 
+        if analyzer is not None:
+            es_ingestor.ingest_analytics(analyzer.close(), index)
+            if analyzer.breaches:
+                logger.warning(
+                    f"{analyzer.breaches} DDoS rates above baseline in {file_path}"
+                )
+        es_ingestor.flush()
+        record_stage("parse", 0.0, nbytes=os.path.getsize(file_path))
         logger.info(f"Completed processing DDoS file: {file_path}")
     except Exception as e:
         logger.error(f"Error processing DDoS file {file_path}: {str(e)}")
         raise
 
 
+@dataclass
+class FileResult:
+    """Per-file outcome of a DDoS ingestion run."""
+
+    file: str
+    docs_indexed: int = 0
+    docs_failed: int = 0
+    docs_existing: int = 0
+    docs_spooled: int = 0
+    error: Optional[str] = None
+    # Worker metrics for the parent to merge into its registry
+    metrics: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.docs_failed == 0
+
+
+# One ingestor, and so one Elasticsearch client, per worker process
+_worker_ingestor: Optional[ESIngestor] = None
+
+
+def _init_ddos_worker(es_config: ESConfig, log_level: int) -> None:
+    global _worker_ingestor
+    # Spawned and forkserver workers start without the CLI's logging setup
+    configure_logging(log_level)
+    start_worker_profiler("ddos-worker")
+    _worker_ingestor = ESIngestor(es_config)
+    # Stop the sender threads and release the spool before the worker exits;
+    # the higher priority runs this ahead of the profiler's finalizer
+    multiprocessing.util.Finalize(None, _worker_ingestor.close, exitpriority=20)
+
+
+def _ddos_worker(file_path: str, index: str) -> FileResult:
+    es_ingestor = _worker_ingestor
+    indexed, failed = es_ingestor.docs_indexed, es_ingestor.docs_failed
+    existing, spooled = es_ingestor.docs_existing, es_ingestor.docs_spooled
+    result = FileResult(file=file_path)
+    try:
+        process_ddos_data(file_path, es_ingestor, index)
+    except Exception as e:
+        result.error = str(e)
+    result.docs_indexed = es_ingestor.docs_indexed - indexed
+    result.docs_failed = es_ingestor.docs_failed - failed
+    result.docs_existing = es_ingestor.docs_existing - existing
+    result.docs_spooled = es_ingestor.docs_spooled - spooled
+    result.metrics = METRICS.export(reset=True)
+    return result
+
+
 def ddos_ingest_output_folder(
-    folder: str, es_url: str = "http://localhost:9200", index: str = "streaming") -> None:
+    folder: str,
+    es_url: str = "http://localhost:9200",
+    index: str = "streaming",
+    es_config: Optional[ESConfig] = None,
+    workers: Optional[int] = None,
+) -> List[FileResult]:
     """Ingest DDoS data files from a folder into Elasticsearch.
 
+    Files are spread over a pool of worker processes, each with its own
+    Elasticsearch client, so parsing and serialization scale with cores.
+
     Args:
         folder: Directory containing DDoS data files
         es_url: Elasticsearch URL (default: http://localhost:9200)
         index: Elasticsearch index name (default: streaming)
+        es_config: Full ingestion settings; overrides ``es_url`` when given
+        workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        One result per file with indexed, existing and failed document counts
     """
-    es_config = ESConfig(url=es_url)
-    es_ingestor = ESIngestor(es_config)
+    es_config = es_config or ESConfig(url=es_url)
 
-    try:
-        files = []
-        for ext in ["csv", "orc"]:
-            files.extend(glob.glob(os.path.join(folder, f"**/*.{ext}"), recursive=True))
+    files = []
+    for ext in ["csv", "orc"]:
+        files.extend(glob.glob(os.path.join(folder, f"**/*.{ext}"), recursive=True))
+    # Largest files first so one big file does not finish last on its own
+    files.sort(key=os.path.getsize, reverse=True)
+
+    setup_ingestor = ESIngestor(es_config)
+    setup_ingestor.prepare_index(index, "ddos")
 
-        with ThreadPoolExecutor() as executor:
-            for file in files:
-                executor.submit(process_ddos_data, file, es_ingestor, index)
+    results = []
+    try:
+        with setup_ingestor.bulk_load(index), ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_ddos_worker,
+            initargs=(es_config, logging.getLogger().getEffectiveLevel()),
+        ) as executor:
+            futures = {
+                executor.submit(_ddos_worker, file, index): file for file in files
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    result = FileResult(file=futures[future], error=str(e))
+                if result.metrics:
+                    METRICS.merge(result.metrics)
+                results.append(result)
+                if result.ok:
+                    logger.info(
+                        f"Ingested {result.docs_indexed} documents from {result.file}"
+                    )
+                else:
+                    logger.error(
+                        f"Failed to ingest {result.file}: {result.docs_failed} "
+                        f"documents failed, error: {result.error}"
+                    )
     except Exception as e:
         logger.error(f"Error processing folder {folder}: {str(e)}")
         raise
+    finally:
+        # Nothing was submitted here, so close() runs a replay pass over what
+        # the workers spooled; whatever the cluster still refuses stays on disk
+        setup_ingestor.close()
+
+    failed = [result for result in results if not result.ok]
+    logger.info(
+        f"DDoS ingestion summary: {len(results) - len(failed)} files succeeded, "
+        f"{len(failed)} failed, "
+        f"{sum(result.docs_indexed for result in results)} documents indexed, "
+        f"{sum(result.docs_existing for result in results)} already present, "
+        f"{sum(result.docs_spooled for result in results)} spooled, "
+        f"{sum(result.docs_failed for result in results)} documents failed"
+    )
+    return results
 
 
 def ingest_output_folder(
-    folder: str, es_url: str = "http://localhost:9200", index: str = "streaming"
+    folder: str,
+    es_url: str = "http://localhost:9200",
+    index: str = "streaming",
+    es_config: Optional[ESConfig] = None,
+    read_config: Optional[ReaderConfig] = None,
 ) -> None:
     """Ingest data files from a folder into Elasticsearch.
 
@@ -156,23 +905,122 @@ def ingest_output_folder(
         folder: Directory containing data files
         es_url: Elasticsearch URL (default: http://localhost:9200)
         index: Elasticsearch index name (default: streaming)
+        es_config: Full ingestion settings; overrides ``es_url`` when given
+        read_config: Data file reader settings
     """
-    es_config = ESConfig(url=es_url)
+    es_config = es_config or ESConfig(url=es_url)
     es_ingestor = ESIngestor(es_config)
-    folder_path = Path(folder)
+    es_ingestor.prepare_index(index)
 
     try:
-        for ext in ["csv", "orc"]:
-            for file_path in folder_path.glob(f"**/*.{ext}"):
-                done_flag = file_path.with_suffix(file_path.suffix + PROCESSED_MARKER)
-
-                if not done_flag.exists():
-                    try:
-                        process_data_file(str(file_path), es_ingestor, index)
-                        done_flag.touch()
-                    except Exception as e:
-                        logger.error(f"Failed to process {file_path}: {str(e)}")
-                        continue
+        with es_ingestor.bulk_load(index):
+            ingest_new_files(folder, es_ingestor, index, read_config)
     except Exception as e:
         logger.error(f"Error processing folder {folder}: {str(e)}")
         raise
+    finally:
+        es_ingestor.close()
+
+
+def ingest_new_files(
+    folder: str,
+    es_ingestor: ESIngestor,
+    index: str,
+    read_config: Optional[ReaderConfig] = None,
+    skip: Iterable[str] = (),
+) -> int:
+    """Ingest every data file in a folder that has no processed marker yet.
+
+    Args:
+        folder: Directory containing data files
+        es_ingestor: Ingestor shared across calls
+        index: Elasticsearch index name
+        read_config: Data file reader settings
+        skip: Directories under ``folder`` whose files are left alone
+
+    Returns:
+        Number of files that failed and were left unmarked
+    """
+    folder_path = Path(folder)
+    skipped = tuple(os.path.join(os.path.abspath(directory), "") for directory in skip)
+    with stage_timer("discover") as sample:
+        pending = [
+            file_path
+            for ext in ["csv", "orc"]
+            for file_path in folder_path.glob(f"**/*.{ext}")
+            if not file_path.with_suffix(file_path.suffix + PROCESSED_MARKER).exists()
+            and not (skipped and os.path.abspath(file_path).startswith(skipped))
+        ]
+        sample.rows_out = len(pending)
+
+    failed = 0
+    for file_path in pending:
+        done_flag = file_path.with_suffix(file_path.suffix + PROCESSED_MARKER)
+        try:
+            process_data_file(str(file_path), es_ingestor, index, read_config)
+            done_flag.touch()
+        except Exception as e:
+            logger.error(f"Failed to process {file_path}: {str(e)}")
+            failed += 1
+    return failed
+
+
+def replay_archive(
+    archive_dir: str,
+    es_url: str = "http://localhost:9200",
+    index: str = "streaming",
+    es_config: Optional[ESConfig] = None,
+    start: Optional[TimeBound] = None,
+    end: Optional[TimeBound] = None,
+) -> int:
+    """Bulk-load archived flows into an index, e.g. after a mapping change.
+
+    Document ids are derived from the flows themselves, so replaying into an
+    index that already holds some of them does not duplicate them. The
+    ``es_config.projection`` profile picks the columns to index.
+
+    Args:
+        archive_dir: Archive written with ``ESConfig.archive_dir``
+        es_url: Elasticsearch URL (default: http://localhost:9200)
+        index: Elasticsearch index name (default: streaming)
+        es_config: Full ingestion settings; overrides ``es_url`` when given
+        start: Earliest ``first_timestamp`` to replay (UTC, default: unbounded)
+        end: ``first_timestamp`` to stop before (UTC, default: unbounded)
+
+    Returns:
+        Number of flows replayed
+
+    Raises:
+        RuntimeError: If some documents could not be ingested
+    """
+    # Replayed flows must not be archived a second time
+    es_config = replace(es_config or ESConfig(url=es_url), archive_dir=None)
+    es_ingestor = ESIngestor(es_config)
+    es_ingestor.prepare_index(index)
+
+    rows = 0
+    try:
+        batches = timed_iter(
+            iter_archive(
+                archive_dir, start, end, es_ingestor.profile.columns, CHUNK_SIZE
+            ),
+            "parse",
+            measure=lambda item: (item[0].num_rows, item[0].nbytes),
+        )
+        with es_ingestor.bulk_load(index):
+            for batch, source in batches:
+                # Archives written by the pandas reader hold wider types
+                batch = cast_batch(batch, es_ingestor.profile)
+                batch, fields = prepare_flow_chunk(batch, source, es_ingestor.lookups)
+                es_ingestor.ingest_dataframe(batch, index, fields)
+                rows += batch.num_rows
+            es_ingestor.flush()
+    finally:
+        es_ingestor.close()
+
+    logger.info(f"Replayed {rows} flows from {archive_dir} into {index}")
+    if es_ingestor.docs_failed:
+        raise RuntimeError(
+            f"{es_ingestor.docs_failed} of {rows} documents were not ingested"
+        )
+    return rows
@@ -0,0 +1,296 @@
+"""
+In-process enrichment of flows from local lookup tables.
+
+``PrefixTable`` maps IP addresses to the attributes of the most specific
+network that contains them, e.g. an ASN or a subnet tag. ``DomainTable`` maps
+host names to the attributes of their longest listed suffix, e.g. a category
+for ``sni`` and ``dns``. Both are loaded from CSV files: one column holds the
+network (CIDR) or domain and every other column is an attribute. MaxMind's
+CSV editions (``GeoLite2-ASN-Blocks-IPv4.csv`` and friends) load as is.
+
+``Lookups.apply`` adds a ``<column>_<attribute>`` column per attribute. Flows
+repeat a few thousand endpoints, so each chunk column is factorized first:
+only its distinct values are looked up, through a bounded LRU cache shared
+across chunks, and the results are spread back to the rows as integer codes.
+This replaces the per-document work of an Elasticsearch enrich processor.
+"""
+
+import abc
+import bisect
+import ipaddress
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from mai_streaming.builder import Frame
+from mai_streaming.config import (
+    DOMAIN_LOOKUP_COLUMNS,
+    IP_LOOKUP_COLUMNS,
+    LOOKUP_CACHE_SIZE,
+)
+from mai_streaming.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+NETWORK_COLUMN = "network"
+DOMAIN_COLUMN = "domain"
+DOMAIN_SEPARATOR = "/"  # TWC joins the names of a flow's DNS answers with "/"
+
+IPV4_NETWORK = r"^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})/(\d{1,2})$"
+
+
+class _AttributeTable(abc.ABC):
+    """Attribute rows loaded from one or more CSV files, looked up by key.
+
+    Attribute values are stored per field as object arrays with one extra
+    ``None`` at the end, so row -1 (no match) indexes to a missing value.
+    """
+
+    def __init__(self, key_column: str, paths: Sequence[str], cache_size: int):
+        self.key_column = key_column
+        frames = []
+        for path in paths:
+            frame = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+            if key_column not in frame.columns:
+                raise ValueError(f"Lookup table {path} has no '{key_column}' column")
+            frames.append(frame)
+            logger.info(f"Loaded {len(frame)} rows from lookup table {path}")
+        table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        self.keys = table[key_column].to_numpy(dtype=object) if frames else np.array([])
+        self.fields: Dict[str, np.ndarray] = {
+            name: np.append(table[name].to_numpy(dtype=object), None)
+            for name in table.columns
+            if name != key_column
+        }
+        self._row = lru_cache(maxsize=cache_size)(self._find_row)
+
+    @abc.abstractmethod
+    def _find_row(self, value: str) -> int:
+        """Return the row matching one value, -1 if none does."""
+
+    def rows(self, values: List[Any]) -> np.ndarray:
+        """Return the matching row of each value, -1 where none matches."""
+        return np.fromiter(
+            (self._row(value) if isinstance(value, str) else -1 for value in values),
+            dtype=np.int64,
+            count=len(values),
+        )
+
+    def cache_info(self) -> Any:
+        return self._row.cache_info()
+
+
+class PrefixTable(_AttributeTable):
+    """Longest-prefix match of IPv4 and IPv6 addresses against CIDR networks.
+
+    Networks are kept per address family in a list sorted by start address
+    (and prefix length for equal starts). The candidate for an address is the
+    last network starting at or before it; if that network ends before the
+    address, its enclosing networks are tried in turn. Later files win for
+    networks listed more than once.
+    """
+
+    def __init__(self, paths: Sequence[str], cache_size: int = LOOKUP_CACHE_SIZE):
+        super().__init__(NETWORK_COLUMN, paths, cache_size)
+        ranges = _network_ranges(self.keys)
+        # Per address family: sorted starts, ends, table rows and parents
+        self._families: Dict[int, Tuple[List[int], List[int], List[int], List[int]]] = {}
+        for version in (4, 6):
+            family = sorted(
+                (start, prefix, row, end)
+                for row, (start, end, prefix, row_version) in enumerate(ranges)
+                if row_version == version
+            )
+            starts = [start for start, _, _, _ in family]
+            ends = [end for _, _, _, end in family]
+            rows = [row for _, _, row, _ in family]
+            self._families[version] = (starts, ends, rows, _parents(starts, ends))
+
+    def _find_row(self, value: str) -> int:
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return -1
+        starts, ends, rows, parents = self._families[address.version]
+        number = int(address)
+        candidate = bisect.bisect_right(starts, number) - 1
+        while candidate >= 0 and ends[candidate] < number:
+            candidate = parents[candidate]
+        return rows[candidate] if candidate >= 0 else -1
+
+
+def _network_ranges(networks: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Return (first address, last address, prefix length, IP version) per network.
+
+    IPv4 networks are parsed vectorized; others go through ``ipaddress``.
+    Invalid networks are logged and get version 0, which is never looked up.
+    """
+    ranges = [(0, 0, 0, 0)] * len(networks)
+    if not len(networks):
+        return ranges
+    parts = pd.Series(networks, dtype=object).str.extract(IPV4_NETWORK).astype(float)
+    octets = parts.iloc[:, :4].to_numpy()
+    lengths = parts.iloc[:, 4].to_numpy()
+    valid = ~np.isnan(lengths) & (octets <= 255).all(axis=1) & (lengths <= 32)
+    ipv4 = np.flatnonzero(valid)
+    if len(ipv4):
+        length = lengths[ipv4].astype(np.int64)
+        address = (octets[ipv4].astype(np.int64) << np.array([24, 16, 8, 0])).sum(axis=1)
+        size = np.left_shift(1, 32 - length)
+        start = address & ~(size - 1)  # Host bits set, as ipaddress strict=False
+        for row, first, last, prefix in zip(
+            ipv4.tolist(), start.tolist(), (start + size - 1).tolist(), length.tolist()
+        ):
+            ranges[row] = (first, last, prefix, 4)
+    for row in np.flatnonzero(~valid).tolist():
+        try:
+            network = ipaddress.ip_network(networks[row], strict=False)
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping invalid network in lookup table: {networks[row]}")
+            continue
+        ranges[row] = (
+            int(network.network_address),
+            int(network.broadcast_address),
+            network.prefixlen,
+            network.version,
+        )
+    return ranges
+
+
+def _parents(starts: List[int], ends: List[int]) -> List[int]:
+    """Return the index of the closest enclosing network of each sorted network."""
+    parents = [-1] * len(starts)
+    if all(start > end for start, end in zip(starts[1:], ends)):
+        # Disjoint networks, as in MaxMind's tables
+        return parents
+    stack: List[int] = []
+    for i, start in enumerate(starts):
+        while stack and ends[stack[-1]] < start:
+            stack.pop()
+        if stack:
+            parents[i] = stack[-1]
+        stack.append(i)
+    return parents
+
+
+class DomainTable(_AttributeTable):
+    """Longest-suffix match of host names against listed domains.
+
+    ``www.youtube.com`` matches a ``youtube.com`` row unless the table lists
+    ``www.youtube.com`` itself. A value holding several names separated by
+    ``/`` takes the first name that matches. Later files win for domains
+    listed more than once.
+    """
+
+    def __init__(self, paths: Sequence[str], cache_size: int = LOOKUP_CACHE_SIZE):
+        super().__init__(DOMAIN_COLUMN, paths, cache_size)
+        self._domains: Dict[str, int] = {}
+        for row, domain in enumerate(self.keys):
+            if isinstance(domain, str):
+                if domain.startswith("*."):
+                    domain = domain[2:]
+                self._domains[_normalize(domain)] = row
+
+    def _find_row(self, value: str) -> int:
+        for name in value.split(DOMAIN_SEPARATOR):
+            labels = _normalize(name).split(".")
+            for i in range(len(labels)):
+                row = self._domains.get(".".join(labels[i:]))
+                if row is not None:
+                    return row
+        return -1
+
+
+def _normalize(name: str) -> str:
+    return name.strip().rstrip(".").lower()
+
+
+def _factorize(column: Any) -> Tuple[np.ndarray, List[Any]]:
+    """Return (code per row, -1 for nulls) and the distinct values of a column."""
+    if isinstance(column, pa.Array):
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        codes = pc.fill_null(column.indices, -1).to_numpy(zero_copy_only=False)
+        return codes.astype(np.int64, copy=False), column.dictionary.to_pylist()
+    codes, uniques = pd.factorize(column)
+    return codes.astype(np.int64, copy=False), list(uniques)
+
+
+class Lookups:
+    """Enrich flow chunks from local IP prefix and domain tables.
+
+    Args:
+        ip_tables: CSV files with a ``network`` column, for ``ip_columns``
+        domain_tables: CSV files with a ``domain`` column, for ``domain_columns``
+        ip_columns: Address columns to look up
+        domain_columns: Host name columns to look up
+        cache_size: Distinct values remembered per table across chunks
+    """
+
+    def __init__(
+        self,
+        ip_tables: Sequence[str] = (),
+        domain_tables: Sequence[str] = (),
+        ip_columns: Sequence[str] = IP_LOOKUP_COLUMNS,
+        domain_columns: Sequence[str] = DOMAIN_LOOKUP_COLUMNS,
+        cache_size: int = LOOKUP_CACHE_SIZE,
+    ):
+        self.tables: List[Tuple[_AttributeTable, Sequence[str]]] = []
+        if ip_tables:
+            self.tables.append((PrefixTable(ip_tables, cache_size), ip_columns))
+        if domain_tables:
+            self.tables.append((DomainTable(domain_tables, cache_size), domain_columns))
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Return cache hits and misses summed over the tables."""
+        infos = [table.cache_info() for table, _ in self.tables]
+        return {
+            "hits": sum(info.hits for info in infos),
+            "misses": sum(info.misses for info in infos),
+        }
+
+    def apply(self, frame: Frame) -> Frame:
+        """Add a ``<column>_<attribute>`` column per looked-up column and attribute.
+
+        Returns:
+            The frame with the attribute columns (categorical/dictionary
+            encoded, null where nothing matched)
+        """
+        if not self.tables or len(frame) == 0:
+            return frame
+        with stage_timer("lookup") as sample:
+            sample.rows_in = len(frame)
+            names = frame.schema.names if isinstance(frame, pa.RecordBatch) else frame.columns
+            for table, columns in self.tables:
+                for column in columns:
+                    if column not in names:
+                        continue
+                    source = frame.column(column) if isinstance(frame, pa.RecordBatch) else frame[column]
+                    codes, uniques = _factorize(source)
+                    rows = table.rows(uniques)
+                    for field, values in table.fields.items():
+                        frame = _add_codes(frame, f"{column}_{field}", codes, values[rows])
+            sample.rows_out = len(frame)
+        return frame
+
+
+def _add_codes(frame: Frame, name: str, codes: np.ndarray, values: np.ndarray) -> Frame:
+    """Add the attribute of each row's distinct value as a categorical column."""
+    value_codes, categories = pd.factorize(values)
+    # Rows whose value is null (code -1) pick the trailing -1
+    row_codes = np.append(value_codes, -1)[codes]
+    if isinstance(frame, pa.RecordBatch):
+        column = pa.DictionaryArray.from_arrays(
+            pa.array(row_codes, pa.int32(), mask=row_codes < 0),
+            pa.array(list(categories), pa.string()),
+        )
+        if name in frame.schema.names:
+            return frame.set_column(frame.schema.get_field_index(name), name, column)
+        return frame.append_column(name, column)
+    frame[name] = pd.Categorical.from_codes(row_codes, categories=list(categories))
+    return frame
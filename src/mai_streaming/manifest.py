@@ -0,0 +1,83 @@
+"""
+Persistent record of completed PCAP extractions.
+
+The manifest lets ``offline`` re-runs skip captures whose file and ``twc``
+arguments are unchanged since they were last extracted.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionManifest:
+    """PCAP fingerprints and TWC arguments of completed extractions, stored as JSON.
+
+    A PCAP is current when its size, mtime and extraction command match the
+    recorded entry. With ``hash_content`` the content hash must match too,
+    which catches rewrites that preserve size and mtime. Only captures that
+    pass the cheap checks are hashed before extraction; the others are
+    hashed when their extraction is recorded.
+    """
+
+    def __init__(self, path: Path, hash_content: bool = False):
+        self.path = path
+        self.hash_content = hash_content
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable extraction manifest {path}: {e}")
+
+    def fingerprint(self, pcap: str, cmd: List[str]) -> Dict[str, Any]:
+        """Describe a PCAP and the command it would be extracted with.
+
+        The content hash is only computed when size, mtime and command match
+        the recorded entry, since a mismatch already means re-extraction.
+        """
+        stat = os.stat(pcap)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "cmd": cmd}
+        if self.hash_content and self.is_current(pcap, fingerprint):
+            fingerprint["sha256"] = file_sha256(pcap)
+        return fingerprint
+
+    def is_current(self, pcap: str, fingerprint: Dict[str, Any]) -> bool:
+        """Return True if ``pcap`` was already extracted with this fingerprint."""
+        entry = self.entries.get(os.path.abspath(pcap))
+        if entry is None:
+            return False
+        # Without hash_content a stored hash is simply not compared
+        return all(entry.get(key) == value for key, value in fingerprint.items())
+
+    def record(self, pcap: str, fingerprint: Dict[str, Any]) -> None:
+        """Record a successful extraction and atomically rewrite the manifest.
+
+        Args:
+            pcap: Path of the extracted capture
+            fingerprint: Fingerprint taken before the extraction started
+        """
+        if self.hash_content and "sha256" not in fingerprint:
+            # A rewrite during extraction changes the mtime recorded before
+            # it, so hashing the content only now is still safe
+            fingerprint = {**fingerprint, "sha256": file_sha256(pcap)}
+        self.entries[os.path.abspath(pcap)] = fingerprint
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.entries))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,416 @@
+"""
+Pipeline metrics: per-stage counters, Elasticsearch response times and sender gauges.
+
+Stages are ``twc`` (the extractor subprocess), ``discover`` (finding files to
+ingest), ``parse`` (CSV/ORC to chunks), ``archive`` (raw chunks to the local
+archive), ``lookup`` (attributes from local tables), ``rollup`` (windowed
+summaries of live flows), ``analytics`` (DDoS window summaries and
+breaches), ``build`` (chunks to bulk documents) and ``send`` (bulk
+requests). For each stage the registry counts rows in and
+out, bytes and busy seconds, which is enough to tell whether parsing,
+serialization or the cluster limits throughput.
+
+Metrics live in the process-wide ``METRICS`` registry. They are served in the
+Prometheus text format by ``start_metrics_server`` and summarized to the log
+by ``StatsReporter``; neither needs extra dependencies.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("twc", "discover", "parse", "archive", "lookup", "rollup", "analytics", "build", "send")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "mai_stage_seconds_total": "Busy time per pipeline stage",
+    "mai_stage_rows_in_total": "Rows entering each pipeline stage",
+    "mai_stage_rows_out_total": "Rows leaving each pipeline stage",
+    "mai_stage_bytes_total": "Bytes handled by each pipeline stage",
+    "mai_bulk_requests_total": "Bulk requests sent to Elasticsearch",
+    "mai_bulk_retries_total": "Bulk requests or documents retried after a rejection",
+    "mai_bulk_docs_total": "Documents by bulk outcome",
+    "mai_es_request_seconds": "Elasticsearch bulk response time",
+    "mai_rollup_late_flows_total": "Flows left out of rollups because their window had closed",
+    "mai_ddos_late_rows_total": "DDoS rows left out of analytics because their window had closed",
+    "mai_ddos_breaches_total": "DDoS window rates above their baseline threshold",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count, as in a Prometheus histogram."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def percentile(self, pct: float) -> float:
+        """Return the upper bound of the bucket holding the percentile."""
+        if not self.count:
+            return 0.0
+        target = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound if bound != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters, histograms and gauge collectors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Add ``value`` to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one histogram observation, e.g. a response time in seconds."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def add_collector(self, name: str, collect: Callable[[], Dict[str, float]]) -> None:
+        """Register a function returning gauge values, summed across collectors."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def remove_collector(self, name: str) -> None:
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Return the current value of a counter (0 if never incremented)."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            return self._counters.get(name, {}).get(key, 0.0)
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            return self._histograms.get(name, {}).get(key)
+
+    def gauges(self) -> Dict[str, float]:
+        """Return the current gauge values from every collector."""
+        with self._lock:
+            collectors = list(self._collectors.values())
+        values: Dict[str, float] = {}
+        for collect in collectors:
+            try:
+                for name, value in collect().items():
+                    values[name] = values.get(name, 0.0) + value
+            except Exception as e:
+                logger.debug(f"Metrics collector failed: {e}")
+        return values
+
+    def export(self, reset: bool = False) -> Dict[str, Any]:
+        """Return counters and histograms in a picklable form.
+
+        Worker processes export with ``reset`` after each unit of work and
+        the parent ``merge``s the result into its own registry.
+        """
+        with self._lock:
+            state = {
+                "counters": {
+                    name: dict(series) for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: {
+                        key: (hist.counts[:], hist.sum, hist.count)
+                        for key, hist in series.items()
+                    }
+                    for name, series in self._histograms.items()
+                },
+            }
+            if reset:
+                self._counters.clear()
+                self._histograms.clear()
+        return state
+
+    def merge(self, state: Dict[str, Any]) -> None:
+        """Add counters and histograms exported by another process."""
+        with self._lock:
+            for name, series in state["counters"].items():
+                target = self._counters.setdefault(name, {})
+                for key, value in series.items():
+                    target[key] = target.get(key, 0.0) + value
+            for name, series in state["histograms"].items():
+                target_hists = self._histograms.setdefault(name, {})
+                for key, (counts, total, count) in series.items():
+                    hist = target_hists.setdefault(key, Histogram())
+                    hist.counts = [a + b for a, b in zip(hist.counts, counts)]
+                    hist.sum += total
+                    hist.count += count
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        state = self.export()
+        for name, series in sorted(state["counters"].items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+        for name, series in sorted(state["histograms"].items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, (counts, total, count) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                    cumulative += bucket_count
+                    le = key + (("le", f"{bound:g}"),)
+                    lines.append(f"{name}_bucket{_labels(le)} {cumulative}")
+                inf = key + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{_labels(inf)} {count}")
+                lines.append(f"{name}_sum{_labels(key)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(key)} {count}")
+        for name, value in sorted(self.gauges().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    """Format a sample value without exponent notation for large counters."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+METRICS = Metrics()
+
+
+def record_stage(
+    stage: str,
+    seconds: float,
+    rows_in: int = 0,
+    rows_out: int = 0,
+    nbytes: int = 0,
+) -> None:
+    """Add one measurement of a pipeline stage to ``METRICS``."""
+    METRICS.inc("mai_stage_seconds_total", seconds, stage=stage)
+    if rows_in:
+        METRICS.inc("mai_stage_rows_in_total", rows_in, stage=stage)
+    if rows_out:
+        METRICS.inc("mai_stage_rows_out_total", rows_out, stage=stage)
+    if nbytes:
+        METRICS.inc("mai_stage_bytes_total", nbytes, stage=stage)
+
+
+@dataclass
+class StageSample:
+    """Counts filled in by the caller inside ``stage_timer``."""
+
+    rows_in: int = 0
+    rows_out: int = 0
+    nbytes: int = 0
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[StageSample]:
+    """Time a block of work and record it under ``stage``.
+
+    Example:
+        with stage_timer("discover") as sample:
+            files = list(folder.glob("**/*.csv"))
+            sample.rows_out = len(files)
+    """
+    sample = StageSample()
+    start = time.perf_counter()
+    try:
+        yield sample
+    finally:
+        record_stage(
+            stage,
+            time.perf_counter() - start,
+            sample.rows_in,
+            sample.rows_out,
+            sample.nbytes,
+        )
+
+
+def timed_iter(
+    items: Iterable[Any],
+    stage: str,
+    measure: Callable[[Any], Tuple[int, int]] = lambda item: (len(item), 0),
+    flush_every: int = 1,
+) -> Iterator[Any]:
+    """Yield from ``items``, recording the time spent producing them under ``stage``.
+
+    Only time inside the underlying iterator counts, not time the consumer
+    spends on each item, so a lazy parser or serializer can be measured in
+    place.
+
+    Args:
+        items: Iterable to wrap
+        stage: Stage name
+        measure: Returns (rows, bytes) for one item
+        flush_every: Items accumulated locally between registry updates;
+            raise it for per-document iterators to keep locking off the hot path
+    """
+    iterator = iter(items)
+    seconds = 0.0
+    rows = 0
+    nbytes = 0
+    pending = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                seconds += time.perf_counter() - start
+                return
+            seconds += time.perf_counter() - start
+            item_rows, item_bytes = measure(item)
+            rows += item_rows
+            nbytes += item_bytes
+            pending += 1
+            if pending >= flush_every:
+                record_stage(stage, seconds, rows_out=rows, nbytes=nbytes)
+                seconds, rows, nbytes, pending = 0.0, 0, 0, 0
+            yield item
+    finally:
+        if pending or seconds:
+            record_stage(stage, seconds, rows_out=rows, nbytes=nbytes)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``METRICS`` at ``http://host:port/metrics`` from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+class StatsReporter:
+    """Log per-stage throughput and busy time every ``interval`` seconds.
+
+    Busy time is the share of wall time spent in a stage; above 100% means
+    several threads or processes worked on it at once. The stage with the
+    highest share is the bottleneck.
+    """
+
+    def __init__(self, interval: float, metrics: Metrics = METRICS):
+        self.interval = interval
+        self.metrics = metrics
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last = self._totals()
+        self._last_time = time.monotonic()
+
+    def _totals(self) -> Dict[str, float]:
+        totals = {}
+        for stage in STAGES:
+            for name in ("seconds", "rows_in", "rows_out", "bytes"):
+                totals[f"{stage}.{name}"] = self.metrics.counter(
+                    f"mai_stage_{name}_total", stage=stage
+                )
+        for result in ("indexed", "existing", "failed", "spooled"):
+            totals[f"docs.{result}"] = self.metrics.counter(
+                "mai_bulk_docs_total", result=result
+            )
+        return totals
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stats", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def report(self) -> None:
+        """Log the activity since the previous report."""
+        now = time.monotonic()
+        elapsed = max(now - self._last_time, 1e-9)
+        totals = self._totals()
+        delta = {key: totals[key] - self._last.get(key, 0.0) for key in totals}
+        self._last, self._last_time = totals, now
+
+        parts = []
+        for stage in STAGES:
+            busy = delta[f"{stage}.seconds"]
+            rows = delta[f"{stage}.rows_out"] or delta[f"{stage}.rows_in"]
+            if not busy and not rows:
+                continue
+            parts.append(
+                f"{stage} {rows / elapsed:,.0f} rows/s "
+                f"{delta[f'{stage}.bytes'] / elapsed / 1e6:.1f} MB/s "
+                f"busy {busy / elapsed:.0%}"
+            )
+        latency = self.metrics.histogram("mai_es_request_seconds")
+        if latency is not None:
+            parts.append(
+                f"es p50 {latency.percentile(50) * 1000:.0f}ms "
+                f"p99 {latency.percentile(99) * 1000:.0f}ms"
+            )
+        parts.append(
+            f"docs indexed {delta['docs.indexed']:.0f} existing "
+            f"{delta['docs.existing']:.0f} failed {delta['docs.failed']:.0f} "
+            f"spooled {delta['docs.spooled']:.0f}"
+        )
+        gauges = self.metrics.gauges()
+        if gauges:
+            parts.append(
+                f"queue {gauges.get('mai_sender_queue_depth', 0):.0f} "
+                f"in-flight {gauges.get('mai_sender_in_flight', 0):.0f} "
+                f"spool {gauges.get('mai_spool_docs', 0):.0f} docs "
+                f"lag {gauges.get('mai_spool_lag_seconds', 0):.0f}s"
+            )
+        logger.info("Stats: " + " | ".join(parts))
@@ -0,0 +1,223 @@
+"""
+Opt-in CPU and allocation profiling for CLI runs.
+
+``Profiler`` wraps a run in a deterministic (cProfile) or sampling
+(pyinstrument, when installed) profiler plus tracemalloc, and writes its
+artifacts when stopped:
+
+    <name>-<time>-<pid>.prof        cProfile stats (snakeviz, pstats)
+    <name>-<time>-<pid>.html        pyinstrument call tree
+    <name>-<time>-<pid>-cpu.txt     top functions and per-stage busy time
+    <name>-<time>-<pid>-alloc.txt   top allocation sites and peak memory
+
+The CLI exports ``PROFILE_ENV`` so worker processes profile themselves too.
+"""
+
+import cProfile
+import io
+import logging
+import multiprocessing.util
+import os
+import pstats
+import time
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+from mai_streaming.metrics import METRICS, STAGES
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - optional dependency
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = "MAI_PROFILE"  # "<engine>:<output dir>", inherited by workers
+ALLOC_FRAMES = 10  # Stack depth recorded per allocation
+ALLOC_SAMPLE_INTERVAL = 1.0  # Seconds between checks for a new memory peak
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+TOP_TRACEBACKS = 10
+
+
+def resolve_engine(engine: str) -> str:
+    """Return the profiler to use, preferring sampling when available."""
+    if engine == "auto":
+        return "pyinstrument" if pyinstrument is not None else "cprofile"
+    if engine == "pyinstrument" and pyinstrument is None:
+        raise ValueError("pyinstrument is not installed")
+    return engine
+
+
+class Profiler:
+    """Profile CPU time and allocations between ``start`` and ``stop``.
+
+    cProfile only sees the thread that started it, so bulk sender threads
+    show up through the per-stage busy times taken from ``METRICS``.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        name: str,
+        engine: str = "auto",
+        trace_allocations: bool = True,
+    ):
+        self.output_dir = Path(output_dir)
+        self.name = name
+        self.engine = resolve_engine(engine)
+        self.trace_allocations = trace_allocations
+        self._profiler = None
+        self._started = 0.0
+        self._peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._peak_size = 0
+        self._stop_sampling = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _sample_allocations(self) -> None:
+        # Freed chunks are gone by the time the run ends, so keep the
+        # snapshot taken closest to the memory peak
+        while not self._stop_sampling.wait(ALLOC_SAMPLE_INTERVAL):
+            current, _ = tracemalloc.get_traced_memory()
+            if current > self._peak_size:
+                self._peak_size = current
+                self._peak_snapshot = tracemalloc.take_snapshot()
+
+    def start(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.trace_allocations:
+            if tracemalloc.is_tracing():
+                # A forked worker inherits the parent's traces
+                tracemalloc.clear_traces()
+            else:
+                tracemalloc.start(ALLOC_FRAMES)
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(
+                target=self._sample_allocations, name="alloc-sampler", daemon=True
+            )
+            self._sampler.start()
+        if self.engine == "pyinstrument":
+            self._profiler = pyinstrument.Profiler()
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started = time.perf_counter()
+        logger.info(f"Profiling {self.name} with {self.engine}")
+
+    def stop(self) -> List[Path]:
+        """Stop profiling and write the artifacts.
+
+        Returns:
+            Paths of the files written
+        """
+        if self._profiler is None:
+            return []
+        elapsed = time.perf_counter() - self._started
+        prefix = self.output_dir / (
+            f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        )
+        paths: List[Path] = []
+
+        if self._sampler is not None:
+            # Summarize before writing the CPU report allocates anything
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._sampler = None
+            alloc_path = Path(f"{prefix}-alloc.txt")
+            alloc_path.write_text(
+                _allocation_summary(self._peak_snapshot, self._peak_size)
+            )
+            self._peak_snapshot = None
+            tracemalloc.stop()
+            paths.append(alloc_path)
+
+        report = io.StringIO()
+        report.write(f"{self.name}: {elapsed:.2f}s wall time, engine {self.engine}\n\n")
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+            html_path = prefix.with_suffix(".html")
+            html_path.write_text(self._profiler.output_html())
+            paths.append(html_path)
+            report.write(self._profiler.output_text(unicode=True, color=False))
+        else:
+            self._profiler.disable()
+            prof_path = prefix.with_suffix(".prof")
+            self._profiler.dump_stats(prof_path)
+            paths.append(prof_path)
+            stats = pstats.Stats(self._profiler, stream=report)
+            stats.strip_dirs().sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+        self._profiler = None
+        report.write(_stage_summary(elapsed))
+
+        cpu_path = Path(f"{prefix}-cpu.txt")
+        cpu_path.write_text(report.getvalue())
+        paths.append(cpu_path)
+
+        logger.info(f"Wrote profile for {self.name}: {', '.join(map(str, paths))}")
+        return paths
+
+
+def _stage_summary(elapsed: float) -> str:
+    """Per-stage busy seconds from METRICS, covering every thread."""
+    lines = ["\nPipeline stages (all threads):\n"]
+    for stage in STAGES:
+        seconds = METRICS.counter("mai_stage_seconds_total", stage=stage)
+        rows = METRICS.counter("mai_stage_rows_out_total", stage=stage)
+        if seconds or rows:
+            lines.append(
+                f"  {stage:<10} {seconds:10.3f}s busy "
+                f"({seconds / max(elapsed, 1e-9):6.1%} of wall) {rows:>14,.0f} rows\n"
+            )
+    return "".join(lines)
+
+
+def _allocation_summary(
+    peak_snapshot: Optional[tracemalloc.Snapshot], peak_size: int
+) -> str:
+    """Top allocation sites at the sampled memory peak and at the end of the run."""
+    current, peak = tracemalloc.get_traced_memory()
+    ignore = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    )
+    out = io.StringIO()
+    out.write(
+        f"Traced memory: {current / 1e6:.1f} MB at exit, {peak / 1e6:.1f} MB peak\n"
+    )
+    sections = [("at exit", tracemalloc.take_snapshot())]
+    if peak_snapshot is not None:
+        sections.insert(0, (f"at sampled peak ({peak_size / 1e6:.1f} MB)", peak_snapshot))
+
+    for title, snapshot in sections:
+        snapshot = snapshot.filter_traces(ignore)
+        out.write(f"\nTop {TOP_ALLOCATIONS} allocation sites {title}:\n")
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            out.write(f"  {stat}\n")
+        out.write(f"\nTop {TOP_TRACEBACKS} allocation call stacks {title}:\n")
+        for stat in snapshot.statistics("traceback")[:TOP_TRACEBACKS]:
+            out.write(f"\n  {stat.size / 1e6:.2f} MB in {stat.count} blocks\n")
+            for line in stat.traceback.format(most_recent_first=True):
+                out.write(f"    {line}\n")
+    return out.getvalue()
+
+
+def start_worker_profiler(name: str) -> Optional[Profiler]:
+    """Start profiling a worker process if the parent CLI run is profiled.
+
+    The artifacts are written when the worker process exits.
+    """
+    setting = os.environ.get(PROFILE_ENV)
+    if not setting:
+        return None
+    engine, output_dir = setting.split(":", 1)
+    profiler = Profiler(output_dir, name, engine)
+    profiler.start()
+    # Finalizers run on worker shutdown, unlike atexit handlers; with no
+    # object to track the finalizer also keeps the profiler alive until then
+    multiprocessing.util.Finalize(None, profiler.stop, exitpriority=10)
+    return profiler
@@ -0,0 +1,130 @@
+"""
+Reader dtypes for projection profiles.
+
+A ``ProjectionProfile`` names the TWC columns to index and declares a
+compact dtype for each column or feature family. This module turns those
+declarations into Arrow types for the Arrow CSV and ORC readers and into
+pandas dtypes for ``read_csv``, so chunks hold ``uint8``/``uint16`` sequence
+features, ``float32`` statistics, categoricals and pyarrow-backed strings
+instead of ``int64``, ``float64`` and Python objects.
+"""
+
+import csv
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from mai_streaming.config import PROJECTION_PROFILES, ProjectionProfile
+
+
+def get_profile(name: str) -> ProjectionProfile:
+    """Return the projection profile called ``name``.
+
+    Raises:
+        ValueError: If there is no such profile
+    """
+    try:
+        return PROJECTION_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown projection profile: {name} "
+            f"(expected one of {', '.join(PROJECTION_PROFILES)})"
+        ) from None
+
+
+@lru_cache(maxsize=None)
+def _compile(patterns: Tuple[Tuple[str, str], ...]) -> List[Tuple[Pattern, str]]:
+    return [(re.compile(regex), dtype) for regex, dtype in patterns]
+
+
+def resolve_dtypes(
+    profile: ProjectionProfile, names: List[str], columns: Optional[List[str]] = None
+) -> Dict[str, str]:
+    """Return the declared dtype of every column in ``names`` that has one.
+
+    Args:
+        profile: Projection profile
+        names: Column names, e.g. from the file header
+        columns: Only resolve these columns (all of ``names`` when None)
+    """
+    wanted = None if columns is None else set(columns)
+    patterns = _compile(tuple(profile.patterns))
+    dtypes = {}
+    for name in names:
+        if wanted is not None and name not in wanted:
+            continue
+        dtype = profile.dtypes.get(name)
+        if dtype is None:
+            dtype = next(
+                (pattern_dtype for regex, pattern_dtype in patterns if regex.fullmatch(name)),
+                None,
+            )
+        if dtype is not None:
+            dtypes[name] = dtype
+    return dtypes
+
+
+def arrow_type(dtype: str) -> pa.DataType:
+    if dtype == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.type_for_alias(dtype)
+
+
+def pandas_dtype(dtype: str) -> Any:
+    if dtype == "string":
+        return pd.StringDtype("pyarrow")
+    if dtype.startswith(("int", "uint")):
+        # Nullable integers, so an empty field does not fail the whole chunk
+        return dtype.capitalize() if dtype.startswith("int") else "U" + dtype[1:].capitalize()
+    return dtype
+
+
+def arrow_types(
+    profile: ProjectionProfile, names: List[str], columns: Optional[List[str]] = None
+) -> Dict[str, pa.DataType]:
+    """Return Arrow types for the Arrow CSV reader's ``column_types``."""
+    return {
+        name: arrow_type(dtype)
+        for name, dtype in resolve_dtypes(profile, names, columns).items()
+    }
+
+
+def pandas_dtypes(
+    profile: ProjectionProfile, names: List[str], columns: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Return pandas dtypes for ``read_csv``'s ``dtype`` argument."""
+    return {
+        name: pandas_dtype(dtype)
+        for name, dtype in resolve_dtypes(profile, names, columns).items()
+    }
+
+
+def parse_header(line: bytes) -> List[str]:
+    """Return the column names of a CSV header line."""
+    return next(csv.reader([line.decode("utf-8").rstrip("\r\n")]))
+
+
+def csv_header(path: str) -> List[str]:
+    """Return the column names of a CSV file."""
+    with open(path, "rb") as f:
+        return parse_header(f.readline())
+
+
+def cast_batch(batch: pa.RecordBatch, profile: ProjectionProfile) -> pa.RecordBatch:
+    """Cast a record batch read without type hints (e.g. ORC) to the profile's dtypes."""
+    types = arrow_types(profile, batch.schema.names)
+    if not types:
+        return batch
+    arrays = []
+    for name, column in zip(batch.schema.names, batch.columns):
+        target = types.get(name)
+        if target is not None and column.type != target:
+            if pa.types.is_dictionary(target):
+                column = column.cast(pa.string()).dictionary_encode()
+            else:
+                column = column.cast(target)
+        arrays.append(column)
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
@@ -0,0 +1,336 @@
+"""
+Tumbling-window rollups of live flows.
+
+``RollupAggregator`` folds each micro-batch of flows into per-window
+summaries keyed by configurable dimensions such as ``application`` or
+``dip``/``dport``. Each summary holds flow, packet and byte counts and
+duration percentiles. A batch is grouped once with numpy and kept as a
+partial aggregate, and the partials are merged when a window closes.
+Durations are counted in fixed log-spaced histogram buckets, which merge by
+addition, so percentiles need no per-flow state.
+
+Windows are assigned by ``first_timestamp``. A window closes once the newest
+flow seen starts ``watermark`` seconds after the window's end. Flows that
+arrive for a window that has already closed are counted as late and left
+out. ``closed_before`` and ``resume`` carry that boundary across restarts.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from mai_streaming.builder import Frame
+from mai_streaming.config import (
+    DOC_ID_COLUMN,
+    ROLLUP_PERCENTILES,
+    ROLLUP_WATERMARK_SECONDS,
+)
+from mai_streaming.docids import column_ids
+from mai_streaming.metrics import METRICS, stage_timer
+
+logger = logging.getLogger(__name__)
+
+TIME_COLUMN = "first_timestamp"  # Epoch milliseconds after prepare_flow_chunk
+DURATION_COLUMN = "total_time"  # Microseconds, as written by TWC
+WINDOW_COLUMN = "window_start"  # Epoch milliseconds; the rollup index's time field
+
+# Summary field -> TWC columns summed into it; missing values count as 0
+SUM_COLUMNS = {
+    "packets": ["pkt_fwd_count", "pkt_bwd_count"],
+    "bytes_fwd": ["pkt_len_fwd_total"],
+    "bytes_bwd": ["pkt_len_bwd_total"],
+}
+ROLLUP_INPUT_COLUMNS = [
+    TIME_COLUMN,
+    DURATION_COLUMN,
+    *(column for columns in SUM_COLUMNS.values() for column in columns),
+]
+
+# Upper bounds in milliseconds of the duration histogram buckets, each about
+# 20% wider than the last; one more bucket holds everything above a day
+DURATION_BOUNDS_MS = np.geomspace(1.0, 86_400_000.0, 100)
+COMPACT_PARTIALS = 32  # Merge buffered partial aggregates after this many batches
+VALUE_FIELDS = ["flows", *SUM_COLUMNS]  # Leading columns of _Aggregates.sums
+
+
+@dataclass
+class _Aggregates:
+    """Partial sums per window and key."""
+
+    # window_start and the dimensions, one row per group
+    keys: pd.DataFrame
+    # VALUE_FIELDS, then the duration histogram bucket counts
+    sums: np.ndarray
+    # Longest duration per group in milliseconds, NaN if none was known
+    maxima: np.ndarray
+
+    def select(self, mask: np.ndarray) -> "_Aggregates":
+        return _Aggregates(
+            self.keys[mask].reset_index(drop=True), self.sums[mask], self.maxima[mask]
+        )
+
+
+def group_codes(keys: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the group of every row and the first row of every group.
+
+    Missing values form a group of their own.
+    """
+    codes = np.zeros(len(keys), dtype=np.int64)
+    for name in keys.columns:
+        column_codes, uniques = pd.factorize(keys[name], use_na_sentinel=False)
+        # Refactorizing keeps the combined codes below the row count
+        codes = pd.factorize(codes * len(uniques) + column_codes)[0]
+    first = np.unique(codes, return_index=True)[1]
+    return codes, first
+
+
+def group_runs(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the order that sorts rows by group and where each group's run starts.
+
+    ``ufunc.reduceat`` over the sorted rows is much faster than ``ufunc.at``.
+    """
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+    return order, starts
+
+
+def _numeric(flows: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in flows.columns:
+        return np.full(len(flows), np.nan)
+    return flows[column].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def duration_percentiles(
+    hist: np.ndarray, maxima: np.ndarray, percentiles: Sequence[float]
+) -> np.ndarray:
+    """Estimate duration percentiles per row of a bucket histogram.
+
+    Values are interpolated linearly within the bucket holding the
+    percentile's rank and capped at the row's maximum, as Prometheus's
+    ``histogram_quantile`` does.
+
+    Args:
+        hist: Counts per row and ``DURATION_BOUNDS_MS`` bucket
+        maxima: Longest duration per row in milliseconds
+        percentiles: Percentiles to estimate, 0 to 100
+
+    Returns:
+        Array of shape (rows, percentiles), NaN for rows without durations
+    """
+    lower = np.concatenate(([0.0], DURATION_BOUNDS_MS))
+    upper = np.concatenate((DURATION_BOUNDS_MS, [np.inf]))
+    cumulative = hist.cumsum(axis=1)
+    total = cumulative[:, -1]
+    rows = np.arange(len(hist))
+    result = np.full((len(hist), len(percentiles)), np.nan)
+    for i, pct in enumerate(percentiles):
+        rank = pct / 100 * total
+        bucket = np.minimum((cumulative < rank[:, None]).sum(axis=1), hist.shape[1] - 1)
+        below = np.where(bucket > 0, cumulative[rows, bucket - 1], 0)
+        count = np.maximum(hist[rows, bucket], 1)
+        top = np.minimum(upper[bucket], maxima)
+        bottom = np.minimum(lower[bucket], top)
+        value = bottom + (top - bottom) * np.clip((rank - below) / count, 0, 1)
+        result[:, i] = np.where(total > 0, value, np.nan)
+    return result
+
+
+class RollupAggregator:
+    """Aggregate flows into tumbling-window summaries.
+
+    Args:
+        window_seconds: Window length
+        dimensions: Columns the summaries are keyed by; columns a chunk
+            lacks are grouped as missing
+        watermark_seconds: How long after a window ends flows for it are
+            still accepted
+        percentiles: Duration percentiles reported per summary
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        dimensions: Sequence[str],
+        watermark_seconds: float = ROLLUP_WATERMARK_SECONDS,
+        percentiles: Sequence[float] = ROLLUP_PERCENTILES,
+    ):
+        if window_seconds <= 0:
+            raise ValueError(f"Rollup window must be positive: {window_seconds}")
+        self.window_ms = int(window_seconds * 1000)
+        self.watermark_ms = int(watermark_seconds * 1000)
+        self.dimensions = list(dimensions)
+        self.percentiles = list(percentiles)
+        self._partials: List[_Aggregates] = []
+        # Start of the newest flow seen, epoch milliseconds
+        self._newest: Optional[int] = None
+        # Windows starting before this have been emitted
+        self._closed_before: Optional[int] = None
+        self._missing_warned = False
+        self.late_flows = 0
+
+    def _to_pandas(self, frame: Frame) -> pd.DataFrame:
+        names = frame.schema.names if isinstance(frame, pa.RecordBatch) else frame.columns
+        missing = [name for name in self.dimensions if name not in names]
+        if missing and not self._missing_warned:
+            logger.warning(f"Rollup dimensions missing from flows: {', '.join(missing)}")
+            self._missing_warned = True
+        columns = [
+            name for name in dict.fromkeys(self.dimensions + ROLLUP_INPUT_COLUMNS)
+            if name in names
+        ]
+        if isinstance(frame, pa.RecordBatch):
+            flows = pa.Table.from_batches([frame.select(columns)]).to_pandas()
+        else:
+            flows = frame[columns]
+        return flows.assign(**{name: None for name in missing})
+
+    def add(self, frame: Frame) -> pd.DataFrame:
+        """Fold a chunk of prepared flows into the open windows.
+
+        Args:
+            frame: Flows from ``prepare_flow_chunk`` (epoch-millisecond
+                ``first_timestamp``)
+
+        Returns:
+            Summaries of the windows this chunk closed (often none)
+        """
+        with stage_timer("rollup") as sample:
+            sample.rows_in = len(frame)
+            partial = self._aggregate(self._to_pandas(frame))
+            if partial is not None:
+                self._partials.append(partial)
+            summaries = pd.DataFrame()
+            if self._newest is not None:
+                summaries = self._emit(self._newest - self.watermark_ms)
+            if len(self._partials) >= COMPACT_PARTIALS:
+                self._partials = [self._merge()]
+            sample.rows_out = len(summaries)
+        return summaries
+
+    def close(self) -> pd.DataFrame:
+        """Summarize every open window, e.g. when the capture stops.
+
+        The windows count as closed afterwards, so flows for them are late.
+        """
+        with stage_timer("rollup") as sample:
+            summaries = self._emit(None)
+            if self._newest is not None:
+                end = self._newest // self.window_ms * self.window_ms + self.window_ms
+                self.resume(end)
+            sample.rows_out = len(summaries)
+        return summaries
+
+    @property
+    def closed_before(self) -> Optional[int]:
+        """Windows starting before this (epoch milliseconds) have been summarized."""
+        return self._closed_before
+
+    def resume(self, closed_before: int) -> None:
+        """Treat windows starting before ``closed_before`` as already summarized.
+
+        A restarted capture reads again the flows it had not committed. Those
+        of windows an earlier run summarized are counted as late instead of
+        producing a partial summary that would overwrite the complete one.
+        """
+        if self._closed_before is None or closed_before > self._closed_before:
+            self._closed_before = closed_before
+
+    def _aggregate(self, flows: pd.DataFrame) -> Optional[_Aggregates]:
+        """Return the partial aggregate of a batch."""
+        starts = _numeric(flows, TIME_COLUMN)
+        valid = ~np.isnan(starts)
+        if not valid.any():
+            return None
+        self._newest = max(int(starts[valid].max()), self._newest or 0)
+        windows = np.floor_divide(starts, self.window_ms) * self.window_ms
+        if self._closed_before is not None:
+            late = valid & (windows < self._closed_before)
+            if late.any():
+                self.late_flows += int(late.sum())
+                METRICS.inc("mai_rollup_late_flows_total", int(late.sum()))
+                valid &= ~late
+        if not valid.any():
+            return None
+
+        flows = flows[valid]
+        keys = pd.DataFrame({WINDOW_COLUMN: windows[valid].astype(np.int64)})
+        for name in self.dimensions:
+            keys[name] = flows[name].array
+        codes, first = group_codes(keys)
+        groups = len(first)
+
+        sums = np.empty((groups, len(VALUE_FIELDS) + len(DURATION_BOUNDS_MS) + 1))
+        sums[:, 0] = np.bincount(codes, minlength=groups)
+        for i, columns in enumerate(SUM_COLUMNS.values(), 1):
+            values = sum(np.nan_to_num(_numeric(flows, column)) for column in columns)
+            sums[:, i] = np.bincount(codes, weights=values, minlength=groups)
+        durations = _numeric(flows, DURATION_COLUMN) / 1000
+        timed = ~np.isnan(durations)
+        buckets = np.searchsorted(DURATION_BOUNDS_MS, durations[timed])
+        width = len(DURATION_BOUNDS_MS) + 1
+        sums[:, len(VALUE_FIELDS):] = np.bincount(
+            codes[timed] * width + buckets, minlength=groups * width
+        ).reshape(groups, width)
+        order, starts = group_runs(codes)
+        maxima = np.fmax.reduceat(durations[order], starts)
+        return _Aggregates(keys.iloc[first].reset_index(drop=True), sums, maxima)
+
+    def _merge(self) -> _Aggregates:
+        """Combine the buffered partials into one with a row per window and key."""
+        if len(self._partials) == 1:
+            return self._partials[0]
+        keys = pd.concat([partial.keys for partial in self._partials], ignore_index=True)
+        codes, first = group_codes(keys)
+        order, starts = group_runs(codes)
+        sums = np.concatenate([partial.sums for partial in self._partials])
+        maxima = np.concatenate([partial.maxima for partial in self._partials])
+        return _Aggregates(
+            keys.iloc[first].reset_index(drop=True),
+            np.add.reduceat(sums[order], starts, axis=0),
+            np.fmax.reduceat(maxima[order], starts),
+        )
+
+    def _emit(self, cutoff: Optional[int]) -> pd.DataFrame:
+        """Remove and summarize the windows that end at or before ``cutoff`` (all if None)."""
+        boundary = None
+        if cutoff is not None:
+            boundary = cutoff // self.window_ms * self.window_ms
+            if self._closed_before is not None and boundary <= self._closed_before:
+                return pd.DataFrame()
+            self._closed_before = boundary
+        if not self._partials:
+            return pd.DataFrame()
+        merged = self._merge()
+        done = np.ones(len(merged.keys), dtype=bool)
+        if boundary is not None:
+            done = merged.keys[WINDOW_COLUMN].to_numpy() < boundary
+        self._partials = [merged.select(~done)] if not done.all() else []
+        return self._summarize(merged.select(done))
+
+    def _summarize(self, aggregates: _Aggregates) -> pd.DataFrame:
+        """Turn merged aggregates into rollup documents."""
+        if not len(aggregates.keys):
+            return pd.DataFrame()
+        sums = aggregates.sums.round().astype(np.int64)
+        columns = {name: aggregates.keys[name].to_numpy() for name in aggregates.keys.columns}
+        columns["window_end"] = columns[WINDOW_COLUMN] + self.window_ms
+        for i, field in enumerate(VALUE_FIELDS):
+            columns[field] = sums[:, i]
+        columns["bytes"] = columns["bytes_fwd"] + columns["bytes_bwd"]
+        estimates = duration_percentiles(
+            aggregates.sums[:, len(VALUE_FIELDS):], aggregates.maxima, self.percentiles
+        )
+        for i, pct in enumerate(self.percentiles):
+            columns[f"duration_p{pct:g}_ms"] = estimates[:, i].round(3)
+        columns["duration_max_ms"] = aggregates.maxima.round(3)
+        summaries = pd.DataFrame(columns)
+        # One document per window and key. They are written with the index op,
+        # so a replay or a later summary of the window overwrites instead of duplicating
+        summaries[DOC_ID_COLUMN] = column_ids(
+            summaries, [WINDOW_COLUMN, "window_end", *self.dimensions]
+        )
+        return summaries
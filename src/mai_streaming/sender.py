@@ -0,0 +1,348 @@
+"""
+Concurrent bulk sender with a bounded queue, retries and backpressure.
+
+With a ``Spool`` attached, bodies that cannot be delivered or queued are
+written to disk and replayed in order by a background drainer.
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from elasticsearch import ApiError, Elasticsearch, TransportError
+
+from mai_streaming.metrics import METRICS, record_stage
+from mai_streaming.spool import Spool
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean "try again later" rather than "this document is bad"
+RETRYABLE_STATUS = {429, 502, 503, 504}
+# A "create" for an id that is already indexed, i.e. a replayed document
+CONFLICT_STATUS = 409
+
+SPILL_TIMEOUT = 5.0  # Seconds submit waits on a full queue before spooling
+DRAIN_INTERVAL = 5.0  # Seconds between drainer checks of an empty or failing spool
+
+
+@dataclass
+class SenderStats:
+    """Counters describing the state of a ``BulkSender``."""
+
+    requests: int = 0
+    retries: int = 0
+    docs_sent: int = 0
+    docs_failed: int = 0
+    docs_existing: int = 0
+    docs_spooled: int = 0
+    docs_replayed: int = 0
+    bytes_sent: int = 0
+    in_flight: int = 0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    def latency_percentile(self, pct: float) -> float:
+        """Return a request latency percentile in seconds over recent requests."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        idx = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[idx]
+
+
+class BulkSender:
+    """Send NDJSON bulk bodies to Elasticsearch from a pool of worker threads.
+
+    ``submit`` blocks once ``queue_size`` bodies are waiting, so producers slow
+    down to the pace of the cluster instead of buffering without limit. With a
+    spool, a body is spooled instead when the queue stays full for
+    ``spill_timeout`` seconds or when its retries are exhausted. New bodies
+    keep going straight to the cluster while the drainer replays the spool,
+    so replayed documents may be indexed after newer ones.
+    """
+
+    def __init__(
+        self,
+        es: Elasticsearch,
+        max_in_flight: int = 1,
+        queue_size: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        spool: Optional[Spool] = None,
+        spill_timeout: float = SPILL_TIMEOUT,
+    ):
+        self.es = es
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.spool = spool
+        self.spill_timeout = spill_timeout
+        self.stats = SenderStats()
+        self._queue: "queue.Queue[Optional[Tuple[int, bytes]]]" = queue.Queue(
+            maxsize=max(1, queue_size)
+        )
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+        self._drainer: Optional[threading.Thread] = None
+        self._drain_lock = threading.Lock()
+        self._stop_draining = threading.Event()
+
+    def start(self) -> None:
+        """Start the worker threads if they are not running yet."""
+        if self._workers:
+            return
+        for i in range(self.max_in_flight):
+            worker = threading.Thread(
+                target=self._run, name=f"bulk-sender-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        if self.spool is not None and self._drainer is None:
+            self._stop_draining.clear()
+            self._drainer = threading.Thread(
+                target=self._drain_loop, name="bulk-spool-drainer", daemon=True
+            )
+            self._drainer.start()
+
+    def submit(self, count: int, body: bytes) -> None:
+        """Queue a bulk body, blocking while the queue is full.
+
+        Args:
+            count: Number of documents in the body
+            body: NDJSON request body
+        """
+        self.start()
+        if self.spool is None:
+            self._queue.put((count, body))
+            return
+        try:
+            self._queue.put((count, body), timeout=self.spill_timeout)
+        except queue.Full:
+            self._spill(count, body)
+
+    def flush(self) -> Dict[str, Any]:
+        """Wait until every queued body has been sent and return a stats snapshot."""
+        self._queue.join()
+        return self.snapshot()
+
+    def close(self) -> None:
+        """Send everything still queued and stop the worker threads.
+
+        With a spool, one last replay pass runs before returning; whatever
+        the cluster still refuses stays on disk for the next run. The pass
+        also runs when nothing was submitted, so a process can replay what
+        others (e.g. DDoS workers) spooled.
+        """
+        if not self._workers:
+            if self.spool is not None and not self.spool.is_empty():
+                self.drain()
+                self.spool.release_drain_lock()
+            return
+        self._queue.join()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        if self._drainer is not None:
+            self._stop_draining.set()
+            self._drainer.join()
+            self._drainer = None
+            self.drain()
+            self.spool.release_drain_lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current queue depth, in-flight count, counters and spool state."""
+        spool = self.spool.stats() if self.spool is not None else {}
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "in_flight": self.stats.in_flight,
+                "requests": self.stats.requests,
+                "retries": self.stats.retries,
+                "docs_sent": self.stats.docs_sent,
+                "docs_failed": self.stats.docs_failed,
+                "docs_existing": self.stats.docs_existing,
+                "docs_spooled": self.stats.docs_spooled,
+                "docs_replayed": self.stats.docs_replayed,
+                "spool_segments": spool.get("segments", 0),
+                "spool_bytes": spool.get("bytes", 0),
+                "spool_docs": spool.get("docs", 0),
+                "spool_lag": spool.get("lag", 0.0),
+                "bytes_sent": self.stats.bytes_sent,
+                "latency_p50": self.stats.latency_percentile(50),
+                "latency_p99": self.stats.latency_percentile(99),
+            }
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                count, body = item
+                with self._lock:
+                    self.stats.in_flight += 1
+                try:
+                    left, rest = self._send(count, body)
+                    if left:
+                        self._spill(left, rest)
+                finally:
+                    with self._lock:
+                        self.stats.in_flight -= 1
+            except Exception as e:
+                logger.error(f"Unexpected error during bulk ingestion: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _spill(self, count: int, body: bytes) -> None:
+        """Spool an undeliverable body, or count it as failed without a spool."""
+        spooled = self.spool is not None and self.spool.append(count, body)
+        with self._lock:
+            if spooled:
+                self.stats.docs_spooled += count
+            else:
+                self.stats.docs_failed += count
+        METRICS.inc("mai_bulk_docs_total", count, result="spooled" if spooled else "failed")
+        if spooled:
+            logger.warning(f"Spooled {count} documents for later replay")
+
+    def drain(self) -> bool:
+        """Replay spooled segments oldest first until the spool is empty.
+
+        Returns:
+            True if the spool was emptied, False if the cluster refused a
+            segment or another process holds the drain lock
+        """
+        if self.spool is None:
+            return True
+        with self._drain_lock:
+            if not self.spool.acquire_drain_lock():
+                return False
+            for segment in self.spool.segments():
+                try:
+                    count, body = self.spool.read(segment)
+                except FileNotFoundError:
+                    continue
+                left, rest = self._send(count, body)
+                if left:
+                    # Keep only what is still undelivered, in the same position
+                    self.spool.replace(segment, left, rest)
+                    return False
+                self.spool.remove(segment)
+                with self._lock:
+                    self.stats.docs_replayed += count
+                logger.info(f"Replayed {count} spooled documents")
+            return True
+
+    def _drain_loop(self) -> None:
+        while not self._stop_draining.wait(DRAIN_INTERVAL):
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Unexpected error while draining the spool: {str(e)}")
+
+    def _send(self, count: int, body: bytes) -> Tuple[int, bytes]:
+        """Send one body, retrying rejected requests and rejected documents.
+
+        Returns:
+            Count and body of the documents still undelivered once retries
+            are exhausted (0 and empty when everything was handled)
+        """
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.es.bulk(operations=body)
+            except (ApiError, TransportError) as e:
+                status = getattr(e, "status_code", None)
+                retryable = status in RETRYABLE_STATUS or not isinstance(e, ApiError)
+                if retryable and attempt < self.max_retries:
+                    with self._lock:
+                        self.stats.retries += 1
+                    METRICS.inc("mai_bulk_retries_total")
+                    delay = self._backoff(attempt)
+                    logger.warning(
+                        f"Bulk request failed ({status or type(e).__name__}), "
+                        f"retrying in {delay:.1f}s"
+                    )
+                    time.sleep(delay)
+                    continue
+                logger.error(f"Bulk request failed after {attempt + 1} attempts: {str(e)}")
+                if not retryable:
+                    # The request itself is bad, replaying it would fail again
+                    with self._lock:
+                        self.stats.docs_failed += count
+                    METRICS.inc("mai_bulk_docs_total", count, result="failed")
+                    return 0, b""
+                return count, body
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.stats.requests += 1
+                    self.stats.latencies.append(elapsed)
+
+            retry_body, retry_count, failed, existing = self._split_response(
+                body, response
+            )
+            indexed = count - retry_count - failed - existing
+            with self._lock:
+                self.stats.docs_sent += indexed
+                self.stats.docs_failed += failed
+                self.stats.docs_existing += existing
+                self.stats.bytes_sent += len(body)
+            record_stage("send", elapsed, count, indexed + existing, len(body))
+            METRICS.inc("mai_bulk_docs_total", indexed, result="indexed")
+            if existing:
+                METRICS.inc("mai_bulk_docs_total", existing, result="existing")
+            if failed:
+                METRICS.inc("mai_bulk_docs_total", failed, result="failed")
+            if failed:
+                logger.warning(f"Failed to ingest {failed} documents")
+            if not retry_count:
+                return 0, b""
+            if attempt == self.max_retries:
+                logger.error(f"Giving up on {retry_count} documents rejected with 429")
+                return retry_count, retry_body
+            with self._lock:
+                self.stats.retries += 1
+            METRICS.inc("mai_bulk_retries_total")
+            time.sleep(self._backoff(attempt))
+            body, count = retry_body, retry_count
+        return count, body  # Only reached with max_retries < 0
+
+    @staticmethod
+    def _split_response(body: bytes, response: Any) -> Tuple[bytes, int, int, int]:
+        """Split a bulk response into retryable documents and hard failures.
+
+        Returns:
+            Tuple of (body holding the documents to retry, their count,
+            number of documents that failed permanently, number of documents
+            that already existed)
+        """
+        if not response.get("errors"):
+            return b"", 0, 0, 0
+        lines = body.splitlines(keepends=True)
+        retry: List[bytes] = []
+        failed = 0
+        existing = 0
+        for i, item in enumerate(response["items"]):
+            result = next(iter(item.values()))
+            if "error" not in result:
+                continue
+            if result.get("status") in RETRYABLE_STATUS:
+                retry.extend(lines[2 * i : 2 * i + 2])
+            elif result.get("status") == CONFLICT_STATUS:
+                existing += 1
+            else:
+                failed += 1
+        return b"".join(retry), len(retry) // 2, failed, existing
@@ -0,0 +1,211 @@
+"""
+On-disk spool of bulk bodies that could not be delivered to Elasticsearch.
+
+When the cluster is unreachable, keeps rejecting requests or cannot keep up,
+``BulkSender`` writes bodies to the spool instead of dropping them or
+blocking the pipeline. A single drainer per spool directory replays the
+segments oldest first once the cluster accepts requests again. A segment is
+deleted only after it has been delivered, so the files left on disk are the
+replay checkpoint and a restarted process resumes with the oldest one.
+"""
+
+import gzip
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".ndjson.gz"
+LOCK_FILE = ".drain.lock"
+COMPRESS_LEVEL = 1  # Spooling happens under pressure, favour speed over ratio
+SCAN_INTERVAL = 1.0  # Seconds between rescans of totals other processes may have changed
+
+
+class Spool:
+    """Directory of gzip-compressed NDJSON bulk bodies, one segment per body.
+
+    Segment names start with a nanosecond timestamp so that sorting them
+    gives arrival order, even when several worker processes share a spool,
+    and end with the document count so replays can be accounted without
+    decompressing.
+
+    Totals are kept as running counts so spooling a body does not list the
+    directory. They are re-read from disk at most every ``SCAN_INTERVAL``
+    seconds to pick up segments written or removed by other processes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock_fd: Optional[int] = None
+        self._totals_lock = threading.Lock()
+        self._segments = 0
+        self._bytes = 0
+        self._docs = 0
+        self._oldest_ns: Optional[int] = None
+        self._scanned = float("-inf")
+
+    def segments(self) -> List[Path]:
+        """Return the spooled segments, oldest first."""
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def is_empty(self) -> bool:
+        return not any(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def append(self, count: int, body: bytes) -> bool:
+        """Write a bulk body as a new segment.
+
+        Args:
+            count: Number of documents in the body
+            body: NDJSON request body
+
+        Returns:
+            False if the spool is full and the body was not written
+        """
+        data = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        with self._totals_lock:
+            self._refresh()
+            size = self._bytes
+            if size + len(data) > self.max_bytes:
+                logger.error(
+                    f"Spool {self.directory} is full ({size} bytes), "
+                    f"dropping {count} documents"
+                )
+                return False
+            now = time.time_ns()
+            self._segments += 1
+            self._bytes += len(data)
+            self._docs += count
+            if self._oldest_ns is None:
+                self._oldest_ns = now
+        name = f"{now:020d}-{os.getpid()}-{count}{SEGMENT_SUFFIX}"
+        tmp_path = self.directory / f".{name}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.directory / name)
+        return True
+
+    @staticmethod
+    def segment_count(segment: Path) -> int:
+        """Return the number of documents recorded in a segment's name."""
+        return int(segment.name[: -len(SEGMENT_SUFFIX)].rsplit("-", 1)[1])
+
+    def read(self, segment: Path) -> Tuple[int, bytes]:
+        """Return the document count and bulk body of a segment."""
+        with gzip.open(segment, "rb") as f:
+            return self.segment_count(segment), f.read()
+
+    def replace(self, segment: Path, count: int, body: bytes) -> Path:
+        """Rewrite a segment with the documents still left to deliver.
+
+        The new segment keeps the original's position in the replay order.
+        """
+        prefix = segment.name.rsplit("-", 1)[0]
+        new_segment = self.directory / f"{prefix}-{count}{SEGMENT_SUFFIX}"
+        tmp_path = self.directory / f".{new_segment.name}.tmp"
+        data = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        size = _size(segment)
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, new_segment)
+        if new_segment != segment:
+            _remove(segment)
+        with self._totals_lock:
+            self._bytes += len(data) - size
+            self._docs += count - self.segment_count(segment)
+        return new_segment
+
+    def remove(self, segment: Path) -> None:
+        """Delete a segment once it has been delivered."""
+        size = _size(segment)
+        _remove(segment)
+        with self._totals_lock:
+            self._segments = max(0, self._segments - 1)
+            self._bytes = max(0, self._bytes - size)
+            self._docs = max(0, self._docs - self.segment_count(segment))
+            if not self._segments:
+                self._oldest_ns = None
+
+    def acquire_drain_lock(self) -> bool:
+        """Try to become the spool's only drainer.
+
+        The lock is released when the process exits, so a crashed drainer
+        never blocks the next one.
+        """
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(self.directory / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def release_drain_lock(self) -> None:
+        if self._lock_fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self._lock_fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return segment count, compressed bytes, documents and lag in seconds.
+
+        Lag is the age of the oldest segment, i.e. how far behind the
+        cluster the spooled data is.
+        """
+        with self._totals_lock:
+            self._refresh()
+            lag = 0.0
+            if self._oldest_ns is not None:
+                lag = max(0.0, (time.time_ns() - self._oldest_ns) / 1e9)
+            return {
+                "segments": self._segments,
+                "bytes": self._bytes,
+                "docs": self._docs,
+                "lag": lag,
+            }
+
+    def _refresh(self) -> None:
+        """Re-read the totals from disk if the last scan is too old."""
+        if time.monotonic() - self._scanned < SCAN_INTERVAL:
+            return
+        segments = self.segments()
+        self._segments = len(segments)
+        self._bytes = sum(_size(segment) for segment in segments)
+        self._docs = sum(self.segment_count(segment) for segment in segments)
+        self._oldest_ns = int(segments[0].name.split("-", 1)[0]) if segments else None
+        self._scanned = time.monotonic()
+
+
+def _size(segment: Path) -> int:
+    try:
+        return segment.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _remove(segment: Path) -> None:
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
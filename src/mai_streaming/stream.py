@@ -0,0 +1,98 @@
+"""
+Micro-batch parsing of CSV flow records streamed from a pipe.
+"""
+
+import io
+import logging
+import os
+import select
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from mai_streaming.config import ProjectionProfile
+from mai_streaming.metrics import stage_timer
+from mai_streaming.projection import pandas_dtypes, parse_header
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+
+def iter_csv_batches(
+    stream: BinaryIO,
+    columns: Optional[List[str]] = None,
+    batch_rows: int = 10000,
+    max_latency: float = 0.5,
+    profile: Optional[ProjectionProfile] = None,
+) -> Iterator[pd.DataFrame]:
+    """Parse a CSV byte stream into bounded DataFrame micro-batches.
+
+    A batch is emitted when it holds ``batch_rows`` rows or when its oldest
+    row has waited ``max_latency`` seconds, whichever comes first, so a quiet
+    live capture still reaches Elasticsearch promptly. Repeated header lines,
+    as written at the start of every ``twc`` export, are skipped.
+
+    Args:
+        stream: Binary stream such as a subprocess stdout or an opened FIFO
+        columns: Columns to keep (all when None)
+        batch_rows: Maximum rows per batch
+        max_latency: Maximum seconds a row is buffered before being emitted
+        profile: Projection profile whose dtypes the columns are read as
+
+    Yields:
+        DataFrame chunks parsed with the stream's header
+    """
+    fd = stream.fileno()
+    header: Optional[bytes] = None
+    dtypes: Optional[Dict[str, Any]] = None
+    pending: List[bytes] = []
+    partial = b""
+    batch_started = 0.0
+
+    def emit() -> pd.DataFrame:
+        with stage_timer("parse") as sample:
+            body = header + b"".join(pending)
+            pending.clear()
+            batch = pd.read_csv(io.BytesIO(body), usecols=columns, dtype=dtypes)
+            sample.rows_out = len(batch)
+            sample.nbytes = len(body)
+        return batch
+
+    while True:
+        timeout = None
+        if pending:
+            timeout = max(0.0, batch_started + max_latency - time.monotonic())
+        readable, _, _ = select.select([fd], [], [], timeout)
+        if not readable:
+            yield emit()
+            continue
+
+        data = os.read(fd, READ_SIZE)
+        if not data:
+            break
+        lines = (partial + data).split(b"\n")
+        partial = lines.pop()
+        for line in lines:
+            if not line.strip():
+                continue
+            line += b"\n"
+            if header is None:
+                header = line
+                if profile is not None:
+                    dtypes = pandas_dtypes(profile, parse_header(header), columns)
+                continue
+            if line == header:
+                continue
+            if not pending:
+                batch_started = time.monotonic()
+            pending.append(line)
+            if len(pending) >= batch_rows:
+                yield emit()
+
+    if partial.strip() and header is not None and partial + b"\n" != header:
+        logger.warning("Stream ended with an unterminated line, parsing it anyway")
+        pending.append(partial + b"\n")
+    if pending:
+        yield emit()
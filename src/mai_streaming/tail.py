@@ -0,0 +1,214 @@
+"""
+Incremental ingestion of CSV files that are still being appended to.
+
+In live mode ``twc`` keeps appending flows to the CSVs in its output
+directory. ``FileTailer`` remembers a byte offset per file, parses only the
+complete lines written since the last pass and commits the new offset once
+the rows have been sent, so a restart resumes where it left off. The offset
+file also records which rollup windows have been summarized, so a restart
+does not summarize them again from the rows it re-reads.
+"""
+
+import io
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from mai_streaming.config import OFFSETS_FILE, PROCESSED_MARKER
+from mai_streaming.ingestor import ESIngestor, prepare_flow_chunk
+from mai_streaming.metrics import stage_timer
+from mai_streaming.projection import pandas_dtypes, parse_header
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on bytes parsed per file per pass, keeps memory flat on backlogs
+MAX_READ_BYTES = 16 * 1024 * 1024
+
+
+class OffsetStore:
+    """Committed byte offsets per file and the rollup watermark, persisted as JSON."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offsets: Dict[str, Dict[str, int]] = {}
+        # RollupAggregator.closed_before of the last commit
+        self.rollup_closed_before: Optional[int] = None
+        if path.exists():
+            try:
+                state = json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable offset file {path}: {e}")
+            else:
+                if "offsets" in state:
+                    self.offsets = state["offsets"]
+                    self.rollup_closed_before = state.get("rollup_closed_before")
+                else:
+                    # Written before the rollup watermark was recorded
+                    self.offsets = state
+
+    def get(self, file_path: Path, inode: int) -> Optional[int]:
+        """Return the committed offset, or None if the file is new or was replaced."""
+        entry = self.offsets.get(str(file_path))
+        if entry is None or entry.get("inode") != inode:
+            return None
+        return entry["offset"]
+
+    def commit(self, file_path: Path, inode: int, offset: int) -> None:
+        """Record an offset and atomically rewrite the offset file."""
+        self.offsets[str(file_path)] = {"inode": inode, "offset": offset}
+        self.save()
+
+    def save(self) -> None:
+        """Atomically rewrite the offset file."""
+        state = {"offsets": self.offsets, "rollup_closed_before": self.rollup_closed_before}
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.path)
+
+    def forget_missing(self) -> None:
+        """Drop entries for files that no longer exist."""
+        stale = [p for p in self.offsets if not os.path.exists(p)]
+        for path in stale:
+            del self.offsets[path]
+
+
+class FileTailer:
+    """Ingest newly appended rows from the CSVs under a directory."""
+
+    def __init__(
+        self,
+        folder: str,
+        es_ingestor: ESIngestor,
+        index: str,
+        columns: Optional[List[str]] = None,
+    ):
+        self.folder = Path(folder)
+        self.es_ingestor = es_ingestor
+        self.index = index
+        self.columns = columns or es_ingestor.read_columns
+        self.store = OffsetStore(self.folder / OFFSETS_FILE)
+        self.es_ingestor.resume_rollup(self.store.rollup_closed_before)
+        self._header_dtypes: Dict[bytes, Dict[str, Any]] = {}
+
+    def _dtypes(self, header: bytes) -> Dict[str, Any]:
+        """Return the profile's pandas dtypes for a file's columns."""
+        if header not in self._header_dtypes:
+            self._header_dtypes[header] = pandas_dtypes(
+                self.es_ingestor.profile, parse_header(header), self.columns
+            )
+        return self._header_dtypes[header]
+
+    def close(self) -> None:
+        """Record the rollup watermark after ``ESIngestor.close`` summarized the open windows."""
+        if self.es_ingestor.rollup_closed_before is not None:
+            self.store.rollup_closed_before = self.es_ingestor.rollup_closed_before
+            self.store.save()
+
+    def poll(self, paths: Optional[Iterable[Path]] = None) -> int:
+        """Ingest new complete rows from CSVs in the folder.
+
+        Args:
+            paths: Files known to have changed; every CSV is checked when None
+
+        Returns:
+            Number of rows ingested during this pass
+        """
+        rows = 0
+        if paths is None:
+            with stage_timer("discover") as sample:
+                self.store.forget_missing()
+                paths = list(self.folder.glob("**/*.csv"))
+                sample.rows_out = len(paths)
+        for file_path in sorted(paths):
+            if not file_path.exists():
+                continue
+            try:
+                rows += self.poll_file(file_path)
+            except Exception as e:
+                logger.error(f"Failed to tail {file_path}: {str(e)}")
+        return rows
+
+    def poll_file(self, file_path: Path) -> int:
+        """Ingest the complete lines appended to one file since the last commit.
+
+        Returns:
+            Number of rows ingested
+        """
+        stat = file_path.stat()
+        offset = self.store.get(file_path, stat.st_ino)
+        if offset is None:
+            # Files finished by the marker-based ingestion are not re-read
+            marker = file_path.with_suffix(file_path.suffix + PROCESSED_MARKER)
+            if marker.exists():
+                self.store.commit(file_path, stat.st_ino, stat.st_size)
+                return 0
+            offset = 0
+        elif stat.st_size < offset:
+            logger.warning(f"{file_path} was truncated, reading from the start")
+            offset = 0
+        if stat.st_size == offset:
+            return 0
+
+        rows = 0
+        with open(file_path, "rb") as f:
+            header = f.readline()
+            if not header.endswith(b"\n"):
+                # The header itself is still being written
+                return 0
+            offset = max(offset, len(header))
+            f.seek(offset)
+
+            while True:
+                data = f.read(MAX_READ_BYTES)
+                while b"\n" not in data:
+                    # A single line longer than the read size; grow the read
+                    more = f.read(MAX_READ_BYTES)
+                    if not more:
+                        break
+                    data += more
+                end = data.rfind(b"\n")
+                if end < 0:
+                    # Only a partially written last line is left
+                    break
+                data = data[: end + 1]
+                with stage_timer("parse") as sample:
+                    chunk = pd.read_csv(
+                        io.BytesIO(header + data),
+                        usecols=self.columns,
+                        dtype=self._dtypes(header),
+                    )
+                    sample.rows_out = len(chunk)
+                    sample.nbytes = len(data)
+                if not chunk.empty:
+                    failed = self.es_ingestor.docs_failed
+                    flows = self.es_ingestor.index_columns(chunk)
+                    flows, fields = prepare_flow_chunk(
+                        flows, str(file_path), self.es_ingestor.lookups
+                    )
+                    raw, raw_fields = self.es_ingestor.raw_flows(flows, fields)
+                    self.es_ingestor.ingest_dataframe(raw, self.index, raw_fields)
+                    self.es_ingestor.flush()
+                    if self.es_ingestor.docs_failed > failed:
+                        # Leave the offset where it is so the next pass
+                        # re-reads the chunk; ids make delivered rows no-ops
+                        raise RuntimeError(
+                            f"{self.es_ingestor.docs_failed - failed} documents "
+                            f"were not ingested"
+                        )
+                    # Rolled up and archived only once delivered, as a failed
+                    # chunk is read again
+                    self.es_ingestor.fold_rollup(flows, self.index)
+                    self.es_ingestor.archive_chunk(chunk, str(file_path))
+                    rows += len(chunk)
+                offset += len(data)
+                self.store.rollup_closed_before = self.es_ingestor.rollup_closed_before
+                self.store.commit(file_path, stat.st_ino, offset)
+                f.seek(offset)
+
+        if rows:
+            logger.info(f"Ingested {rows} new rows from {file_path}")
+        return rows
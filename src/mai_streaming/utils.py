@@ -8,6 +8,21 @@ from typing import List
 
 logger = logging.getLogger(__name__)
 
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Log to stderr in the application's format.
+
+    Called by the CLI entry point and by worker processes, rather than at
+    import, so that importing a module never changes logging for the host.
+    Does nothing if the root logger already has handlers.
+
+    Args:
+        level: Root logger level
+    """
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
 
 def create_output_dir(output_dir: Path) -> None:
     """Create output directory if it doesn't exist.
@@ -0,0 +1,177 @@
+"""
+Directory watchers that wake the live pipeline only when files change.
+
+On Linux ``InotifyWatcher`` blocks on inotify events for the output
+directory tree. Elsewhere, or when inotify is unavailable,
+``PollingWatcher`` stats the data files on an interval that backs off while
+the directory is idle and snaps back as soon as something changes.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Detect file changes by comparing size and mtime on an adaptive interval."""
+
+    def __init__(
+        self,
+        folder: str,
+        suffixes: Tuple[str, ...] = (".csv",),
+        min_interval: float = 0.05,
+        max_interval: float = 2.0,
+    ):
+        self.folder = Path(folder)
+        self.suffixes = suffixes
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._seen: Dict[Path, Tuple[int, float]] = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, float]]:
+        state = {}
+        for suffix in self.suffixes:
+            for path in self.folder.glob(f"**/*{suffix}"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                state[path] = (stat.st_size, stat.st_mtime)
+        return state
+
+    def wait(self, timeout: float) -> Optional[Set[Path]]:
+        """Block until files change or ``timeout`` seconds pass.
+
+        Returns:
+            Set of changed files (empty on timeout)
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self._scan()
+            changed = {
+                path for path, state in current.items() if self._seen.get(path) != state
+            }
+            self._seen = current
+            if changed:
+                self.interval = self.min_interval
+                return changed
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            time.sleep(min(self.interval, remaining))
+            self.interval = min(self.interval * 2, self.max_interval)
+
+    def close(self) -> None:
+        """Release watcher resources."""
+
+
+class InotifyWatcher:
+    """Detect file changes under a directory tree with Linux inotify."""
+
+    def __init__(self, folder: str, suffixes: Tuple[str, ...] = (".csv",)):
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name or "libc.so.6", use_errno=True)
+        self.folder = Path(folder)
+        self.suffixes = suffixes
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, Path] = {}
+        self._add_tree(self.folder)
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(str(directory)), WATCH_MASK
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._watches[wd] = directory
+
+    def _add_tree(self, root: Path) -> None:
+        self._add_watch(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            for name in dirnames:
+                self._add_watch(Path(dirpath) / name)
+
+    def wait(self, timeout: float) -> Optional[Set[Path]]:
+        """Block until files change or ``timeout`` seconds pass.
+
+        Returns:
+            Set of changed files (empty on timeout), or None if the kernel
+            queue overflowed and the caller should rescan everything
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed: Set[Path] = set()
+        overflow = False
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(buf):
+                wd, mask, _, name_len = EVENT_HEADER.unpack_from(buf, pos)
+                pos += EVENT_HEADER.size
+                name = buf[pos : pos + name_len].rstrip(b"\0")
+                pos += name_len
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = directory / os.fsdecode(name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            self._add_tree(path)
+                        except OSError as e:
+                            # Removed or renamed before we got to it
+                            logger.warning(f"Could not watch {path}: {e}")
+                        # Files may land in a new directory before it is watched
+                        overflow = True
+                elif path.suffix in self.suffixes:
+                    changed.add(path)
+        return None if overflow else changed
+
+    def close(self) -> None:
+        """Release watcher resources."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(folder: str, suffixes: Tuple[str, ...] = (".csv",)):
+    """Return an inotify watcher on Linux, falling back to adaptive polling."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder, suffixes)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(folder, suffixes)
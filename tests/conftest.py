@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+# Run against the source tree without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import pytest
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent / "data" / "pcaps"
+
+
+@pytest.fixture
+def sample_csv():
+    """TWC output of a short capture, with every feature column."""
+    return SAMPLE_DIR / "wlp5s0.csv"
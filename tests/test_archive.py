@@ -0,0 +1,18 @@
+import pandas as pd
+
+from mai_streaming.archive import ArchiveWriter, archive_files
+
+
+def test_roll_finishes_files_of_idle_sources(tmp_path):
+    writer = ArchiveWriter(str(tmp_path / "archive"), roll_seconds=3600)
+    flows = pd.DataFrame({"first_timestamp": [1_700_000_000_000_000], "sport": [1000]})
+    writer.write(flows, "capture")
+    writer.roll()
+    assert archive_files(str(tmp_path / "archive")) == []
+
+    # No further writes: the timer alone finishes the file
+    writer.roll_seconds = 0
+    writer.roll()
+    files = archive_files(str(tmp_path / "archive"))
+    assert len(files) == 1
+    assert not list((tmp_path / "archive").glob("**/.*.tmp"))
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from mai_streaming.builder import (
+    batch_ndjson,
+    build_actions,
+    get_json_encoder,
+    iter_documents,
+    iter_ndjson_records,
+    split_ids,
+)
+
+
+def flows():
+    return pd.DataFrame(
+        {
+            "sip": ["10.0.0.1", None, "10.0.0.3"],
+            "sport": np.array([1000, 1001, 1002], dtype=np.int32),
+            "bytes": pd.array([10, None, 30], dtype="Int64"),
+            "rate": np.array([0.1, np.nan, 2.5], dtype=np.float32),
+            "vpn": [True, False, True],
+            "seen": pd.to_datetime(
+                ["2024-01-01 00:00:00.5", "2024-01-01 00:00:00.0", "2024-01-02 00:00:00.0"]
+            ),
+            "application": pd.Categorical(["web", "dns", None]),
+        }
+    )
+
+
+def test_documents_omit_nulls_and_use_native_values():
+    documents = list(iter_documents(flows()))
+    assert documents == [
+        {
+            "sip": "10.0.0.1",
+            "sport": 1000,
+            "bytes": 10,
+            "rate": 0.1,
+            "vpn": True,
+            "seen": "2024-01-01T00:00:00.500000",
+            "application": "web",
+        },
+        {
+            "sport": 1001,
+            "vpn": False,
+            "seen": "2024-01-01T00:00:00.000000",
+            "application": "dns",
+        },
+        {
+            "sip": "10.0.0.3",
+            "sport": 1002,
+            "bytes": 30,
+            "rate": 2.5,
+            "vpn": True,
+            "seen": "2024-01-02T00:00:00.000000",
+        },
+    ]
+    # Plain Python types, as json.dumps needs
+    assert type(documents[0]["sport"]) is int
+    assert type(documents[0]["bytes"]) is int
+    assert type(documents[0]["rate"]) is float
+
+
+def test_record_batches_give_the_same_documents():
+    frame = flows().drop(columns=["seen"])
+    batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+    assert list(iter_documents(batch)) == list(iter_documents(frame))
+
+
+def test_actions_carry_ids_fields_and_op_type():
+    frame = flows()[["sip", "sport"]].assign(_id=["a", "b", "c"])
+    actions = list(build_actions(frame, "flows", "create", {"source_file": "x.csv"}))
+    assert [action["_id"] for action in actions] == ["a", "b", "c"]
+    assert {action["_op_type"] for action in actions} == {"create"}
+    assert {action["_index"] for action in actions} == {"flows"}
+    assert actions[1]["_source"] == {"sport": 1001, "source_file": "x.csv"}
+    # The id is metadata, not a document field
+    assert all("_id" not in action["_source"] for action in actions)
+
+
+def test_actions_without_ids():
+    actions = list(build_actions(flows()[["sport"]], "flows"))
+    assert actions[0] == {"_op_type": "index", "_index": "flows", "_source": {"sport": 1000}}
+
+
+def test_split_ids():
+    frame = pd.DataFrame({"a": [1], "_id": ["x"]})
+    rest, ids = split_ids(frame)
+    assert ids == ["x"]
+    assert list(rest.columns) == ["a"]
+    assert split_ids(rest)[1] is None
+    assert list(iter_documents(frame.iloc[:0])) == []
+
+
+def expected_ndjson(actions, encoder):
+    """Encode build_actions output as a bulk body, one action at a time."""
+    body = b""
+    for action in actions:
+        meta = {"_index": action["_index"]}
+        if "_id" in action:
+            meta["_id"] = action["_id"]
+        body += encoder({action["_op_type"]: meta}) + b"\n"
+        body += encoder(action["_source"]) + b"\n"
+    return body
+
+
+@pytest.mark.parametrize("encoder_name", ["json", "orjson"])
+@pytest.mark.parametrize("with_ids", [True, False])
+@pytest.mark.parametrize("fields", [None, {"source_file": "x.csv", "sample_rate": 0.5}])
+def test_ndjson_matches_build_actions(encoder_name, with_ids, fields):
+    if encoder_name == "orjson":
+        pytest.importorskip("orjson")
+    encoder = get_json_encoder(encoder_name)
+    frame = flows()
+    if with_ids:
+        frame = frame.assign(_id=["a", "b", "c"])
+    records = list(iter_ndjson_records(frame, "flows", encoder, "create", fields))
+    assert len(records) == 3
+    assert b"".join(records) == expected_ndjson(
+        build_actions(frame, "flows", "create", fields), encoder
+    )
+
+
+def test_fields_alone_for_an_empty_document():
+    frame = pd.DataFrame({"sip": [None]}, dtype=object)
+    records = list(
+        iter_ndjson_records(frame, "flows", get_json_encoder("json"), fields={"a": 1})
+    )
+    assert records == [b'{"index":{"_index":"flows"}}\n{"a":1}\n']
+
+
+def test_batches_respect_document_and_byte_limits():
+    records = [b"x" * 10, b"y" * 10, b"z" * 10, b"w" * 50]
+    assert list(batch_ndjson(records, max_docs=2, max_bytes=1000)) == [
+        (2, b"x" * 10 + b"y" * 10),
+        (2, b"z" * 10 + b"w" * 50),
+    ]
+    # An oversized record still goes out, on its own
+    assert list(batch_ndjson(records, max_docs=10, max_bytes=25)) == [
+        (2, b"x" * 10 + b"y" * 10),
+        (1, b"z" * 10),
+        (1, b"w" * 50),
+    ]
+    assert list(batch_ndjson([], 10, 10)) == []
+
+
+def test_unknown_encoder_is_rejected():
+    with pytest.raises(ValueError):
+        get_json_encoder("yaml")
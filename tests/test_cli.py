@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from mai_streaming.cli import cli
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def test_retention_days_rejects_no_install_templates(tmp_path):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--no-install-templates",
+            "live",
+            "eth0",
+            str(tmp_path),
+            "--rollover",
+            "daily",
+            "--retention-days",
+            "7",
+        ],
+    )
+    assert result.exit_code == 2
+    assert "--no-install-templates" in result.output
+
+
+def test_profile_flag_does_not_take_the_subcommand(tmp_path, monkeypatch):
+    from mai_streaming import ingestor
+    from mai_streaming.profiling import PROFILE_ENV
+
+    calls = []
+    monkeypatch.setattr(
+        ingestor,
+        "ddos_ingest_output_folder",
+        lambda folder, **kwargs: calls.append((folder, kwargs["index"])) or [],
+    )
+    # The CLI exports the profiler settings for worker processes
+    monkeypatch.setenv(PROFILE_ENV, "")
+    (tmp_path / "attack.csv").write_text("window_id,label\n0,syn\n")
+    profiles = tmp_path / "profiles"
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--profile",
+            "--profile-engine",
+            "cprofile",
+            "--profile-dir",
+            str(profiles),
+            "ddos",
+            str(tmp_path),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert len(calls) == 1
+    assert any(profiles.iterdir())
+
+    # The flag alone, directly before the subcommand
+    monkeypatch.chdir(tmp_path)
+    result = CliRunner().invoke(cli, ["--profile", "ddos", str(tmp_path)])
+    assert result.exit_code == 0, result.output
+    assert len(calls) == 2
+
+
+def test_ddos_index_move_is_logged(tmp_path, monkeypatch, caplog):
+    from mai_streaming import ingestor
+
+    indices = []
+    monkeypatch.setattr(
+        ingestor,
+        "ddos_ingest_output_folder",
+        lambda folder, **kwargs: indices.append(kwargs["index"]) or [],
+    )
+    (tmp_path / "attack.csv").write_text("window_id,label\n0,syn\n")
+
+    result = CliRunner().invoke(cli, ["--index", "flows", "ddos", str(tmp_path)])
+    assert result.exit_code == 0, result.output
+    assert indices == ["flows-ddos"]
+    assert "earlier versions wrote them to flows" in caplog.text
+
+    caplog.clear()
+    result = CliRunner().invoke(cli, ["ddos", str(tmp_path), "--ddos-index", "attacks"])
+    assert result.exit_code == 0, result.output
+    assert indices[-1] == "attacks"
+    assert "earlier versions" not in caplog.text
+
+
+def run_fresh(script):
+    """Run ``script`` in a new interpreter and return its stripped output."""
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env={**os.environ, "PYTHONPATH": str(SRC_DIR)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_cli_import_and_help_skip_heavy_modules():
+    # A fresh interpreter: this one has long since imported them
+    script = (
+        "import sys\n"
+        "from click.testing import CliRunner\n"
+        "from mai_streaming.cli import cli\n"
+        "result = CliRunner().invoke(cli, ['--help'])\n"
+        "assert result.exit_code == 0, result.output\n"
+        "heavy = ('pandas', 'numpy', 'pyarrow', 'elasticsearch', 'orjson')\n"
+        "print(' '.join(name for name in heavy if name in sys.modules))\n"
+    )
+    assert run_fresh(script) == ""
+
+
+def test_import_does_not_configure_logging():
+    script = (
+        "import logging\n"
+        "import mai_streaming.cli, mai_streaming.extractor, mai_streaming.ingestor\n"
+        "print(len(logging.getLogger().handlers))\n"
+    )
+    assert run_fresh(script) == "0"
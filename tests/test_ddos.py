@@ -0,0 +1,109 @@
+import pandas as pd
+
+from mai_streaming.ddos import WindowAnalyzer
+
+
+def rows(window_id, count, label="udp-flood", pkts=1):
+    return pd.DataFrame(
+        {
+            "window_id": [window_id] * count,
+            "label": [label] * count,
+            "pl_fwd_count": [pkts] * count,
+        }
+    )
+
+
+def feed(analyzer, counts, label="udp-flood"):
+    """Add one chunk per window and return every summary and breach emitted."""
+    summaries, breaches = [], []
+    for window_id, count in enumerate(counts):
+        emitted, found = analyzer.add(rows(window_id, count, label))
+        summaries.append(emitted)
+        breaches.append(found)
+    emitted, found = analyzer.close()
+    return pd.concat(summaries + [emitted]), pd.concat(breaches + [found])
+
+
+def test_window_finishes_when_a_newer_window_arrives():
+    analyzer = WindowAnalyzer("attack.csv", window_seconds=1, late_windows=1)
+    summaries, _ = analyzer.add(rows(0, 3))
+    assert summaries.empty
+    # Split across chunks, still one window
+    summaries, _ = analyzer.add(rows(0, 2))
+    assert summaries.empty
+
+    summaries, _ = analyzer.add(rows(1, 4))
+    assert summaries["window_id"].tolist() == [0]
+    assert summaries["rows"].tolist() == [5]
+    assert summaries["pl_fwd_count_sum"].tolist() == [5]
+
+    # Window 0 has been summarized, so its rows are late now
+    summaries, _ = analyzer.add(rows(0, 1))
+    assert summaries.empty
+    assert analyzer.late_rows == 1
+    summaries, _ = analyzer.close()
+    assert summaries["window_id"].tolist() == [1]
+    assert summaries["rows"].tolist() == [4]
+
+
+def test_late_windows_keeps_windows_open_longer():
+    analyzer = WindowAnalyzer("attack.csv", window_seconds=1, late_windows=2)
+    analyzer.add(rows(0, 1))
+    summaries, _ = analyzer.add(rows(1, 1))
+    assert summaries.empty
+    # Still accepted: window 0 waits for window 2
+    analyzer.add(rows(0, 1))
+    summaries, _ = analyzer.add(rows(2, 1))
+    assert summaries["window_id"].tolist() == [0]
+    assert summaries["rows"].tolist() == [2]
+    assert analyzer.late_rows == 0
+
+
+def test_summaries_per_label_with_rates():
+    analyzer = WindowAnalyzer("attack.csv", window_seconds=10)
+    analyzer.add(pd.concat([rows(0, 20, "syn", pkts=3), rows(0, 5, "benign")]))
+    summaries, _ = analyzer.close()
+    summaries = summaries.sort_values("label").reset_index(drop=True)
+    assert summaries["label"].tolist() == ["benign", "syn"]
+    assert summaries["rows_rate"].tolist() == [0.5, 2.0]
+    assert summaries["pl_fwd_count_rate"].tolist() == [0.5, 6.0]
+    assert summaries["pl_fwd_count_max"].tolist() == [1, 3]
+    assert summaries["timestamp"].tolist() == [0, 0]
+    assert summaries["_id"].is_unique
+
+
+def test_spike_is_flagged_against_the_baseline():
+    analyzer = WindowAnalyzer(
+        "attack.csv", window_seconds=1, zscore=3, baseline_windows=5, min_windows=3
+    )
+    _, breaches = feed(analyzer, [10, 11, 10, 9, 10, 12, 100, 10])
+    flagged = breaches[breaches["metric"] == "rows"]
+    assert flagged["window_id"].tolist() == [6]
+    assert flagged["rate"].tolist() == [100.0]
+    assert flagged["zscore"].iloc[0] >= 3
+    assert set(breaches["metric"]) == {"rows", "pl_fwd_count"}
+    assert analyzer.breaches == len(breaches)
+
+
+def test_no_alerts_before_min_windows():
+    analyzer = WindowAnalyzer("attack.csv", window_seconds=1, zscore=3, min_windows=3)
+    _, breaches = feed(analyzer, [10, 100, 1000])
+    assert breaches.empty
+
+
+def test_breaching_windows_do_not_raise_the_baseline():
+    analyzer = WindowAnalyzer(
+        "attack.csv", window_seconds=1, zscore=3, baseline_windows=2, min_windows=3
+    )
+    # A sustained attack keeps alerting instead of becoming the norm
+    _, breaches = feed(analyzer, [10, 10, 10, 10, 100, 100, 100, 100])
+    assert breaches[breaches["metric"] == "rows"]["window_id"].tolist() == [4, 5, 6, 7]
+    assert breaches["baseline_rate"].max() == 10.0
+
+
+def test_labels_keep_separate_baselines():
+    analyzer = WindowAnalyzer("attack.csv", window_seconds=1, zscore=3, min_windows=3)
+    for window_id in range(5):
+        analyzer.add(pd.concat([rows(window_id, 10, "syn"), rows(window_id, 1000, "benign")]))
+    _, breaches = analyzer.close()
+    assert breaches.empty
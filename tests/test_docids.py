@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from mai_streaming.docids import FLOW_KEY_COLUMNS, column_ids, flow_ids, row_ids
+from mai_streaming.ingestor import iter_arrow_csv_batches
+
+
+def flows():
+    return pd.DataFrame(
+        {
+            "sip": ["10.0.0.1", "10.0.0.2", "10.0.0.1"],
+            "sport": [1000, 1000, 1000],
+            "dip": ["192.0.2.1"] * 3,
+            "dport": [443, 443, 443],
+            "proto": [6, 6, 6],
+            "first_timestamp": np.array([0, 0, 1], dtype=np.int64) + 1_700_000_000_000_000,
+            "bytes": [1, 2, 3],
+        }
+    )
+
+
+def test_ids_depend_only_on_the_flow_key():
+    ids = flow_ids(flows())
+    assert len(set(ids)) == 3
+    # Other columns and row positions do not change a flow's id
+    shuffled = flows().assign(bytes=[9, 9, 9]).iloc[::-1].reset_index(drop=True)
+    assert flow_ids(shuffled).tolist() == ids[::-1].tolist()
+    assert flow_ids(flows().drop(columns=["proto"])) is None
+
+
+def test_ids_do_not_depend_on_the_reader_dtypes(sample_csv):
+    frame = flows()
+    compact = frame.astype({"sport": np.uint16, "dport": "UInt16", "proto": np.uint8})
+    # Integers read as floats because of missing values elsewhere
+    floats = frame.astype({"sport": float, "first_timestamp": float})
+    as_datetimes = frame.assign(
+        first_timestamp=pd.to_datetime(frame["first_timestamp"], unit="us")
+    )
+    batch = pa.RecordBatch.from_pandas(compact, preserve_index=False)
+    expected = flow_ids(frame).tolist()
+    for other in (compact, floats, as_datetimes, batch):
+        assert flow_ids(other).tolist() == expected
+
+    # The Arrow and pandas readers agree on real TWC output
+    from_pandas = pd.read_csv(sample_csv, usecols=FLOW_KEY_COLUMNS)
+    from_arrow = iter_arrow_csv_batches(sample_csv, FLOW_KEY_COLUMNS, 100)
+    assert np.concatenate([flow_ids(b) for b in from_arrow]).tolist() == (
+        flow_ids(from_pandas).tolist()
+    )
+
+
+def test_missing_values_still_give_ids():
+    frame = pd.DataFrame({"a": ["x", None], "b": [1.0, np.nan]})
+    ids = column_ids(frame, ["a", "b"])
+    assert ids[0] != ids[1]
+    assert column_ids(frame, ["a", "b"]).tolist() == ids.tolist()
+
+
+def test_row_ids_use_the_source_and_position():
+    frame = pd.DataFrame({"window_id": [0, 0, 1]})
+    ids = row_ids(frame, "attack.csv", 0, "window_id")
+    assert len(set(ids)) == 3
+    assert row_ids(frame, "attack.csv", 0, "window_id").tolist() == ids.tolist()
+    assert row_ids(frame.iloc[1:], "attack.csv", 1, "window_id").tolist() == ids[1:].tolist()
+    assert row_ids(frame, "other.csv", 0, "window_id")[0] != ids[0]
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from mai_streaming import enrich
+from mai_streaming.enrich import enrich_chunk, epoch_millis
+
+MICROS = np.array([1_700_000_000_123_456, 1_700_000_001_000_999], dtype=np.int64)
+MILLIS = [1_700_000_000_123, 1_700_000_001_000]
+
+
+@pytest.mark.parametrize(
+    "values, unit",
+    [
+        (MICROS, "us"),
+        (MICROS * 1000, "ns"),
+        (MICROS // 1000, "ms"),
+        (MICROS.astype("uint64"), "us"),
+        (pd.to_datetime(MICROS, unit="us"), "us"),
+    ],
+)
+def test_pandas_columns_become_epoch_millis(values, unit):
+    frame = epoch_millis(pd.DataFrame({"t": values}), "t", unit)
+    assert frame["t"].dtype == np.int64
+    assert frame["t"].tolist() == MILLIS
+
+
+def test_gaps_stay_null():
+    frame = pd.DataFrame({"t": [1_700_000_000_123_456.0, np.nan]})
+    frame = epoch_millis(frame, "t", "us")
+    assert frame["t"].dtype == "Int64"
+    assert frame["t"].tolist() == [MILLIS[0], pd.NA]
+    times = pd.DataFrame({"t": pd.to_datetime([MICROS[0], None], unit="us")})
+    assert epoch_millis(times, "t", "us")["t"].tolist() == [MILLIS[0], pd.NA]
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        pa.array(MICROS),
+        pa.array(MICROS.astype(float)),
+        pa.array(MICROS, type=pa.timestamp("us")),
+    ],
+)
+def test_record_batch_columns_become_epoch_millis(values):
+    batch = pa.RecordBatch.from_arrays([values, pa.array([1, 2])], names=["t", "x"])
+    batch = epoch_millis(batch, "t", "us")
+    assert batch.schema.names == ["t", "x"]
+    assert batch.column(0).type == pa.int64()
+    assert batch.column(0).to_pylist() == MILLIS
+
+
+def test_windows_are_written_to_a_target_column():
+    frame = pd.DataFrame({"window_id": [0, 1, 2]})
+    frame = epoch_millis(frame, "window_id", "s", step=30, target="timestamp")
+    assert frame["window_id"].tolist() == [0, 1, 2]
+    assert frame["timestamp"].tolist() == [0, 30_000, 60_000]
+    batch = pa.RecordBatch.from_pandas(pd.DataFrame({"window_id": [0, 1, 2]}))
+    batch = epoch_millis(batch, "window_id", "s", step=30, target="timestamp")
+    assert batch.column("timestamp").to_pylist() == [0, 30_000, 60_000]
+
+
+def test_chunk_fields_name_the_source(monkeypatch):
+    monkeypatch.setattr(enrich, "now_millis", lambda: 42)
+    frame, fields = enrich_chunk(
+        pd.DataFrame({"t": MICROS}), "t", "us", source="/data/out/capture.csv"
+    )
+    assert frame["t"].tolist() == MILLIS
+    assert fields == {"source_file": "capture.csv", "ingested_at": 42}
+    # Batch fields are not added as columns
+    assert list(frame.columns) == ["t"]
+    assert enrich_chunk(pd.DataFrame({"t": MICROS}), "t", "us")[1] == {}
@@ -0,0 +1,226 @@
+import contextlib
+import os
+import sys
+
+import pytest
+
+from mai_streaming import extractor, ingestor, manifest as manifest_module
+from mai_streaming.config import PROCESSED_MARKER, TWCConfig
+from mai_streaming.manifest import ExtractionManifest
+from mai_streaming.projection import get_profile
+
+# Stands in for twc: writes one CSV into the output directory, slowly enough
+# for concurrent extractions to overlap, and fails for captures named bad*
+FAKE_TWC = """
+import os, sys, time
+output_dir, pcap = sys.argv[1], sys.argv[2]
+with open(os.path.join(output_dir, "flows.csv"), "w") as f:
+    f.write("sip,dip\\n")
+    time.sleep(0.2)
+    f.write(f"{os.path.basename(pcap)},x\\n")
+sys.exit(1 if os.path.basename(pcap).startswith("bad") else 0)
+"""
+
+
+@pytest.fixture
+def fake_twc(monkeypatch):
+    def cmd(output_dir, pcap_file):
+        return [sys.executable, "-c", FAKE_TWC, output_dir, pcap_file]
+
+    monkeypatch.setattr(TWCConfig, "get_pcap_extract_cmd", staticmethod(cmd))
+
+
+@pytest.fixture
+def nested_pcaps(tmp_path):
+    pcaps = tmp_path / "pcaps"
+    (pcaps / "x").mkdir(parents=True)
+    for name in ("x.pcap", "x/y.pcap", "x/bad.pcap"):
+        (pcaps / name).write_bytes(b"\0" * 64)
+    return pcaps
+
+
+def test_nested_pcaps_get_disjoint_outputs(fake_twc, nested_pcaps, tmp_path):
+    output = tmp_path / "output"
+    results = extractor.process_pcap_folder(str(nested_pcaps), str(output), jobs=3)
+
+    dirs = sorted(os.path.relpath(result.output_dir, output) for result in results)
+    assert dirs == ["x.pcap.d", os.path.join("x", "bad.pcap.d"), os.path.join("x", "y.pcap.d")]
+    for result in results:
+        assert not any(
+            other != result.output_dir and other.startswith(result.output_dir + os.sep)
+            for other in dirs
+        )
+    assert (output / "x.pcap.d" / "flows.csv").read_text() == "sip,dip\nx.pcap,x\n"
+    assert (output / "x" / "y.pcap.d" / "flows.csv").read_text() == "sip,dip\ny.pcap,x\n"
+
+
+def test_sweep_skips_failed_extractions(fake_twc, nested_pcaps, tmp_path, monkeypatch):
+    ingested = []
+    monkeypatch.setattr(
+        ingestor, "process_data_file", lambda path, *args: ingested.append(path)
+    )
+    output = tmp_path / "output"
+    results = extractor.process_pcap_folder(str(nested_pcaps), str(output), jobs=3)
+    failed = [result.output_dir for result in results if not result.ok]
+    assert failed == [str(output / "x" / "bad.pcap.d")]
+
+    ingestor.ingest_new_files(str(output), None, "flows", skip=failed)
+    assert sorted(ingested) == sorted(
+        [str(output / "x" / "y.pcap.d" / "flows.csv"), str(output / "x.pcap.d" / "flows.csv")]
+    )
+    assert not (output / "x" / "bad.pcap.d" / f"flows.csv{PROCESSED_MARKER}").exists()
+
+
+def test_clear_outputs_leaves_subdirectories(tmp_path):
+    output = tmp_path / "x.pcap.d"
+    (output / "nested").mkdir(parents=True)
+    for name in ("flows.csv", f"flows.csv{PROCESSED_MARKER}", "nested/flows.csv"):
+        (output / name).write_text("a\n")
+
+    extractor._clear_outputs(str(output))
+    assert sorted(os.listdir(output)) == ["nested"]
+    assert (output / "nested" / "flows.csv").exists()
+
+
+def test_manifest_records_only_handled_outputs(fake_twc, nested_pcaps, tmp_path):
+    output = tmp_path / "output"
+    manifest = ExtractionManifest(tmp_path / "manifest.json")
+    # The output of y.pcap fails to ingest
+    extractor.process_pcap_folder(
+        str(nested_pcaps),
+        str(output),
+        jobs=3,
+        on_extracted=lambda result: not result.pcap.endswith("y.pcap"),
+        manifest=manifest,
+    )
+    recorded = sorted(os.path.relpath(pcap, nested_pcaps) for pcap in manifest.entries)
+    assert recorded == ["x.pcap"]
+
+    # The next run retries y.pcap (and the failed bad.pcap) only
+    rerun = []
+    extractor.process_pcap_folder(
+        str(nested_pcaps),
+        str(output),
+        on_extracted=lambda result: rerun.append(result.pcap) or True,
+        manifest=ExtractionManifest(tmp_path / "manifest.json"),
+    )
+    assert sorted(os.path.relpath(pcap, nested_pcaps) for pcap in rerun) == [
+        os.path.join("x", "bad.pcap"),
+        os.path.join("x", "y.pcap"),
+    ]
+
+
+def test_manifest_hashes_only_captures_that_look_unchanged(tmp_path, monkeypatch):
+    hashed = []
+    sha256 = manifest_module.file_sha256
+    monkeypatch.setattr(
+        manifest_module, "file_sha256", lambda path: hashed.append(path) or sha256(path)
+    )
+    pcap = tmp_path / "x.pcap"
+    pcap.write_bytes(b"packets")
+    manifest = ExtractionManifest(tmp_path / "manifest.json", hash_content=True)
+
+    # Not in the manifest: no hash until the extraction is recorded
+    fingerprint = manifest.fingerprint(str(pcap), ["twc"])
+    assert not manifest.is_current(str(pcap), fingerprint)
+    assert hashed == []
+    manifest.record(str(pcap), fingerprint)
+    assert len(hashed) == 1
+
+    # Same size, mtime and command: hashed and compared
+    assert manifest.is_current(str(pcap), manifest.fingerprint(str(pcap), ["twc"]))
+    assert len(hashed) == 2
+    # A different command is caught without reading the capture
+    assert not manifest.is_current(str(pcap), manifest.fingerprint(str(pcap), ["twc", "-v"]))
+    assert len(hashed) == 2
+
+    # A rewrite that keeps size and mtime is caught by the hash
+    stat = pcap.stat()
+    pcap.write_bytes(b"PACKETS")
+    os.utime(pcap, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert not manifest.is_current(str(pcap), manifest.fingerprint(str(pcap), ["twc"]))
+    assert len(hashed) == 3
+
+
+# Stands in for `twc ... -o stdout`: prints flows, then exits with the given code
+FAKE_TWC_STDOUT = """
+import sys
+print("sip,sport,dip,dport,proto,first_timestamp")
+for i in range(3):
+    print(f"10.0.0.{i},{1000 + i},192.0.2.1,443,6,{1_700_000_000_000_000 + i}")
+sys.exit(int(sys.argv[1]))
+"""
+
+
+class StreamIngestor:
+    """Records what stream_twc_output sends and how the archive is finished."""
+
+    def __init__(self, fail=False):
+        self.profile = get_profile("full-features")
+        self.read_columns = None
+        self.lookups = None
+        self.fail = fail
+        self.docs_failed = 0
+        self.rows = 0
+        self.archives = []
+
+    def archive_chunk(self, chunk, source):
+        return chunk
+
+    def rollup_chunk(self, chunk, index, fields):
+        return chunk, fields
+
+    def ingest_dataframe(self, chunk, index, fields=None):
+        if self.fail:
+            self.docs_failed += len(chunk)
+        else:
+            self.rows += len(chunk)
+
+    def flush(self):
+        pass
+
+    def finish_archive(self, source, ok=True):
+        self.archives.append((source, ok))
+
+
+def stdout_cmd(code):
+    return [sys.executable, "-c", FAKE_TWC_STDOUT, str(code)]
+
+
+def test_stream_twc_output_succeeds():
+    es_ingestor = StreamIngestor()
+    assert extractor.stream_twc_output(stdout_cmd(0), es_ingestor, "flows", "a.pcap") == 3
+    assert es_ingestor.archives == [("a.pcap", True)]
+
+
+def test_stream_twc_output_fails_on_twc_exit_code():
+    es_ingestor = StreamIngestor()
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        extractor.stream_twc_output(stdout_cmd(3), es_ingestor, "flows", "a.pcap")
+    # The rows were sent, but the source is read again, so not archived
+    assert es_ingestor.rows == 3
+    assert es_ingestor.archives == [("a.pcap", False)]
+
+
+def test_stream_twc_output_fails_on_rejected_documents():
+    es_ingestor = StreamIngestor(fail=True)
+    with pytest.raises(RuntimeError, match="3 documents"):
+        extractor.stream_twc_output(stdout_cmd(0), es_ingestor, "flows", "a.pcap")
+    assert es_ingestor.archives == [("a.pcap", False)]
+
+
+def test_stream_pcap_folder_reports_failed_pcaps(nested_pcaps, monkeypatch):
+    monkeypatch.setattr(
+        TWCConfig,
+        "get_pcap_extract_cmd",
+        staticmethod(lambda output, pcap: stdout_cmd(1 if "bad" in pcap else 0)),
+    )
+    es_ingestor = StreamIngestor()
+    es_ingestor.prepare_index = lambda index: None
+    es_ingestor.bulk_load = lambda index: contextlib.nullcontext()
+    es_ingestor.close = lambda: None
+    monkeypatch.setattr(extractor, "ESIngestor", lambda config: es_ingestor)
+
+    failed = extractor.stream_pcap_folder(str(nested_pcaps))
+    assert failed == [str(nested_pcaps / "x" / "bad.pcap")]
+    assert es_ingestor.rows == 9
@@ -0,0 +1,92 @@
+from fnmatch import fnmatchcase
+from types import SimpleNamespace
+
+import pytest
+from elasticsearch import ApiError
+
+from mai_streaming.config import (
+    DDOS_ANALYTICS_SUFFIX,
+    DDOS_INDEX_SUFFIX,
+    ESConfig,
+    ROLLUP_INDEX_SUFFIX,
+)
+from mai_streaming.indices import install_daily_template, install_template
+from mai_streaming.ingestor import ESIngestor
+
+
+class FakeIndices:
+    """Keeps templates like Elasticsearch: overlapping patterns need distinct priorities."""
+
+    def __init__(self):
+        self.templates = {}
+
+    def put_index_template(self, name, index_patterns, priority, template):
+        for other, (patterns, other_priority, _) in self.templates.items():
+            if other != name and other_priority == priority and patterns == index_patterns:
+                raise ValueError(f"{name} overlaps {other} at priority {priority}")
+        self.templates[name] = (index_patterns, priority, template)
+
+    def template_for(self, index):
+        matches = [
+            (priority, name)
+            for name, (patterns, priority, _) in self.templates.items()
+            if any(fnmatchcase(index, pattern) for pattern in patterns)
+        ]
+        return max(matches)[1]
+
+
+class FakeES:
+    def __init__(self):
+        self.indices = FakeIndices()
+
+
+def test_every_kind_maps_its_own_indices():
+    es = FakeES()
+    base = "streaming"
+    ddos = f"{base}{DDOS_INDEX_SUFFIX}"
+    for index, kind in [
+        (base, "flow"),
+        (f"{base}{ROLLUP_INDEX_SUFFIX}", "rollup"),
+        (ddos, "ddos"),
+        (f"{ddos}{DDOS_ANALYTICS_SUFFIX}", "ddos_analytics"),
+    ]:
+        install_template(es, index, kind)
+        install_daily_template(es, index, kind)
+
+    resolve = es.indices.template_for
+    assert resolve("streaming") == "mai-flow-streaming"
+    assert resolve("streaming-2024.05.01") == "mai-flow-streaming-daily"
+    assert resolve("streaming-rollup-2024.05.01") == "mai-rollup-streaming-rollup-daily"
+    assert resolve("streaming-ddos") == "mai-ddos-streaming-ddos"
+    assert resolve("streaming-ddos-analytics") == "mai-ddos_analytics-streaming-ddos-analytics"
+
+
+def test_same_index_for_flow_and_ddos_does_not_collide():
+    es = FakeES()
+    install_template(es, "streaming", "flow")
+    install_template(es, "streaming", "ddos")
+    assert len(es.indices.templates) == 2
+
+
+class RejectingIndices:
+    def put_index_template(self, **kwargs):
+        raise ApiError("illegal_argument_exception", meta=SimpleNamespace(status=400), body={})
+
+
+def test_template_failure_is_fatal():
+    ingestor = ESIngestor(ESConfig(url="http://localhost:1"))
+    try:
+        ingestor.es.indices = RejectingIndices()
+        with pytest.raises(RuntimeError, match="index template"):
+            ingestor.prepare_index("streaming", "ddos")
+    finally:
+        ingestor.close()
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [{"rollover": "daily", "install_templates": False}, {"rollover": "none"}],
+)
+def test_retention_needs_daily_templates(settings):
+    with pytest.raises(ValueError, match="retention_days"):
+        ESIngestor(ESConfig(url="http://localhost:1", retention_days=7, **settings))
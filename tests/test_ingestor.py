@@ -0,0 +1,133 @@
+import logging
+import multiprocessing.util
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.orc as orc
+import pytest
+
+from mai_streaming import ingestor
+from mai_streaming.config import ESConfig, ReaderConfig
+from mai_streaming.projection import get_profile
+
+
+class ClosingIngestor:
+    closed = 0
+
+    def __init__(self, config):
+        self.config = config
+
+    def close(self):
+        ClosingIngestor.closed += 1
+
+
+def test_ddos_worker_closes_its_ingestor(monkeypatch):
+    monkeypatch.setattr(ingestor, "ESIngestor", ClosingIngestor)
+    monkeypatch.setattr(ingestor, "start_worker_profiler", lambda name: None)
+    monkeypatch.setattr(ingestor, "_worker_ingestor", None)
+
+    ingestor._init_ddos_worker(ESConfig(), logging.WARNING)
+    assert ClosingIngestor.closed == 0
+    # What the worker runs on shutdown, ahead of the profiler (priority 10)
+    multiprocessing.util._run_finalizers(20)
+    assert ClosingIngestor.closed == 1
+
+
+ORC_COLUMNS = ["sip", "sport", "proto", "first_timestamp", "sni", "pkt_fwd_count"]
+
+
+@pytest.fixture
+def sample_orc(sample_csv, tmp_path):
+    """The sample CSV as an ORC file with several stripes."""
+    path = tmp_path / "flows.orc"
+    table = pa.Table.from_pandas(pd.read_csv(sample_csv), preserve_index=False)
+    orc.write_table(table, path, stripe_size=1024, batch_size=64)
+    assert orc.ORCFile(path).nstripes > 1
+    return path
+
+
+def test_orc_chunks_match_the_csv(sample_csv, sample_orc):
+    chunks = list(ingestor.iter_orc_chunks(sample_orc, ORC_COLUMNS, 50))
+    assert max(len(chunk) for chunk in chunks) <= 50
+    flows = pd.concat(chunks, ignore_index=True)
+    assert list(flows.columns) == ORC_COLUMNS
+    pd.testing.assert_frame_equal(
+        flows, pd.read_csv(sample_csv, usecols=ORC_COLUMNS)[ORC_COLUMNS], check_dtype=False
+    )
+
+
+def test_orc_reads_profile_dtypes(sample_orc):
+    profile = get_profile("classification")
+    chunks = ingestor.read_data_file(str(sample_orc), profile.columns, 100, profile=profile)
+    chunk = next(iter(chunks))
+    assert chunk["sport"].dtype == np.uint16
+    assert chunk["proto"].dtype == np.uint8
+    assert isinstance(chunk["sni"].dtype, pd.CategoricalDtype)
+    # Without a chunk size the whole file comes back at once
+    whole = ingestor.read_data_file(str(sample_orc), profile.columns, profile=profile)
+    assert len(whole) == 256
+    assert whole["sport"].dtype == np.uint16
+
+
+CSV_COLUMNS = ["sip", "sport", "dport", "proto", "first_timestamp", "sni", "application"]
+
+
+def test_arrow_batches_are_sliced_and_match_read_csv(sample_csv):
+    batches = list(ingestor.iter_arrow_csv_batches(sample_csv, CSV_COLUMNS, 100))
+    assert [batch.num_rows for batch in batches] == [100, 100, 56]
+    flows = pa.Table.from_batches(batches).to_pandas()
+    assert list(flows.columns) == CSV_COLUMNS
+    pd.testing.assert_frame_equal(
+        flows, pd.read_csv(sample_csv)[CSV_COLUMNS], check_dtype=False
+    )
+
+
+def test_arrow_reads_profile_types(sample_csv):
+    profile = get_profile("classification")
+    batches = ingestor.read_data_file(str(sample_csv), profile.columns, 100, profile=profile)
+    batch = next(iter(batches))
+    assert isinstance(batch, pa.RecordBatch)
+    assert batch.schema.names == profile.columns
+    assert batch.schema.field("sport").type == pa.uint16()
+    assert batch.schema.field("proto").type == pa.uint8()
+    assert pa.types.is_dictionary(batch.schema.field("sni").type)
+
+
+@pytest.mark.parametrize(
+    "name", ["wlp5s0.csv", "protonvpn_youtube_vpnEstablished_29-11-2024.csv"]
+)
+def test_csv_engines_read_the_same_flows(sample_csv, name):
+    path = str(sample_csv.with_name(name))
+    profile = get_profile("classification")
+    arrow_chunks = ingestor.read_data_file(path, profile.columns, 100, profile=profile)
+    pandas_chunks = ingestor.read_data_file(
+        path, profile.columns, 100, ReaderConfig(csv_engine="pandas"), profile
+    )
+    from_arrow = pa.Table.from_batches(list(arrow_chunks)).to_pandas()
+    from_pandas = pd.concat(pandas_chunks, ignore_index=True)[profile.columns]
+    pd.testing.assert_frame_equal(
+        from_arrow.astype(object).where(from_arrow.notna(), None),
+        from_pandas.astype(object).where(from_pandas.notna(), None),
+    )
+
+
+def test_conflicts_count_as_existing_documents(monkeypatch):
+    es_ingestor = ingestor.ESIngestor(ESConfig(url="http://localhost:1"))
+    failed = [
+        {"create": {"_id": "a", "status": 409}},
+        {"create": {"_id": "b", "status": 409}},
+        {"create": {"_id": "c", "status": 400}},
+    ]
+
+    def bulk(client, actions, **kwargs):
+        assert len(list(actions)) == 5
+        return 2, failed
+
+    monkeypatch.setattr(ingestor.helpers, "bulk", bulk)
+    frame = pd.DataFrame({"sport": range(5), "_id": list("abcde")})
+    es_ingestor.bulk_ingest(es_ingestor._create_actions(frame, "flows", op_type="create"))
+    assert es_ingestor.docs_indexed == 2
+    assert es_ingestor.docs_existing == 2
+    assert es_ingestor.docs_failed == 1
+    es_ingestor.close()
@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+
+from mai_streaming.lookup import DomainTable, Lookups, PrefixTable, _AttributeTable
+
+
+def write_table(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.fixture
+def nested_networks(tmp_path):
+    # 10.1.0.0/16 ends inside 10.0.0.0/8, then siblings follow, so the
+    # parent chain has to step over closed networks
+    return write_table(
+        tmp_path / "networks.csv",
+        "network,tag\n"
+        "10.0.0.0/8,corp\n"
+        "10.1.0.0/16,lab\n"
+        "10.1.2.0/24,rack\n"
+        "10.1.2.128/25,row\n"
+        "10.2.0.0/16,office\n"
+        "192.0.2.0/24,docs\n"
+        "2001:db8::/32,v6\n"
+        "2001:db8:1::/48,v6-lab\n",
+    )
+
+
+def tags(table, values):
+    rows = table.rows(values)
+    return [table.fields["tag"][row] for row in rows]
+
+
+def test_attribute_table_is_abstract():
+    with pytest.raises(TypeError):
+        _AttributeTable("key", [], 16)
+
+
+def test_longest_prefix_in_nested_networks(nested_networks):
+    table = PrefixTable([nested_networks])
+    assert tags(
+        table,
+        [
+            "10.1.2.200",  # Innermost of four nested networks
+            "10.1.2.5",
+            "10.1.3.1",  # After 10.1.2.0/24 ends, back to its parent
+            "10.1.255.255",
+            "10.3.0.1",  # After two closed /16s, back to the /8
+            "10.2.0.1",
+            "11.0.0.1",
+            "192.0.2.1",
+            "2001:db8:1::1",
+            "2001:db8:2::1",
+            "not an address",
+        ],
+    ) == ["row", "rack", "lab", "lab", "corp", "office", None, "docs", "v6-lab", "v6", None]
+
+
+def test_later_tables_win_for_the_same_network(nested_networks, tmp_path):
+    override = write_table(tmp_path / "override.csv", "network,tag\n10.1.0.0/16,lab2\n")
+    table = PrefixTable([nested_networks, override])
+    assert tags(table, ["10.1.3.1", "10.1.2.5"]) == ["lab2", "rack"]
+
+
+@pytest.fixture
+def domains(tmp_path):
+    return write_table(
+        tmp_path / "domains.csv",
+        "domain,tag\n"
+        "youtube.com,video\n"
+        "www.youtube.com,video-web\n"
+        "*.googlevideo.com,video-cdn\n"
+        "example.org.,docs\n",
+    )
+
+
+def test_longest_domain_suffix(domains):
+    table = DomainTable([domains])
+    assert tags(
+        table,
+        [
+            "m.youtube.com",
+            "www.youtube.com",
+            "WWW.YouTube.com.",
+            "r1.sn-abc.googlevideo.com",
+            "example.org",
+            "notyoutube.com",
+            "com",
+        ],
+    ) == ["video", "video-web", "video-web", "video-cdn", "docs", None, None]
+
+
+def test_slash_joined_dns_names_take_the_first_match(domains):
+    table = DomainTable([domains])
+    assert tags(
+        table,
+        [
+            "unknown.net/r1.googlevideo.com/m.youtube.com",
+            "www.youtube.com/example.org",
+            "a.net/b.net",
+        ],
+    ) == ["video-cdn", "video-web", None]
+
+
+def test_apply_adds_attribute_columns(nested_networks, domains):
+    lookups = Lookups([nested_networks], [domains], ["sip"], ["dns"])
+    flows = pd.DataFrame(
+        {
+            "sip": ["10.1.2.200", "10.3.0.1", None, "10.1.2.200"],
+            "dns": ["a.net/m.youtube.com", None, "example.org", "x"],
+        }
+    )
+    flows = lookups.apply(flows)
+    assert flows["sip_tag"].isna().tolist() == [False, False, True, False]
+    assert flows["sip_tag"].dropna().tolist() == ["row", "corp", "row"]
+    assert flows["dns_tag"].isna().tolist() == [False, True, False, True]
+    assert flows["dns_tag"].dropna().tolist() == ["video", "docs"]
+    # Repeated values are looked up once
+    assert lookups.cache_stats()["misses"] == 5
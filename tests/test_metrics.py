@@ -0,0 +1,129 @@
+import logging
+import urllib.error
+import urllib.request
+
+import pytest
+
+from mai_streaming.metrics import (
+    METRICS,
+    Metrics,
+    StatsReporter,
+    stage_timer,
+    start_metrics_server,
+    timed_iter,
+)
+
+
+def test_counters_are_kept_per_label_set():
+    metrics = Metrics()
+    metrics.inc("mai_bulk_docs_total", 3, result="indexed")
+    metrics.inc("mai_bulk_docs_total", 2, result="indexed")
+    metrics.inc("mai_bulk_docs_total", result="failed")
+    assert metrics.counter("mai_bulk_docs_total", result="indexed") == 5
+    assert metrics.counter("mai_bulk_docs_total", result="failed") == 1
+    assert metrics.counter("mai_bulk_docs_total", result="spooled") == 0
+    # Label order does not matter
+    metrics.inc("x", a="1", b="2")
+    assert metrics.counter("x", b="2", a="1") == 1
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    metrics = Metrics()
+    for value in [0.003] * 90 + [0.2] * 10:
+        metrics.observe("mai_es_request_seconds", value)
+    latency = metrics.histogram("mai_es_request_seconds")
+    assert latency.count == 100
+    assert latency.percentile(50) == 0.005
+    assert latency.percentile(99) == 0.25
+    assert metrics.histogram("mai_es_request_seconds", stage="x") is None
+
+
+def test_export_and_merge_add_up():
+    worker, parent = Metrics(), Metrics()
+    worker.inc("mai_stage_rows_in_total", 10, stage="parse")
+    worker.observe("mai_es_request_seconds", 0.02)
+    parent.inc("mai_stage_rows_in_total", 5, stage="parse")
+    parent.merge(worker.export(reset=True))
+    parent.merge(worker.export())
+    assert parent.counter("mai_stage_rows_in_total", stage="parse") == 15
+    assert parent.histogram("mai_es_request_seconds").count == 1
+    assert worker.counter("mai_stage_rows_in_total", stage="parse") == 0
+
+
+def test_render_prometheus_text():
+    metrics = Metrics()
+    metrics.inc("mai_bulk_docs_total", 1e7, result="indexed")
+    metrics.inc("mai_stage_seconds_total", 0.5, stage="send")
+    metrics.observe("mai_es_request_seconds", 0.02)
+    metrics.observe("mai_es_request_seconds", 100)
+    metrics.add_collector("sender", lambda: {"mai_sender_queue_depth": 2})
+    metrics.add_collector("other", lambda: {"mai_sender_queue_depth": 1})
+    metrics.add_collector("broken", lambda: 1 / 0)
+    lines = metrics.render().splitlines()
+    assert "# TYPE mai_bulk_docs_total counter" in lines
+    assert 'mai_bulk_docs_total{result="indexed"} 10000000' in lines
+    assert 'mai_stage_seconds_total{stage="send"} 0.5' in lines
+    assert "# TYPE mai_es_request_seconds histogram" in lines
+    assert 'mai_es_request_seconds_bucket{le="0.01"} 0' in lines
+    assert 'mai_es_request_seconds_bucket{le="0.025"} 1' in lines
+    assert 'mai_es_request_seconds_bucket{le="30"} 1' in lines
+    assert 'mai_es_request_seconds_bucket{le="+Inf"} 2' in lines
+    assert "mai_es_request_seconds_count 2" in lines
+    # Gauges are summed across collectors; a failing one is skipped
+    assert "mai_sender_queue_depth 3" in lines
+
+
+def test_stage_timer_records_time_and_counts():
+    before = {
+        name: METRICS.counter(f"mai_stage_{name}_total", stage="discover")
+        for name in ("seconds", "rows_out", "bytes")
+    }
+    with pytest.raises(RuntimeError):
+        with stage_timer("discover") as sample:
+            sample.rows_out = 3
+            sample.nbytes = 100
+            raise RuntimeError
+    # Recorded even when the block fails
+    assert METRICS.counter("mai_stage_rows_out_total", stage="discover") == (
+        before["rows_out"] + 3
+    )
+    assert METRICS.counter("mai_stage_bytes_total", stage="discover") == before["bytes"] + 100
+    assert METRICS.counter("mai_stage_seconds_total", stage="discover") > before["seconds"]
+
+
+def test_timed_iter_counts_items_it_yields():
+    before = METRICS.counter("mai_stage_rows_out_total", stage="build")
+    items = timed_iter([[1, 2], [3]], "build", flush_every=10)
+    assert list(items) == [[1, 2], [3]]
+    assert METRICS.counter("mai_stage_rows_out_total", stage="build") == before + 3
+
+
+def test_metrics_server_serves_the_registry():
+    METRICS.inc("mai_bulk_requests_total", 0)
+    server = start_metrics_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "# TYPE mai_bulk_requests_total counter" in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stats_reporter_logs_the_activity_since_the_last_report(caplog):
+    metrics = Metrics()
+    reporter = StatsReporter(60, metrics)
+    metrics.inc("mai_stage_rows_out_total", 100, stage="parse")
+    metrics.inc("mai_stage_seconds_total", 0.1, stage="parse")
+    metrics.inc("mai_bulk_docs_total", 7, result="indexed")
+    with caplog.at_level(logging.INFO, logger="mai_streaming.metrics"):
+        reporter.report()
+        reporter.report()
+    first, second = [record.getMessage() for record in caplog.records]
+    assert "parse" in first
+    assert "docs indexed 7" in first
+    assert "parse" not in second
+    assert "docs indexed 0" in second
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from mai_streaming.config import ProjectionProfile
+from mai_streaming.ingestor import iter_arrow_csv_batches
+from mai_streaming.projection import (
+    arrow_types,
+    cast_batch,
+    csv_header,
+    get_profile,
+    pandas_dtypes,
+    resolve_dtypes,
+)
+
+FAMILY_COLUMNS = {
+    "sip": ("string", pa.string()),
+    "sport": ("UInt16", pa.uint16()),
+    "proto": ("UInt8", pa.uint8()),
+    "first_timestamp": ("Int64", pa.int64()),
+    "application": ("category", pa.dictionary(pa.int32(), pa.string())),
+    "seq_raw_payload[0]": ("UInt8", pa.uint8()),
+    "seq_direction[0]": ("Int8", pa.int8()),
+    "seq_pkt_len[99]": ("UInt16", pa.uint16()),
+    "pkt_fwd_count": ("Int32", pa.int32()),
+    "pl_len_fwd_mean": ("float32", pa.float32()),
+}
+
+
+def test_unknown_profile_lists_the_known_ones():
+    with pytest.raises(ValueError, match="minimal, classification, full-features"):
+        get_profile("everything")
+
+
+def test_explicit_dtypes_win_over_patterns_and_first_pattern_wins():
+    profile = ProjectionProfile(
+        columns=None,
+        dtypes={"a_mean": "float64"},
+        patterns=[(r"a_.*", "int32"), (r".*_mean", "float32")],
+    )
+    names = ["a_mean", "a_count", "b_mean", "other"]
+    assert resolve_dtypes(profile, names) == {
+        "a_mean": "float64",
+        "a_count": "int32",
+        "b_mean": "float32",
+    }
+    assert resolve_dtypes(profile, names, columns=["b_mean"]) == {"b_mean": "float32"}
+
+
+def test_every_twc_column_has_a_dtype(sample_csv):
+    names = csv_header(sample_csv)
+    assert set(resolve_dtypes(get_profile("full-features"), names)) == set(names)
+
+
+def test_pandas_reader_dtypes(sample_csv):
+    profile = get_profile("full-features")
+    names = csv_header(sample_csv)
+    flows = pd.read_csv(sample_csv, dtype=pandas_dtypes(profile, names))
+    for name, (dtype, _) in FAMILY_COLUMNS.items():
+        assert str(flows[name].dtype) == dtype, name
+    assert isinstance(flows["sip"].dtype, pd.StringDtype)
+    # The compact dtypes keep every value
+    inferred = pd.read_csv(sample_csv)
+    numeric = [name for name, (dtype, _) in FAMILY_COLUMNS.items() if dtype[0] in "UIf"]
+    np.testing.assert_allclose(
+        flows[numeric].astype(float).to_numpy(),
+        inferred[numeric].astype(float).to_numpy(),
+        rtol=1e-6,
+    )
+
+
+def test_arrow_reader_types(sample_csv):
+    profile = get_profile("full-features")
+    types = arrow_types(profile, csv_header(sample_csv), list(FAMILY_COLUMNS))
+    (batch,) = iter_arrow_csv_batches(sample_csv, list(FAMILY_COLUMNS), 1000, types)
+    for name, (_, arrow_type) in FAMILY_COLUMNS.items():
+        assert batch.schema.field(name).type == arrow_type, name
+
+
+def test_cast_batch_converts_inferred_types():
+    batch = pa.RecordBatch.from_pydict(
+        {
+            "sport": pa.array([443, None], pa.int64()),
+            "application": ["web", None],
+            "pl_len_fwd_mean": [1.5, 2.25],
+            "unknown": [1, 2],
+        }
+    )
+    cast = cast_batch(batch, get_profile("full-features"))
+    assert cast.schema.names == batch.schema.names
+    assert cast.schema.field("sport").type == pa.uint16()
+    assert pa.types.is_dictionary(cast.schema.field("application").type)
+    assert cast.schema.field("pl_len_fwd_mean").type == pa.float32()
+    assert cast.schema.field("unknown").type == pa.int64()
+    assert cast.column("sport").to_pylist() == [443, None]
+    assert cast.column("application").to_pylist() == ["web", None]
+    # Nothing to cast, nothing copied
+    plain = pa.RecordBatch.from_pydict({"unknown": [1]})
+    assert cast_batch(plain, get_profile("full-features")) is plain
@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from mai_streaming.config import DOC_ID_COLUMN
+from mai_streaming.ingestor import ESIngestor
+from mai_streaming.projection import get_profile
+from mai_streaming.rollup import (
+    DURATION_BOUNDS_MS,
+    RollupAggregator,
+    duration_percentiles,
+)
+
+MINUTE = 60_000
+
+
+def flows(starts_ms, app="web", durations_us=1000, packets=(1, 1), lengths=(100, 50)):
+    n = len(starts_ms)
+    return pd.DataFrame(
+        {
+            "first_timestamp": np.asarray(starts_ms, dtype=np.int64),
+            "application": [app] * n,
+            "total_time": np.broadcast_to(durations_us, n).astype(float),
+            "pkt_fwd_count": [packets[0]] * n,
+            "pkt_bwd_count": [packets[1]] * n,
+            "pkt_len_fwd_total": [lengths[0]] * n,
+            "pkt_len_bwd_total": [lengths[1]] * n,
+        }
+    )
+
+
+def test_summaries_per_window_and_key():
+    rollup = RollupAggregator(60, ["application"], watermark_seconds=0)
+    # Partials of one window from several batches are merged
+    assert rollup.add(flows([1_000, 2_000], "web")).empty
+    assert rollup.add(flows([3_000], "dns", packets=(1, 0))).empty
+    assert rollup.add(flows([59_000], "web")).empty
+    summaries = rollup.add(flows([MINUTE + 1], "web"))
+
+    summaries = summaries.sort_values("application").reset_index(drop=True)
+    assert summaries["application"].tolist() == ["dns", "web"]
+    assert summaries["window_start"].tolist() == [0, 0]
+    assert summaries["window_end"].tolist() == [MINUTE, MINUTE]
+    assert summaries["flows"].tolist() == [1, 3]
+    assert summaries["packets"].tolist() == [1, 6]
+    assert summaries["bytes"].tolist() == [150, 450]
+    assert summaries["duration_max_ms"].tolist() == [1.0, 1.0]
+    assert summaries[DOC_ID_COLUMN].is_unique
+
+    rest = rollup.close()
+    assert rest["window_start"].tolist() == [MINUTE]
+    assert rest["flows"].tolist() == [1]
+
+
+def test_ids_are_stable_across_runs():
+    first = RollupAggregator(60, ["application"])
+    first.add(flows([1_000, 2_000], "web"))
+    second = RollupAggregator(60, ["application"])
+    second.add(flows([1_000], "web"))
+    # Same window and key, so the later summary overwrites the earlier one
+    assert first.close()[DOC_ID_COLUMN].tolist() == second.close()[DOC_ID_COLUMN].tolist()
+
+
+def test_watermark_and_late_flows():
+    rollup = RollupAggregator(60, ["application"], watermark_seconds=10)
+    assert rollup.add(flows([1_000, 30_000])).empty
+    # 65 s is within the watermark of the first window's end
+    assert rollup.add(flows([65_000])).empty
+    summaries = rollup.add(flows([70_000]))
+    assert summaries["window_start"].tolist() == [0]
+    assert summaries["flows"].tolist() == [2]
+
+    # The first window has been emitted, so a flow for it is late
+    assert rollup.add(flows([5_000])).empty
+    assert rollup.late_flows == 1
+    rest = rollup.close()
+    assert rest["window_start"].tolist() == [MINUTE]
+    assert rest["flows"].tolist() == [2]
+
+
+def test_missing_dimensions_roll_up_as_null():
+    rollup = RollupAggregator(60, ["application", "vpn"])
+    rollup.add(flows([1_000, 2_000]))
+    summaries = rollup.close()
+    assert summaries["flows"].tolist() == [2]
+    assert summaries["vpn"].isna().all()
+
+
+def histogram(durations_ms):
+    hist = np.bincount(
+        np.searchsorted(DURATION_BOUNDS_MS, durations_ms),
+        minlength=len(DURATION_BOUNDS_MS) + 1,
+    )
+    return hist[None, :].astype(float)
+
+
+def test_percentiles_track_exact_values():
+    rng = np.random.default_rng(7)
+    durations = rng.lognormal(mean=4, sigma=1.5, size=20_000)
+    estimates = duration_percentiles(
+        histogram(durations), np.array([durations.max()]), [50, 90, 99]
+    )[0]
+    exact = np.percentile(durations, [50, 90, 99])
+    # Buckets are about 20% wide, interpolation does much better
+    assert np.all(np.abs(estimates - exact) / exact < 0.05)
+
+
+def test_percentiles_are_capped_at_the_maximum():
+    durations = np.full(10, 10.0)
+    estimates = duration_percentiles(histogram(durations), np.array([10.0]), [50, 99, 100])
+    assert np.all(estimates <= 10.0)
+    assert np.all(estimates > DURATION_BOUNDS_MS[DURATION_BOUNDS_MS < 10.0][-1])
+
+
+def test_percentiles_of_empty_rows_are_nan():
+    hist = np.zeros((1, len(DURATION_BOUNDS_MS) + 1))
+    assert np.isnan(duration_percentiles(hist, np.array([np.nan]), [50])).all()
+
+
+def test_rollups_are_written_with_the_index_op(monkeypatch):
+    es_ingestor = ESIngestor.__new__(ESIngestor)
+    es_ingestor.rollup = RollupAggregator(60, ["application"], watermark_seconds=0)
+    es_ingestor.profile = get_profile("full-features")
+    es_ingestor.config = SimpleNamespace(raw_sample_rate=1.0)
+    sent = []
+    monkeypatch.setattr(
+        es_ingestor,
+        "ingest_dataframe",
+        lambda df, index, fields=None, time_column=None, op_type=None: sent.append(
+            (index, len(df), op_type)
+        ),
+    )
+    es_ingestor.rollup_chunk(flows([1_000]), "flows", {})
+    es_ingestor.rollup_chunk(flows([MINUTE + 1]), "flows", {})
+    assert sent == [("flows-rollup", 0, "index"), ("flows-rollup", 1, "index")]
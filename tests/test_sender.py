@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+from elasticsearch import ApiError
+
+from mai_streaming.sender import BulkSender
+from mai_streaming.spool import Spool
+
+BODY = b'{"create":{"_index":"flows"}}\n{"a":1}\n'
+
+
+class FakeES:
+    """Bulk endpoint that accepts everything it is sent."""
+
+    def __init__(self):
+        self.bodies = []
+
+    def bulk(self, operations):
+        self.bodies.append(operations)
+        return {"errors": False, "items": []}
+
+
+def test_close_without_submits_replays_the_spool(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1 << 20)
+    # Spooled by another process, e.g. a DDoS worker
+    spool.append(1, BODY)
+    es = FakeES()
+    sender = BulkSender(es, spool=spool)
+
+    sender.close()
+    assert es.bodies == [BODY]
+    assert spool.is_empty()
+    assert sender.stats.docs_replayed == 1
+    # The drain lock is released for the next run
+    assert spool.acquire_drain_lock()
+
+
+def test_submits_bypass_a_spool_being_drained(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1 << 20)
+    spool.append(1, BODY)
+    es = FakeES()
+    sender = BulkSender(es, spool=spool)
+
+    sender.submit(1, BODY)
+    snapshot = sender.flush()
+    # Sent live instead of queued behind the spooled body
+    assert snapshot["docs_sent"] == 1
+    assert snapshot["docs_spooled"] == 0
+    sender.close()
+    assert spool.is_empty()
+    assert sender.stats.docs_replayed == 1
+
+
+def api_error(status):
+    return ApiError(f"status {status}", meta=SimpleNamespace(status=status), body={})
+
+
+def bulk_body(count):
+    return b"".join(
+        b'{"create":{"_index":"flows","_id":"%d"}}\n{"a":%d}\n' % (i, i) for i in range(count)
+    )
+
+
+class ScriptedES:
+    """Bulk endpoint that answers with the given responses, then accepts everything."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.bodies = []
+
+    def bulk(self, operations):
+        self.bodies.append(operations)
+        response = self.responses.pop(0) if self.responses else {"errors": False, "items": []}
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def item(status):
+    result = {"status": status}
+    if status >= 300:
+        result["error"] = {"type": "error"}
+    return {"create": result}
+
+
+def test_rejected_requests_are_retried():
+    es = ScriptedES(api_error(429), api_error(503))
+    sender = BulkSender(es, initial_backoff=0)
+    assert sender._send(2, bulk_body(2)) == (0, b"")
+    assert len(es.bodies) == 3
+    assert sender.stats.retries == 2
+    assert sender.stats.docs_sent == 2
+
+
+def test_only_rejected_documents_are_retried():
+    # The first document was rate limited, the second is bad, the third
+    # already exists and the fourth was indexed
+    es = ScriptedES({"errors": True, "items": [item(429), item(400), item(409), item(201)]})
+    sender = BulkSender(es, initial_backoff=0)
+    assert sender._send(4, bulk_body(4)) == (0, b"")
+    assert es.bodies[1] == bulk_body(1)
+    assert sender.stats.docs_sent == 2
+    assert sender.stats.docs_failed == 1
+    assert sender.stats.docs_existing == 1
+
+
+def test_gives_up_after_max_retries():
+    es = ScriptedES(*[api_error(429)] * 3)
+    sender = BulkSender(es, max_retries=2, initial_backoff=0)
+    sender.submit(2, bulk_body(2))
+    snapshot = sender.flush()
+    sender.close()
+    assert len(es.bodies) == 3
+    assert snapshot["retries"] == 2
+    # Without a spool the documents are counted as failed
+    assert snapshot["docs_failed"] == 2
+    assert snapshot["docs_sent"] == 0
+
+
+def test_gives_up_on_documents_still_rate_limited():
+    es = ScriptedES(*[{"errors": True, "items": [item(429), item(201)]}] * 2)
+    sender = BulkSender(es, max_retries=1, initial_backoff=0)
+    left, rest = sender._send(2, bulk_body(2))
+    assert (left, rest) == (1, bulk_body(1))
+    assert sender.stats.docs_sent == 1
+
+
+def test_bad_requests_are_not_retried(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1 << 20)
+    es = ScriptedES(api_error(400))
+    sender = BulkSender(es, initial_backoff=0, spool=spool)
+    assert sender._send(2, bulk_body(2)) == (0, b"")
+    assert len(es.bodies) == 1
+    assert sender.stats.docs_failed == 2
+    # Replaying it would fail again, so it is not spooled either
+    assert spool.is_empty()
+
+
+def test_exhausted_retries_are_spooled(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1 << 20)
+    es = ScriptedES(*[api_error(503)] * 2)
+    sender = BulkSender(es, max_retries=1, initial_backoff=0, spool=spool)
+    sender.submit(2, bulk_body(2))
+    assert sender.flush()["docs_spooled"] == 2
+    assert spool.read(spool.segments()[0]) == (2, bulk_body(2))
+    sender.close()
+    # The cluster accepts the replay when the sender closes
+    assert spool.is_empty()
+    assert sender.stats.docs_replayed == 2
@@ -0,0 +1,48 @@
+from mai_streaming.spool import Spool
+
+
+def test_only_one_drainer_holds_the_lock(tmp_path):
+    first = Spool(str(tmp_path), max_bytes=1 << 20)
+    second = Spool(str(tmp_path), max_bytes=1 << 20)
+
+    assert first.acquire_drain_lock()
+    assert not second.acquire_drain_lock()
+    first.release_drain_lock()
+    assert second.acquire_drain_lock()
+    second.release_drain_lock()
+
+
+def test_totals_follow_appends_and_removals(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1 << 20)
+    assert spool.append(2, b"a\nb\n" * 2)
+    assert spool.append(3, b"c\nd\n" * 3)
+    segments = spool.segments()
+    size = sum(segment.stat().st_size for segment in segments)
+    assert spool.stats()["segments"] == 2
+    assert spool.stats()["docs"] == 5
+    assert spool.stats()["bytes"] == size
+
+    spool.replace(segments[0], 1, b"a\nb\n")
+    spool.remove(segments[1])
+    stats = spool.stats()
+    assert stats["segments"] == 1
+    assert stats["docs"] == 1
+    assert stats["bytes"] == spool.segments()[0].stat().st_size
+
+
+def test_append_does_not_list_the_directory(tmp_path, monkeypatch):
+    spool = Spool(str(tmp_path), max_bytes=1 << 20)
+    spool.append(1, b"a\nb\n")
+    scans = []
+    monkeypatch.setattr(spool, "segments", lambda: scans.append(1) or [])
+    for _ in range(10):
+        spool.append(1, b"a\nb\n")
+    assert scans == []
+    assert spool.stats()["docs"] == 11
+
+
+def test_full_spool_rejects_bodies(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=64)
+    assert spool.append(1, b"a\nb\n")
+    assert not spool.append(1, bytes(range(256)) * 4)
+    assert spool.stats()["segments"] == 1
@@ -0,0 +1,68 @@
+import os
+import threading
+
+import numpy as np
+
+from mai_streaming.projection import get_profile
+from mai_streaming.stream import iter_csv_batches
+
+HEADER = b"sip,sport,dip,dport,proto,first_timestamp\n"
+
+
+def row(i):
+    return b"10.0.0.%d,%d,192.0.2.1,443,6,%d\n" % (i, 1000 + i, 1_700_000_000_000_000 + i)
+
+
+def pipe_with(data):
+    """Return the read end of a pipe that holds ``data`` and is then closed."""
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, data)
+    os.close(write_fd)
+    return os.fdopen(read_fd, "rb")
+
+
+def test_batches_are_bounded_and_repeated_headers_skipped():
+    # twc writes a header at the start of every export
+    data = HEADER + row(0) + row(1) + row(2) + HEADER + row(3) + row(4)
+    with pipe_with(data) as stream:
+        batches = list(iter_csv_batches(stream, batch_rows=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    sports = np.concatenate([batch["sport"].to_numpy() for batch in batches])
+    assert sports.tolist() == [1000, 1001, 1002, 1003, 1004]
+
+
+def test_columns_and_profile_dtypes():
+    with pipe_with(HEADER + row(0) + row(1)) as stream:
+        (batch,) = iter_csv_batches(
+            stream, columns=["sip", "sport"], profile=get_profile("full-features")
+        )
+    assert list(batch.columns) == ["sip", "sport"]
+    assert batch["sport"].dtype == "UInt16"
+
+
+def test_unterminated_last_line_is_parsed():
+    with pipe_with(HEADER + row(0) + row(1).rstrip(b"\n")) as stream:
+        (batch,) = iter_csv_batches(stream)
+    assert batch["sport"].tolist() == [1000, 1001]
+
+
+def test_quiet_stream_emits_after_max_latency():
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, HEADER + row(0))
+    emitted = threading.Event()
+
+    def close_after_first_batch():
+        # The pipe stays open until the first row has been emitted on its own
+        emitted.wait(5)
+        os.write(write_fd, row(1))
+        os.close(write_fd)
+
+    writer = threading.Thread(target=close_after_first_batch)
+    writer.start()
+    sizes = []
+    with os.fdopen(read_fd, "rb") as stream:
+        for batch in iter_csv_batches(stream, batch_rows=100, max_latency=0.05):
+            sizes.append(len(batch))
+            emitted.set()
+    writer.join()
+    assert sizes == [1, 1]
@@ -0,0 +1,188 @@
+import dataclasses
+
+import pandas as pd
+import pytest
+
+from mai_streaming import tail
+from mai_streaming.config import ESConfig
+from mai_streaming.ingestor import ESIngestor
+from mai_streaming.projection import get_profile
+from mai_streaming.tail import FileTailer
+
+HEADER = "sip,sport,dip,dport,proto,first_timestamp,sni\n"
+
+
+def flow_line(i, sni="example.com"):
+    return f"10.0.0.{i % 250},{1000 + i},192.0.2.1,443,6,{1_700_000_000_000_000 + i},{sni}\n"
+
+
+class FakeIngestor:
+    """Records what the tailer sends; ``fail`` rejects every document."""
+
+    def __init__(self, fail=False):
+        self.profile = get_profile("full-features")
+        self.read_columns = None
+        self.lookups = None
+        self.fail = fail
+        self.docs_failed = 0
+        self.ingested = []
+        self.archived = []
+
+    def index_columns(self, chunk):
+        return chunk.copy()
+
+    def archive_chunk(self, chunk, source):
+        self.archived.append(chunk)
+        return chunk
+
+    def raw_flows(self, chunk, fields):
+        return chunk, fields
+
+    def fold_rollup(self, chunk, index):
+        pass
+
+    rollup_closed_before = None
+
+    def resume_rollup(self, closed_before):
+        pass
+
+    def ingest_dataframe(self, chunk, index, fields=None):
+        if self.fail:
+            self.docs_failed += len(chunk)
+        else:
+            self.ingested.append(chunk)
+
+    def flush(self):
+        pass
+
+    def rows(self):
+        return sum(len(chunk) for chunk in self.ingested)
+
+
+def write_csv(path, lines):
+    path.write_text(HEADER + "".join(lines))
+
+
+def test_failed_delivery_keeps_offset(tmp_path):
+    csv = tmp_path / "flows.csv"
+    write_csv(csv, [flow_line(i) for i in range(5)])
+    ingestor = FakeIngestor(fail=True)
+    tailer = FileTailer(str(tmp_path), ingestor, "flows")
+
+    with pytest.raises(RuntimeError):
+        tailer.poll_file(csv)
+    assert tailer.store.get(csv, csv.stat().st_ino) is None
+
+    # poll() logs the failure instead of raising
+    assert tailer.poll() == 0
+
+    # Not archived until delivered, so the retry does not archive it twice
+    assert ingestor.archived == []
+
+    ingestor.fail = False
+    assert tailer.poll() == 5
+    assert ingestor.rows() == 5
+    assert sum(len(chunk) for chunk in ingestor.archived) == 5
+    # The archive gets the raw rows, not the prepared ones
+    assert list(ingestor.archived[0].columns) == HEADER.strip().split(",")
+    assert tailer.store.get(csv, csv.stat().st_ino) == csv.stat().st_size
+
+
+def test_resumes_from_committed_offset(tmp_path):
+    csv = tmp_path / "flows.csv"
+    write_csv(csv, [flow_line(i) for i in range(3)])
+    ingestor = FakeIngestor()
+    assert FileTailer(str(tmp_path), ingestor, "flows").poll() == 3
+
+    with open(csv, "a") as f:
+        f.write(flow_line(3) + flow_line(4)[:10])
+    # A new tailer reads the committed offset back from disk
+    tailer = FileTailer(str(tmp_path), ingestor, "flows")
+    assert tailer.poll() == 1
+
+    with open(csv, "a") as f:
+        f.write(flow_line(4)[10:])
+    assert tailer.poll() == 1
+    sports = pd.concat(ingestor.ingested)["sport"].tolist()
+    assert sports == [1000, 1001, 1002, 1003, 1004]
+
+
+def test_line_longer_than_read_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(tail, "MAX_READ_BYTES", 32)
+    csv = tmp_path / "flows.csv"
+    write_csv(csv, [flow_line(0, "a" * 200), flow_line(1), flow_line(2, "b" * 100)])
+    ingestor = FakeIngestor()
+
+    assert FileTailer(str(tmp_path), ingestor, "flows").poll() == 3
+    flows = pd.concat(ingestor.ingested)
+    assert flows["sni"].tolist() == ["a" * 200, "example.com", "b" * 100]
+
+
+class RollupIngestor(ESIngestor):
+    """Real rollups and sampling, with bulk requests recorded instead of sent."""
+
+    def __init__(self):
+        super().__init__(
+            dataclasses.replace(
+                ESConfig(url="http://localhost:1"),
+                rollup_seconds=60,
+                rollup_watermark=0,
+                projection="full-features",
+            )
+        )
+        self.fail = False
+        self.sent = {}
+
+    def ingest_dataframe(self, df, index, fields=None, time_column=None, op_type=None):
+        if self.fail and not index.endswith("-rollup"):
+            self.docs_failed += len(df)
+        elif len(df):
+            self.sent.setdefault(index, []).append(df)
+
+    def flush(self):
+        pass
+
+    def rollups(self):
+        return pd.concat(self.sent.get("flows-rollup", []), ignore_index=True)
+
+
+def minute_line(i, minute):
+    return flow_line(i).replace(str(1_700_000_000_000_000 + i), str(minute * 60_000_000 + i))
+
+
+def test_failed_chunk_is_rolled_up_once(tmp_path):
+    csv = tmp_path / "flows.csv"
+    write_csv(csv, [minute_line(i, 0) for i in range(4)])
+    ingestor = RollupIngestor()
+    tailer = FileTailer(str(tmp_path), ingestor, "flows")
+
+    ingestor.fail = True
+    assert tailer.poll() == 0
+    ingestor.fail = False
+    assert tailer.poll() == 4
+    ingestor.close()
+    assert ingestor.rollups()["flows"].sum() == 4
+
+
+def test_restart_does_not_summarize_closed_windows_again(tmp_path):
+    csv = tmp_path / "flows.csv"
+    write_csv(csv, [minute_line(i, 0) for i in range(3)] + [minute_line(3, 1)])
+    ingestor = RollupIngestor()
+    tailer = FileTailer(str(tmp_path), ingestor, "flows")
+    assert tailer.poll() == 4
+    ingestor.close()
+    tailer.close()
+    assert ingestor.rollups()["flows"].tolist() == [3, 1]
+
+    # After the restart, a flow for a summarized window is late, and one
+    # for a new window is summarized as usual
+    with open(csv, "a") as f:
+        f.write(minute_line(4, 1) + minute_line(5, 2))
+    ingestor = RollupIngestor()
+    tailer = FileTailer(str(tmp_path), ingestor, "flows")
+    assert tailer.poll() == 2
+    ingestor.close()
+    assert ingestor.rollup.late_flows == 1
+    rollups = ingestor.rollups()
+    assert rollups["window_start"].tolist() == [2 * 60_000]
+    assert rollups["flows"].tolist() == [1]
@@ -0,0 +1,39 @@
+import sys
+
+import pytest
+
+from mai_streaming.watcher import InotifyWatcher, PollingWatcher
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+
+
+@linux_only
+def test_inotify_survives_vanished_directory(tmp_path, monkeypatch):
+    watcher = InotifyWatcher(str(tmp_path))
+    try:
+        real_add_watch = watcher._add_watch
+
+        def add_watch(directory):
+            if directory.name == "gone":
+                raise FileNotFoundError(2, "No such file or directory")
+            real_add_watch(directory)
+
+        monkeypatch.setattr(watcher, "_add_watch", add_watch)
+        (tmp_path / "gone").mkdir()
+        # The new directory asks for a rescan instead of killing the loop
+        assert watcher.wait(timeout=1.0) is None
+
+        (tmp_path / "kept").mkdir()
+        assert watcher.wait(timeout=1.0) is None
+        (tmp_path / "kept" / "flows.csv").write_text("a\n")
+        assert watcher.wait(timeout=1.0) == {tmp_path / "kept" / "flows.csv"}
+    finally:
+        watcher.close()
+
+
+def test_polling_reports_changed_files(tmp_path):
+    watcher = PollingWatcher(str(tmp_path), min_interval=0.01)
+    assert watcher.wait(timeout=0.05) == set()
+    (tmp_path / "flows.csv").write_text("a\n")
+    (tmp_path / "notes.txt").write_text("a\n")
+    assert watcher.wait(timeout=1.0) == {tmp_path / "flows.csv"}